@@ -20,7 +20,6 @@ def create_app(config_class=Config):
 
     # Make sure these folders exist
     os.makedirs('temp_uploads', exist_ok=True)
-    os.makedirs('spectrograms/temp', exist_ok=True)
 
     db.init_app(app)
     migrate.init_app(app, db)
@@ -34,7 +33,44 @@ def create_app(config_class=Config):
     from app.routes import bp as main_bp
     app.register_blueprint(main_bp)
 
+    from app import email, jobs, model_registry, rollups, uploads, user_cache
+    email.init_app(app)
+    user_cache.init_app(app)
+    jobs.init_app(app)
+    uploads.init_app(app)
+    rollups.init_app(app)
+    model_registry.init_app(app)
+
     with app.app_context():
+        new_database = not db.inspect(db.engine).get_table_names()
         db.create_all() # Create tables for our models
+        check_migrations(new_database)
+
+    return app
+
 
-    return app
\ No newline at end of file
+def check_migrations(new_database):
+    """
+    db.create_all() adds missing tables but never changes existing ones, so
+    an older database needs `flask db upgrade` before the app can query it.
+    A database create_all() has just built is already current and is stamped
+    with the latest migration; any other that is behind gets a warning.
+    """
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+    try:
+        script = ScriptDirectory.from_config(migrate.get_config())
+        head = script.get_current_head()
+    except Exception as e:
+        print(f"Could not read the migrations, skipping the schema check: {e}")
+        return
+    with db.engine.begin() as connection:
+        context = MigrationContext.configure(connection)
+        current = context.get_current_revision()
+        if current == head:
+            return
+        if new_database:
+            context.stamp(script, head)
+            return
+    print(f"WARNING: the database schema is at revision {current or 'none'} but the app expects {head}. "
+          f"Run `flask db upgrade` before serving requests.")
\ No newline at end of file
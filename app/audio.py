@@ -0,0 +1,363 @@
+import math
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import numpy as np
+import librosa
+import soundfile as sf
+import soxr
+from imageio_ffmpeg import get_ffmpeg_exe
+
+# PyAV is optional: when it is installed, compressed uploads are decoded
+# in-process instead of spawning the ffmpeg binary.
+try:
+    import av
+except ImportError:
+    av = None
+
+# --- Configuration ---
+# Every clip is resampled to this rate before featurization (app and training)
+DECODE_SAMPLE_RATE = int(os.environ.get('AUDIO_SAMPLE_RATE') or 44100)
+FFMPEG_FORMATS = ('.webm', '.m4a', '.mp4', '.aac')
+RESAMPLE_QUALITY = 'HQ' # soxr quality; 'HQ' is librosa's default 'soxr_hq'
+WINDOW_MARGIN_S = 0.05 # Extra audio read around a window so the resampler has no edge effects
+SEEK_PREROLL_S = 0.5 # Decode this much before a seek target so codecs like opus settle
+
+# What `ffmpeg -i` prints about its input, for probing without PyAV
+FFMPEG_DURATION = re.compile(r'Duration: (\d+):(\d\d):(\d\d(?:\.\d+)?)')
+FFMPEG_AUDIO_RATE = re.compile(r'Audio: [^\n]*?, (\d+) Hz')
+
+
+# --- Decoders ---
+def _pcm16_to_float(raw):
+    # Same scaling librosa/soundfile apply when reading a 16-bit WAV
+    return np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768.0
+
+
+def decode_with_pyav(audio_path, sr=DECODE_SAMPLE_RATE):
+    """
+    Decodes an audio file in-process to mono 16-bit PCM at `sr`.
+    """
+    chunks = []
+    with av.open(audio_path) as container:
+        resampler = av.AudioResampler(format='s16', layout='mono', rate=sr)
+        for frame in container.decode(audio=0):
+            for out_frame in resampler.resample(frame):
+                chunks.append(bytes(out_frame.planes[0])[:out_frame.samples * 2])
+        for out_frame in resampler.resample(None):
+            chunks.append(bytes(out_frame.planes[0])[:out_frame.samples * 2])
+    return _pcm16_to_float(b''.join(chunks))
+
+
+def decode_with_ffmpeg(audio_path, sr=DECODE_SAMPLE_RATE, max_s=None, data=None):
+    """
+    Decodes an audio file with the ffmpeg binary, reading raw mono 16-bit PCM
+    from its stdout so no intermediate WAV file is written. With `max_s` only
+    the first `max_s` seconds are decoded. Given `data`, the file's bytes are
+    piped to ffmpeg's stdin instead and `audio_path` is ignored.
+    """
+    command = [get_ffmpeg_exe(), '-nostdin', '-v', 'error', '-i', 'pipe:0' if data is not None else audio_path]
+    if max_s is not None:
+        command += ['-t', str(max_s)]
+    command += ['-f', 's16le', '-acodec', 'pcm_s16le', '-ac', '1', '-ar', str(sr), 'pipe:1']
+    result = subprocess.run(command, check=True, input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return _pcm16_to_float(result.stdout)
+
+
+def decode_audio(audio_path, sr=DECODE_SAMPLE_RATE):
+    """
+    Decodes a compressed audio file (e.g. the browser's webm recordings) into
+    a float32 mono signal at `sr`, entirely in memory.
+    """
+    if av is not None:
+        try:
+            return decode_with_pyav(audio_path, sr), sr
+        except Exception as e:
+            print(f"In-process decode failed, falling back to ffmpeg: {e}")
+    return decode_with_ffmpeg(audio_path, sr), sr
+
+
+# --- Loader ---
+def load_audio(audio_path):
+    """
+    Loads any supported upload as (y, sr). Formats libsndfile cannot read are
+    decoded through ffmpeg; everything else keeps its native sample rate.
+    """
+    if audio_path.lower().endswith(FFMPEG_FORMATS):
+        return decode_audio(audio_path)
+    return librosa.load(audio_path, sr=None)
+
+
+# --- Windowed Loading ---
+def _resampled_length(n_samples, orig_sr, sr):
+    # Length soxr produces for a whole signal (rounded half up)
+    return (2 * n_samples * sr + orig_sr) // (2 * orig_sr)
+
+
+def center_window(n_samples, target_samples):
+    """Start of the centred window the app and training slice out of a longer clip."""
+    return int((n_samples - target_samples) / 2)
+
+
+def fit_center(y, target_samples):
+    """The centred window of a longer signal, or the signal padded with librosa.util.pad_center."""
+    if len(y) > target_samples:
+        start = center_window(len(y), target_samples)
+        return y[start:start + target_samples]
+    return librosa.util.pad_center(y, size=target_samples)
+
+
+def sliding_windows(y, window_samples, hop_samples, max_windows=None):
+    """
+    Returns the overlapping windows of a signal as a (windows, window_samples)
+    strided view (no copy), centred so the same margin is left at both ends.
+    With `max_windows` the hop is widened until that many cover the signal.
+    A signal no longer than one window gives one fit_center() window.
+    """
+    if len(y) <= window_samples:
+        return fit_center(y, window_samples)[np.newaxis]
+    span = len(y) - window_samples
+    if max_windows and max_windows > 1:
+        hop_samples = max(hop_samples, -(-span // (max_windows - 1)))
+    elif max_windows == 1:
+        hop_samples = span + 1
+    count = span // hop_samples + 1
+    start = (span - (count - 1) * hop_samples) // 2
+    return np.lib.stride_tricks.sliding_window_view(y[start:], window_samples)[::hop_samples][:count]
+
+
+def probe_audio(audio_path):
+    """
+    Returns (n_samples, native sample rate) from the file header or container
+    metadata. n_samples is None when the container does not record a duration
+    (e.g. browser MediaRecorder webm); raises if the file cannot be probed.
+    """
+    if not audio_path.lower().endswith(FFMPEG_FORMATS):
+        info = sf.info(audio_path)
+        return info.frames, info.samplerate
+    if av is None:
+        return _probe_ffmpeg(audio_path)
+    with av.open(audio_path) as container:
+        stream = container.streams.audio[0]
+        rate = stream.codec_context.sample_rate
+        return _container_length(container, stream, rate), rate
+
+
+def _container_length(container, stream, rate):
+    if stream.duration is not None:
+        return int(round(float(stream.duration * stream.time_base) * rate))
+    if container.duration is not None:
+        return int(round(container.duration / av.time_base * rate))
+    return None
+
+
+def read_native(audio_path, start=0, stop=None):
+    """
+    Reads samples [start, stop) of a file as float32 mono at its native rate,
+    seeking instead of decoding what lies before `start`. Returns (y, sr).
+    """
+    if not audio_path.lower().endswith(FFMPEG_FORMATS):
+        with sf.SoundFile(audio_path) as f:
+            f.seek(start)
+            y = f.read(frames=-1 if stop is None else stop - start, dtype='float32', always_2d=True)
+            return y.mean(axis=1) if y.shape[1] > 1 else y[:, 0], f.samplerate
+    if av is None:
+        return _read_native_ffmpeg(audio_path, start, stop)
+    return _read_native_pyav(audio_path, start, stop)
+
+
+def _probe_ffmpeg(audio_path):
+    # Without PyAV: `ffmpeg -i` with no output describes the input on stderr.
+    # The duration is given to 10 ms, or as N/A for browser recordings.
+    result = subprocess.run([get_ffmpeg_exe(), '-nostdin', '-hide_banner', '-i', audio_path],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    info = result.stderr.decode(errors='replace')
+    rate = FFMPEG_AUDIO_RATE.search(info)
+    if rate is None:
+        raise RuntimeError(f"ffmpeg found no audio stream in {audio_path}: {info.strip()[-200:]}")
+    rate = int(rate.group(1))
+    duration = FFMPEG_DURATION.search(info)
+    if duration is None:
+        return None, rate
+    hours, minutes, seconds = duration.groups()
+    return int(round((int(hours) * 3600 + int(minutes) * 60 + float(seconds)) * rate)), rate
+
+
+def _read_native_ffmpeg(audio_path, start, stop):
+    # Without PyAV: an input-side -ss seeks (accurately, ffmpeg decodes from
+    # the preceding keyframe), and the rate is kept so nothing is resampled
+    rate = _probe_ffmpeg(audio_path)[1]
+    command = [get_ffmpeg_exe(), '-nostdin', '-v', 'error']
+    if start:
+        command += ['-ss', f"{start / rate:.6f}"]
+    command += ['-i', audio_path]
+    if stop is not None:
+        command += ['-t', f"{(stop - start) / rate + 0.1:.6f}"] # Slack for -t stopping a few ms short
+    command += ['-f', 'f32le', '-ac', '1', '-ar', str(rate), 'pipe:1']
+    result = subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    y = np.frombuffer(result.stdout, dtype='<f4')
+    return (y if stop is None else y[:stop - start]), rate
+
+
+def read_head(source, compressed, max_s):
+    """
+    Reads at most the first `max_s` seconds of a path or file object as float32
+    mono at its native rate. Returns (y, sr, n_samples): n_samples is the full
+    length from the header, or from the decode when the stream ends within
+    `max_s`, and None when neither says.
+    """
+    if not compressed:
+        with sf.SoundFile(source) as f:
+            y = f.read(frames=int(max_s * f.samplerate), dtype='float32', always_2d=True)
+            return (y.mean(axis=1) if y.shape[1] > 1 else y[:, 0]), f.samplerate, f.frames
+    if av is None:
+        return _read_head_ffmpeg(source, max_s)
+    with av.open(source, mode='r') as container:
+        stream = container.streams.audio[0]
+        rate = stream.codec_context.sample_rate
+        limit = int(max_s * rate)
+        resampler = av.AudioResampler(format='flt', layout='mono', rate=rate)
+        chunks, decoded, ended = [], 0, True
+        for frame in container.decode(stream):
+            for out_frame in resampler.resample(frame):
+                chunks.append(out_frame.to_ndarray().reshape(-1))
+                decoded += len(chunks[-1])
+            if decoded >= limit:
+                ended = False
+                break
+        y = np.concatenate(chunks).astype(np.float32)[:limit] if chunks else np.zeros(0, np.float32)
+        return y, rate, decoded if ended else _container_length(container, stream, rate)
+
+
+def _read_head_ffmpeg(source, max_s, sr=DECODE_SAMPLE_RATE):
+    # Without PyAV the head is decoded by the ffmpeg binary at `sr` rather than
+    # the native rate. A file object is piped to ffmpeg from memory, except an
+    # mp4/m4a one: ffmpeg may have to seek to its index ('moov' atom), which a
+    # pipe cannot do, so that is copied to a temporary file first. A little
+    # more than `max_s` is decoded, since ffmpeg's -t can stop a few ms short
+    # and that must not look like the end of the stream.
+    decode_s = max_s + 0.5
+    if isinstance(source, (str, os.PathLike)):
+        y = decode_with_ffmpeg(os.fspath(source), sr, decode_s)
+    else:
+        start = source.tell()
+        seekable_only = source.read(12)[4:8] == b'ftyp'
+        source.seek(start)
+        if seekable_only:
+            with tempfile.NamedTemporaryFile() as f:
+                shutil.copyfileobj(source, f)
+                f.flush()
+                y = decode_with_ffmpeg(f.name, sr, decode_s)
+        else:
+            y = decode_with_ffmpeg(None, sr, decode_s, data=source.read())
+    limit = int(max_s * sr)
+    return y[:limit], sr, len(y) if len(y) < limit else None
+
+
+def _frame_position(frame, stream, rate):
+    return int(round(float(frame.pts * stream.time_base) * rate))
+
+
+def _timestamp_offset(container, stream, rate):
+    # Samples between a frame's timestamp and where it lands in a full decode.
+    # Codecs such as opus shorten their first frame, so use the second one.
+    position = 0
+    for index, frame in enumerate(container.decode(stream)):
+        if index == 1:
+            return _frame_position(frame, stream, rate) - position
+        position += frame.samples
+    return 0
+
+
+def _read_native_pyav(audio_path, start, stop):
+    with av.open(audio_path) as container:
+        stream = container.streams.audio[0]
+        rate = stream.codec_context.sample_rate
+        seek_s = start / rate - SEEK_PREROLL_S
+        position = 0
+        if seek_s > 0:
+            offset = _timestamp_offset(container, stream, rate)
+            container.seek(int(seek_s / stream.time_base), stream=stream)
+            position = None
+
+        # Same downmix as the full decode, without changing the rate
+        resampler = av.AudioResampler(format='flt', layout='mono', rate=rate)
+        chunks, decoded, skipped_first = [], 0, False
+        for frame in container.decode(stream):
+            if position is None:
+                # The first frame after a seek may be shortened like the
+                # stream's first frame; place the output from the next one
+                if not skipped_first:
+                    skipped_first = True
+                    continue
+                position = _frame_position(frame, stream, rate) - offset
+            for out_frame in resampler.resample(frame):
+                chunks.append(out_frame.to_ndarray().reshape(-1))
+                decoded += len(chunks[-1])
+            if stop is not None and position + decoded >= stop:
+                break
+        y = np.concatenate(chunks).astype(np.float32) if chunks else np.zeros(0, np.float32)
+        position = position or 0
+        # Drop the pre-roll and anything past `stop`
+        y = y[max(0, start - position):]
+        if position > start:
+            y = np.concatenate([np.zeros(position - start, np.float32), y])
+        return (y if stop is None else y[:stop - start]), rate
+
+
+def load_audio_window(audio_path, duration_s, sr=DECODE_SAMPLE_RATE):
+    """
+    Loads exactly `duration_s` seconds at `sr`: the centred window of a longer
+    clip, or the whole clip padded with librosa.util.pad_center. When the
+    length is known from the header only the window (plus a small margin) is
+    decoded and resampled; otherwise the clip is decoded once at its native
+    rate and only the window is resampled. Returns (y, sr).
+    """
+    target_samples = int(duration_s * sr)
+    try:
+        n_samples, native_sr = probe_audio(audio_path)
+    except Exception as e:
+        print(f"Could not probe {audio_path}, decoding in full: {e}")
+        y, native_sr = load_audio(audio_path)
+        n_samples, audio_path = len(y), None
+
+    if audio_path is not None and n_samples is None:
+        y, native_sr = read_native(audio_path)
+        n_samples, audio_path = len(y), None
+
+    def read(start, stop=None):
+        return read_native(audio_path, start, stop)[0] if audio_path is not None else y[start:stop]
+
+    # Short clips are decoded whole: compressed headers can be a few ms off
+    if native_sr == sr:
+        if n_samples > target_samples:
+            start = center_window(n_samples, target_samples)
+            return read(start, start + target_samples), sr
+        return fit_center(read(0), target_samples), sr
+
+    total = _resampled_length(n_samples, native_sr, sr)
+    if total <= target_samples:
+        resampled = soxr.resample(read(0), native_sr, sr, quality=RESAMPLE_QUALITY)
+        return fit_center(resampled.astype(np.float32), target_samples), sr
+
+    # Native-rate span around the window, starting on a sample that maps
+    # exactly onto the output grid so the slice lines up with a full resample
+    start = center_window(total, target_samples)
+    step = native_sr // math.gcd(native_sr, sr)
+    margin = int(WINDOW_MARGIN_S * native_sr)
+    native_start = max(0, (start * native_sr // sr - margin) // step * step)
+    native_stop = min(n_samples, -(-(start + target_samples) * native_sr // sr) + margin)
+    resampled = soxr.resample(read(native_start, native_stop), native_sr, sr, quality=RESAMPLE_QUALITY)
+    offset = start - native_start * sr // native_sr
+    y_segment = librosa.util.fix_length(resampled[offset:offset + target_samples], size=target_samples)
+    return y_segment.astype(np.float32), sr
+
+
+def load_audio_resampled(audio_path, sr=DECODE_SAMPLE_RATE):
+    """Loads a whole clip as float32 mono at `sr`. Returns (y, sr)."""
+    y, native_sr = load_audio(audio_path)
+    if native_sr != sr:
+        y = soxr.resample(y, native_sr, sr, quality=RESAMPLE_QUALITY)
+    return np.asarray(y, dtype=np.float32), sr
@@ -0,0 +1,214 @@
+import threading
+import time
+import numpy as np
+import scipy.fft
+from scipy.ndimage import convolve1d
+from scipy.signal import get_window, lfilter, lfilter_zi
+
+# --- Configuration ---
+# noisereduce.reduce_noise() defaults (non-stationary spectral gating)
+NR_PADDING = 30000
+NR_TIME_CONSTANT_S = 2.0
+NR_FREQ_MASK_SMOOTH_HZ = 500
+NR_TIME_MASK_SMOOTH_MS = 50
+NR_THRESH_N_MULT = 2
+NR_SIGMOID_SLOPE = 10
+
+# Plans kept per engine; augmented training clips vary in length
+MAX_PLANS = 8
+
+
+def _smoothing_kernel(n_grad):
+    # One axis of noisereduce's triangular mask smoothing filter (normalized)
+    kernel = np.concatenate([np.linspace(0, 1, n_grad + 1, endpoint=False), np.linspace(1, 0, n_grad + 2)])[1:-1]
+    return kernel / kernel.sum()
+
+
+def overlap_add(output, frames, hop_length):
+    """
+    Adds (..., n_frames, n_fft) frames into `output` (..., samples) at
+    multiples of hop_length (n_fft % hop_length == 0).
+    """
+    n_frames, n_fft = frames.shape[-2:]
+    span = output[..., :(n_frames - 1 + n_fft // hop_length) * hop_length]
+    blocks = span.reshape(span.shape[:-1] + (-1, hop_length)) # A view: only the last axis is split
+    for j in range(n_fft // hop_length):
+        blocks[..., j:j + n_frames, :] += frames[..., :, j * hop_length:(j + 1) * hop_length]
+    return output
+
+
+class _Plan:
+    """Frame layout, filters and scratch buffers for one (length, sample rate) pair."""
+    def __init__(self, n_samples, sr, n_fft, hop_length):
+        self.n_samples = n_samples
+        half = n_fft // 2
+
+        # noisereduce zero-pads the clip by NR_PADDING on both sides and frames
+        # the result with scipy.signal.stft (frame k centred on k * hop in the
+        # padded signal). Only frames that overlap the clip are computed; the
+        # all-zero frames around them are represented by zero columns.
+        padded_length = n_samples + 2 * NR_PADDING
+        self.total_frames = padded_length // hop_length + 1
+        self.first_frame = (NR_PADDING - half) // hop_length + 1
+        last_frame = (NR_PADDING + n_samples + half - 1) // hop_length
+        self.n_frames = last_frame - self.first_frame + 1
+        self.offset = NR_PADDING + half - self.first_frame * hop_length # Clip start inside the frame buffer
+        self.gate_buffer = np.zeros(self.n_frames * hop_length + n_fft - hop_length, dtype=np.float32)
+
+        # Output STFT: librosa.stft(center=True) frames centred on k * hop
+        self.out_frames = 1 + n_samples // hop_length
+        self.out_buffer = np.zeros(n_samples + 2 * half, dtype=np.float32)
+
+        # Overlap-add normalisation of the inverse STFT (sum of squared windows)
+        window = get_window('hann', n_fft).astype(np.float32)
+        norm = np.zeros(self.gate_buffer.shape[0], dtype=np.float32)
+        overlap_add(norm, np.broadcast_to(window ** 2, (self.n_frames, n_fft)), hop_length)
+        self.inverse_norm = np.divide(1.0, norm, out=np.zeros_like(norm), where=norm > 1e-10)
+
+        # Time smoothing IIR of noisereduce's get_time_smoothed_representation
+        t_frames = NR_TIME_CONSTANT_S * sr / float(hop_length)
+        b = (np.sqrt(1 + 4 * t_frames ** 2) - 1) / (2 * t_frames ** 2)
+        self.iir = (np.array([b]), np.array([1.0, b - 1.0]))
+        self.iir_zi = lfilter_zi(*self.iir)
+
+        # Mask smoothing filter, applied as two 1-D passes (it is separable)
+        self.freq_kernel = _smoothing_kernel(int(NR_FREQ_MASK_SMOOTH_HZ / (sr / (n_fft / 2))))
+        self.time_kernel = _smoothing_kernel(int(NR_TIME_MASK_SMOOTH_MS / ((hop_length / sr) * 1000)))
+
+        # Magnitude columns from `reach` frames before the clip to the end of
+        # the padding; the clip's frames sit at signal_columns
+        self.reach = len(self.time_kernel) // 2
+        self.signal_columns = (self.reach, self.reach + self.n_frames)
+        columns = self.total_frames - self.first_frame + self.reach
+        self.magnitude = np.zeros((n_fft // 2 + 1, columns), dtype=np.float64)
+
+
+class SpectralGateEngine:
+    """
+    Denoise + STFT + dB in one pass over shared buffers. Reproduces
+    noisereduce.reduce_noise(y, sr) (non-stationary gating) followed by
+    librosa.stft and amplitude_to_db(ref=np.max), but frames the clip once in
+    float32, skips the padding noisereduce filters, and reuses its frame
+    buffers, window and filters across calls.
+
+    The gated spectrum is still resynthesised and re-analysed on librosa's
+    frame grid: the gating mask is very sensitive to frame alignment, and the
+    two grids differ by PADDING % hop samples.
+
+    stft_db() also takes a (clips, samples) array of equal-length clips, e.g.
+    the windows of one recording, and processes them together: every clip is
+    gated on its own exactly as if passed alone, but each step runs once
+    over the whole batch.
+
+    An engine keeps scratch state, so use one per thread (see get_engine()).
+    """
+    def __init__(self, n_fft=1024, hop_length=256):
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.window = get_window('hann', n_fft).astype(np.float32)
+        self._plans = {}
+        self.timings = {}
+
+    def _plan(self, n_samples, sr):
+        key = (n_samples, sr)
+        if key not in self._plans:
+            if len(self._plans) >= MAX_PLANS:
+                self._plans.pop(next(iter(self._plans)))
+            self._plans[key] = _Plan(n_samples, sr, self.n_fft, self.hop_length)
+        return self._plans[key]
+
+    def _frames(self, buffer, n_frames):
+        # (clips, frames, n_fft) strided view of a (clips, samples) buffer
+        return np.lib.stride_tricks.sliding_window_view(buffer, self.n_fft, axis=-1)[:, ::self.hop_length][:, :n_frames]
+
+    @staticmethod
+    def _scratch(buffer, clips):
+        # A single clip reuses the plan's buffer; a batch gets a fresh one per clip
+        if clips == 1:
+            return buffer[np.newaxis]
+        return np.zeros((clips,) + buffer.shape, dtype=buffer.dtype)
+
+    def gate(self, y, sr, plan):
+        """
+        Applies the spectral gate to a clip, or to each row of a (clips,
+        samples) array, and returns the denoised audio (float32, same shape).
+        """
+        hop = self.hop_length
+        clock = time.perf_counter()
+        clips = y.reshape(-1, plan.n_samples)
+
+        # 1. Analysis STFT on noisereduce's frame grid
+        buffer = self._scratch(plan.gate_buffer, len(clips))
+        buffer[:, plan.offset:plan.offset + plan.n_samples] = clips
+        spectrum = scipy.fft.rfft(self._frames(buffer, plan.n_frames) * self.window, axis=-1).transpose(0, 2, 1)
+        self.timings['stft'] = time.perf_counter() - clock
+
+        # 2. Mask: sigmoid of how far each bin rises above its time-smoothed
+        # level. Zero columns stand in for the padding frames; those left of
+        # the smoothing filter's reach never affect the result and are skipped.
+        clock = time.perf_counter()
+        magnitude = self._scratch(plan.magnitude, len(clips))
+        start, stop = plan.signal_columns
+        magnitude[:, :, start:stop] = np.abs(spectrum)
+
+        # filtfilt(padtype=None): the forward pass starts from rest (the first
+        # column is padding); the backward pass starts at the forward output's tail
+        forward = lfilter(*plan.iir, magnitude, axis=-1)
+        zi = plan.iir_zi * forward[..., -1:]
+        smoothed = lfilter(*plan.iir, forward[..., ::-1], axis=-1, zi=zi)[0][..., ::-1]
+
+        hi = stop + plan.reach
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            above = (magnitude[..., :hi] - smoothed[..., :hi]) / smoothed[..., :hi]
+            mask = 1.0 / (1.0 + np.exp(-(above - NR_THRESH_N_MULT) * NR_SIGMOID_SLOPE))
+        mask = convolve1d(mask, plan.freq_kernel, axis=1, mode='constant')
+        mask = convolve1d(mask, plan.time_kernel, axis=2, mode='constant')
+        mask = mask[..., start:stop].astype(np.float32)
+        self.timings['mask'] = time.perf_counter() - clock
+
+        # 3. Inverse STFT (windowed overlap-add) of the masked spectrum
+        clock = time.perf_counter()
+        frames = scipy.fft.irfft(spectrum * mask, n=self.n_fft, axis=1).transpose(0, 2, 1) * self.window
+        output = overlap_add(np.zeros_like(buffer), frames, hop)
+        output *= plan.inverse_norm
+        self.timings['istft'] = time.perf_counter() - clock
+        return output[:, plan.offset:plan.offset + plan.n_samples].reshape(y.shape)
+
+    def stft_db(self, y, sr):
+        """
+        Returns the dB-scaled STFT magnitude of the denoised clip (bins x
+        frames), or of each clip of a (clips, samples) array (clips x bins x frames).
+        """
+        start = time.perf_counter()
+        y = np.asarray(y, dtype=np.float32)
+        plan = self._plan(y.shape[-1], sr)
+        clips = self.gate(y, sr, plan).reshape(-1, plan.n_samples)
+
+        # 4. Output STFT (librosa.stft, center=True, zero padding)
+        clock = time.perf_counter()
+        half = self.n_fft // 2
+        buffer = self._scratch(plan.out_buffer, len(clips))
+        buffer[:, half:half + plan.n_samples] = clips
+        S = np.abs(scipy.fft.rfft(self._frames(buffer, plan.out_frames) * self.window, axis=-1).transpose(0, 2, 1))
+        self.timings['stft_out'] = time.perf_counter() - clock
+
+        # 5. librosa.amplitude_to_db(S, ref=np.max), with the max taken per clip
+        clock = time.perf_counter()
+        power = np.square(S, out=S)
+        Y_db = 10.0 * np.log10(np.maximum(1e-10, power))
+        peak = np.maximum(1e-10, power.max(axis=(1, 2), keepdims=True).astype(np.float64))
+        Y_db -= (10.0 * np.log10(peak)).astype(np.float32)
+        np.maximum(Y_db, Y_db.max(axis=(1, 2), keepdims=True) - 80.0, out=Y_db)
+        self.timings['db'] = time.perf_counter() - clock
+        self.timings['total'] = time.perf_counter() - start
+        return Y_db.reshape(y.shape[:-1] + Y_db.shape[1:])
+
+
+_local = threading.local()
+
+def get_engine(n_fft=1024, hop_length=256):
+    """Returns this thread's SpectralGateEngine for the given STFT parameters."""
+    engines = _local.__dict__.setdefault('engines', {})
+    if (n_fft, hop_length) not in engines:
+        engines[(n_fft, hop_length)] = SpectralGateEngine(n_fft, hop_length)
+    return engines[(n_fft, hop_length)]
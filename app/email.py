@@ -1,15 +1,153 @@
-from threading import Thread
+import atexit
+import queue
+import smtplib
+import threading
+import time
 from flask import current_app
 from flask_mail import Message
 from app import mail
+from app.metrics import EMAIL_QUEUE_DEPTH, EMAILS, SMTP_CONNECTIONS
+
+_STOP = object()
+
+
+def _is_permanent(error):
+    # 5xx replies (e.g. an unknown recipient) will not succeed on a retry
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+class EmailOutbox:
+    """
+    Delivers email from a bounded queue with a small, fixed pool of threads.
+    Each thread keeps one SMTP connection open and sends whatever has queued
+    up (up to MAIL_BATCH_SIZE messages) over it, closing it once the queue has
+    been idle for MAIL_IDLE_TIMEOUT_S. A failed message is retried on a fresh
+    connection, backing off exponentially, up to MAIL_MAX_RETRIES times.
+
+    submit() never blocks: when the queue is full the message is dropped and
+    counted, so a burst of results cannot hold up the prediction workers.
+    """
+    def __init__(self, app):
+        self.app = app
+        self.max_workers = app.config['MAIL_WORKERS']
+        self.batch_size = app.config['MAIL_BATCH_SIZE']
+        self.max_retries = app.config['MAIL_MAX_RETRIES']
+        self.retry_backoff_s = app.config['MAIL_RETRY_BACKOFF_S']
+        self.idle_timeout_s = app.config['MAIL_IDLE_TIMEOUT_S']
+        self._queue = queue.Queue(maxsize=app.config['MAIL_QUEUE_SIZE'])
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _start(self):
+        # Threads start on first use so CLI commands and migrations never start them
+        with self._lock:
+            if not self._threads:
+                for i in range(self.max_workers):
+                    thread = threading.Thread(target=self._run, name=f'email-{i}', daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+
+    def submit(self, msg):
+        """Queues a message for delivery. Returns False if the queue was full."""
+        self._start()
+        try:
+            self._queue.put_nowait(msg)
+        except queue.Full:
+            print(f"Email queue full, dropping message to {msg.recipients}")
+            EMAILS.labels(outcome='dropped').inc()
+            return False
+        EMAIL_QUEUE_DEPTH.inc()
+        return True
+
+    def shutdown(self, timeout=10.0):
+        """Delivers what is already queued (up to `timeout` seconds), then stops the threads."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                break
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+    # --- Delivery Thread ---
+    def _run(self):
+        with self.app.app_context():
+            connection = None
+            while True:
+                try:
+                    first = self._queue.get(timeout=self.idle_timeout_s if connection else None)
+                except queue.Empty:
+                    connection = self._close(connection)
+                    continue
+                batch = [first]
+                while len(batch) < self.batch_size and batch[-1] is not _STOP:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                for msg in batch:
+                    if msg is _STOP:
+                        self._close(connection)
+                        return
+                    EMAIL_QUEUE_DEPTH.dec()
+                    connection = self._deliver(connection, msg)
+
+    def _open(self):
+        connection = mail.connect()
+        connection.__enter__()
+        SMTP_CONNECTIONS.inc()
+        return connection
+
+    def _close(self, connection):
+        if connection is not None:
+            try:
+                connection.__exit__(None, None, None)
+            except (smtplib.SMTPException, OSError):
+                pass # The server already dropped it
+        return None
+
+    def _deliver(self, connection, msg):
+        """Sends one message, reconnecting and retrying as needed. Returns the open connection."""
+        for attempt in range(self.max_retries + 1):
+            if attempt > 1:
+                time.sleep(self.retry_backoff_s * 2 ** (attempt - 2))
+            try:
+                if connection is None:
+                    connection = self._open()
+                connection.send(msg)
+                EMAILS.labels(outcome='sent').inc()
+                return connection
+            except (smtplib.SMTPException, OSError) as e:
+                # The first retry reconnects straight away: a reused
+                # connection may simply have been closed by the server
+                connection = self._close(connection)
+                if _is_permanent(e) or attempt == self.max_retries:
+                    print(f"Email to {msg.recipients} failed: {e}")
+                    EMAILS.labels(outcome='failed').inc()
+                    return connection
+                EMAILS.labels(outcome='retried').inc()
+            except Exception as e:
+                # e.g. a malformed message; retrying cannot help
+                print(f"Email to {msg.recipients} failed: {e}")
+                EMAILS.labels(outcome='failed').inc()
+                return connection
+        return connection
+
+
+def init_app(app):
+    outbox = EmailOutbox(app)
+    app.extensions['email_outbox'] = outbox
+    atexit.register(outbox.shutdown)
 
-def send_async_email(app, msg):
-    with app.app_context():
-        mail.send(msg)
 
 def send_email(subject, sender, recipients, text_body, html_body):
-    app = current_app._get_current_object()
+    """Queues an email for the delivery threads. Returns False if it was dropped."""
     msg = Message(subject, sender=sender, recipients=recipients)
     msg.body = text_body
     msg.html = html_body
-    Thread(target=send_async_email, args=(app, msg)).start()
\ No newline at end of file
+    return current_app.extensions['email_outbox'].submit(msg)
@@ -0,0 +1,209 @@
+import io
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+import numpy as np
+
+
+class BatchingEngine:
+    """
+    Collects model inputs from concurrent callers and runs them through the
+    model as one batch. A batch is dispatched as soon as it holds
+    `max_batch_size` samples or the oldest input has waited `max_wait_ms`.
+    A multi-sample input (e.g. the windows of one recording) is never split,
+    so it may make a batch larger than `max_batch_size` on its own. Callers
+    wait at most `timeout_s` for a result by default.
+    """
+    def __init__(self, predict_batch, max_batch_size=8, max_wait_ms=5, timeout_s=60):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_s = max(0.0, max_wait_ms / 1000.0)
+        self.timeout_s = timeout_s
+        self._pending = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._requests = 0
+        self._worker = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+        self._worker.start()
+
+    def predict(self, tensor, timeout=None):
+        """
+        Queues a (1, H, W, C) input and blocks until its probability is ready.
+        """
+        return float(self.predict_many(tensor, timeout=timeout)[0])
+
+    def predict_many(self, tensor, timeout=None):
+        """
+        Queues an (N, H, W, C) input and blocks until its N probabilities are
+        ready. Returns them as an array. Raises TimeoutError after `timeout`
+        (by default the engine's timeout_s) seconds.
+        """
+        if not self._worker.is_alive():
+            raise RuntimeError("The inference batching thread has stopped.")
+        future = Future()
+        self._pending.put((tensor, future))
+        return future.result(timeout=self.timeout_s if timeout is None else timeout)
+
+    def shutdown(self):
+        """Stops the batching thread once the inputs already queued have run."""
+        self._pending.put(None)
+
+    def _collect_batch(self):
+        batch = [self._pending.get()]
+        if batch[0] is None:
+            return None
+        samples = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait_s
+        while samples < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._pending.get_nowait())
+                else:
+                    batch.append(self._pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+            if batch[-1] is None:
+                self._pending.put(batch.pop()) # Stop after this batch
+                break
+            samples += len(batch[-1][0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                return
+            futures = [future for _, future in batch]
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                # Fail this batch's callers but keep serving the next batches;
+                # a caller that timed out may already have its future cancelled
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _run_batch(self, batch):
+        tensors = [tensor for tensor, _ in batch]
+        sizes = [len(tensor) for tensor in tensors]
+        probabilities = np.asarray(self.predict_batch(np.concatenate(tensors, axis=0))).reshape(-1)
+        if len(probabilities) != sum(sizes):
+            raise ValueError(f"The model returned {len(probabilities)} outputs for {sum(sizes)} inputs.")
+        for (_, future), proba in zip(batch, np.split(probabilities, np.cumsum(sizes)[:-1])):
+            if not future.done():
+                future.set_result(proba)
+        with self._lock:
+            self._batch_sizes[sum(sizes)] += 1
+            self._requests += len(batch)
+
+    def stats(self):
+        """Returns how many batches of each size (in samples) have been run so far."""
+        with self._lock:
+            batch_sizes = dict(sorted(self._batch_sizes.items()))
+            requests = self._requests
+        batches = sum(batch_sizes.values())
+        samples = sum(size * count for size, count in batch_sizes.items())
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait_s * 1000.0,
+            'batches': batches,
+            'requests': requests,
+            'samples': samples,
+            'mean_batch_size': samples / batches if batches else 0.0,
+            'batch_sizes': batch_sizes,
+        }
+
+
+# =============================================================================
+# === MODEL BACKENDS
+# =============================================================================
+# Every backend takes the model as a file path or as the file's bytes and
+# exposes predict_batch(batch) -> (N, 1) array of probabilities.
+class KerasBackend:
+    """The full Keras model saved by train_model.py (.h5)."""
+    name = 'keras'
+
+    def __init__(self, source, num_threads=None):
+        import h5py
+        import tensorflow as tf
+        if isinstance(source, bytes):
+            with h5py.File(io.BytesIO(source), 'r') as h5_file:
+                self.model = tf.keras.models.load_model(h5_file)
+        else:
+            self.model = tf.keras.models.load_model(source)
+
+    def predict_batch(self, batch):
+        return np.asarray(self.model.predict_on_batch(batch))
+
+
+class TFLiteBackend:
+    """A TensorFlow Lite flatbuffer written by export_model.py, optionally quantized."""
+    name = 'tflite'
+
+    def __init__(self, source, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+        if isinstance(source, bytes):
+            self.interpreter = Interpreter(model_content=source, num_threads=num_threads)
+        else:
+            self.interpreter = Interpreter(model_path=source, num_threads=num_threads)
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = None
+        self._lock = threading.Lock()
+
+    def predict_batch(self, batch):
+        with self._lock:
+            if batch.shape[0] != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input['index'], batch.shape)
+                self.interpreter.allocate_tensors()
+                self._batch_size = batch.shape[0]
+
+            # Fully-integer models may expect quantized inputs and outputs
+            input_dtype = self._input['dtype']
+            if np.issubdtype(input_dtype, np.integer):
+                scale, zero_point = self._input['quantization']
+                batch = np.round(batch / scale + zero_point).astype(input_dtype)
+            self.interpreter.set_tensor(self._input['index'], batch.astype(input_dtype, copy=False))
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self._output['index'])
+            if np.issubdtype(output.dtype, np.integer):
+                scale, zero_point = self._output['quantization']
+                output = (output.astype(np.float32) - zero_point) * scale
+            return output
+
+
+class ONNXBackend:
+    """An ONNX export of the Keras model served with ONNX Runtime on CPU."""
+    name = 'onnx'
+
+    def __init__(self, source, num_threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(source, sess_options=options, providers=['CPUExecutionProvider'])
+        self._input_name = self.session.get_inputs()[0].name
+
+    def predict_batch(self, batch):
+        return self.session.run(None, {self._input_name: batch.astype(np.float32, copy=False)})[0]
+
+
+MODEL_BACKENDS = {
+    'keras': KerasBackend,
+    'tflite': TFLiteBackend,
+    'onnx': ONNXBackend,
+}
+
+
+def load_backend(name, source, num_threads=None):
+    """Loads a model with the named backend ('keras', 'tflite' or 'onnx')."""
+    if name not in MODEL_BACKENDS:
+        raise ValueError(f"Unknown audio model backend '{name}'. Choose from: {', '.join(MODEL_BACKENDS)}")
+    return MODEL_BACKENDS[name](source, num_threads=num_threads)
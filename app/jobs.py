@@ -0,0 +1,287 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import BoundedSemaphore, Event, Lock, Thread
+import click
+from flask import current_app, render_template
+from flask.cli import with_appcontext
+from sqlalchemy import or_
+from werkzeug.utils import import_string
+from app import db
+from app.models import PredictionJob, Report
+from app.ml_logic import get_combined_prediction, symptom_features_from_form
+from app.email import send_email
+from app.metrics import IN_PROGRESS, JOB_SECONDS, PREDICTION_WORKERS, count_failure, stage_timer
+
+
+class QueueFullError(Exception):
+    """Raised when the prediction queue cannot accept another job."""
+
+
+# =============================================================================
+# === QUEUE BACKENDS
+# =============================================================================
+class PredictionQueue:
+    """
+    Base class for prediction job backends. Jobs are stored as PredictionJob
+    rows in the app database; a backend only decides where and when
+    run_prediction_job() is called for a job id.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    def submit(self, job_id):
+        raise NotImplementedError
+
+    def start(self):
+        """
+        Called once the serving process is up (see gunicorn.conf.py): hands the
+        jobs a crashed or restarted worker left behind to this backend.
+        """
+        with self.app.app_context():
+            reclaim_stale_jobs()
+            job_ids = pending_job_ids()
+        self._resubmit(job_ids)
+
+    def shutdown(self, wait=True):
+        pass
+
+    def _resubmit(self, job_ids):
+        for job_id in job_ids:
+            try:
+                self.submit(job_id)
+            except QueueFullError:
+                break # The rest stay pending for the next start or `flask run-pending-jobs`
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            run_prediction_job(job_id)
+
+
+class InlineQueue(PredictionQueue):
+    """Runs each job immediately in the submitting thread (development/debugging)."""
+    def submit(self, job_id):
+        self._run(job_id)
+
+
+class ThreadPoolQueue(PredictionQueue):
+    """
+    Default backend: a bounded pool of worker threads inside each web process.
+    At most PREDICTION_WORKERS jobs run at once and PREDICTION_QUEUE_SIZE more
+    may wait; beyond that submit() raises QueueFullError. Once started, a
+    thread also requeues jobs whose worker died while running them.
+    """
+    def __init__(self, app):
+        super().__init__(app)
+        self.max_workers = app.config['PREDICTION_WORKERS']
+        self._slots = BoundedSemaphore(self.max_workers + app.config['PREDICTION_QUEUE_SIZE'])
+        self._executor = None
+        self._reaper = None
+        self._stopping = Event()
+        self._lock = Lock()
+
+    def _get_executor(self):
+        # Created on first use so CLI commands and migrations never start threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='prediction')
+                # Set in the process that runs the jobs; with ML_PRELOAD the app
+                # is built in the gunicorn master, whose metrics are discarded
+                PREDICTION_WORKERS.set(self.max_workers)
+            return self._executor
+
+    def submit(self, job_id):
+        if not self._slots.acquire(blocking=False):
+            raise QueueFullError('The prediction queue is full.')
+        future = self._get_executor().submit(self._run, job_id)
+        future.add_done_callback(lambda f: self._slots.release())
+
+    def start(self):
+        self._get_executor()
+        super().start()
+        with self._lock:
+            if self._reaper is None:
+                self._reaper = Thread(target=self._reap, name='prediction-reaper', daemon=True)
+                self._reaper.start()
+
+    def _reap(self):
+        # Every worker process checks; the conditional updates in
+        # reclaim_stale_jobs() let only one of them requeue a given job
+        interval_s = max(1.0, self.app.config['PREDICTION_JOB_TIMEOUT_S'] / 4)
+        while not self._stopping.wait(interval_s):
+            try:
+                with self.app.app_context():
+                    job_ids = reclaim_stale_jobs()
+                self._resubmit(job_ids)
+            except Exception as e:
+                print(f"Reclaiming stale prediction jobs failed: {e}")
+
+    def shutdown(self, wait=True):
+        self._stopping.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+
+QUEUE_BACKENDS = {
+    'thread': ThreadPoolQueue,
+    'inline': InlineQueue,
+}
+
+
+def init_app(app):
+    """
+    Creates the queue backend named by PREDICTION_QUEUE_BACKEND. This is either
+    a key of QUEUE_BACKENDS or an import path such as 'mypackage.queues:RQQueue'.
+    """
+    backend = app.config['PREDICTION_QUEUE_BACKEND']
+    queue_class = QUEUE_BACKENDS.get(backend) or import_string(backend)
+    app.extensions['prediction_queue'] = queue_class(app)
+    app.cli.add_command(run_pending_jobs)
+
+
+# =============================================================================
+# === JOB LIFECYCLE
+# =============================================================================
+def enqueue_prediction(user, audio_path, form_data):
+    """
+    Records a pending prediction job for an uploaded file and hands it to the
+    configured backend. Returns the job, or raises QueueFullError.
+    """
+    job = PredictionJob(user=user, audio_path=audio_path, form_data=json.dumps(form_data))
+    db.session.add(job)
+    db.session.commit()
+    try:
+        current_app.extensions['prediction_queue'].submit(job.id)
+    except QueueFullError:
+        db.session.delete(job)
+        db.session.commit()
+        raise
+    return job
+
+
+def _claim_job(job_id):
+    # Only one worker may move a job out of 'pending', even across processes
+    claimed = PredictionJob.query.filter_by(id=job_id, status='pending').update({
+        'status': 'running', 'started_at': datetime.utcnow(), 'attempts': PredictionJob.attempts + 1,
+    })
+    db.session.commit()
+    return claimed == 1
+
+
+def _observe_finished(status, created_at, finished_at):
+    # End-to-end latency as the user sees it: queue wait, retries and the run
+    if created_at is not None:
+        JOB_SECONDS.labels(status=status).observe((finished_at - created_at).total_seconds())
+
+
+def pending_job_ids():
+    return [job.id for job in PredictionJob.query.filter_by(status='pending').order_by(PredictionJob.id)]
+
+
+def reclaim_stale_jobs():
+    """
+    Finds jobs left 'running' for longer than PREDICTION_JOB_TIMEOUT_S, which
+    the worker that claimed them is taken to have died on. Each goes back to
+    'pending', or fails once it has been claimed PREDICTION_JOB_MAX_ATTEMPTS
+    times. Returns the ids of the requeued jobs; they still have to be submitted.
+    """
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=current_app.config['PREDICTION_JOB_TIMEOUT_S'])
+    stale = PredictionJob.query.filter(
+        PredictionJob.status == 'running',
+        or_(PredictionJob.started_at.is_(None), PredictionJob.started_at < cutoff)
+    ).order_by(PredictionJob.id).all()
+
+    requeued = []
+    for job in stale:
+        # Conditional on the claim we saw, so a job is reclaimed only once
+        claim = PredictionJob.query.filter_by(id=job.id, status='running', started_at=job.started_at)
+        if job.attempts < current_app.config['PREDICTION_JOB_MAX_ATTEMPTS']:
+            if claim.update({'status': 'pending'}, synchronize_session=False) == 1:
+                print(f"Requeued prediction job {job.id}; its worker stopped while running it.")
+                requeued.append(job.id)
+        elif claim.update({
+            'status': 'failed', 'finished_at': now,
+            'error': f"The prediction stopped unexpectedly {job.attempts} time(s).",
+        }, synchronize_session=False) == 1:
+            print(f"Prediction job {job.id} failed: its worker stopped while running it.")
+            count_failure('job_orphaned')
+            _observe_finished('failed', job.created_at, now)
+            if os.path.exists(job.audio_path): os.remove(job.audio_path)
+        db.session.commit()
+    return requeued
+
+
+def run_prediction_job(job_id):
+    """
+    Runs both models for a pending job, saves the Report and emails the user.
+    Must be called inside an application context.
+    """
+    if not _claim_job(job_id):
+        return
+    with IN_PROGRESS.labels(kind='prediction_job').track_inprogress(), stage_timer('job'):
+        _run_claimed_job(job_id)
+
+
+def _run_claimed_job(job_id):
+    job = db.session.get(PredictionJob, job_id)
+    form = json.loads(job.form_data)
+
+    try:
+        # 1. Prepare data for Symptom Model (M1)
+        symptom_data_for_model = symptom_features_from_form(form)
+        age = int(form['age'])
+
+        # 2. Call the master prediction function from ml_logic
+        final_result, cnn_result, cnn_pred_value, model_version = get_combined_prediction(symptom_data_for_model, job.audio_path, age)
+
+        # Create a detailed string for the database report
+        symptoms_for_report = (
+            f"Tremor: {form.get('tremor', 'N/A').replace('_', ' ').title()}, "
+            f"Stiffness: {form.get('stiffness', 'N/A').title()}, "
+            f"Balance: {form.get('balance', 'N/A').title()}. "
+            f"Other Notes: {form.get('other_symptoms', 'None')}"
+        )
+
+        report = Report(age=age, gender=form['gender'], symptoms=symptoms_for_report, cnn_prediction=cnn_pred_value, cnn_result=cnn_result, final_result=final_result, model_version=model_version, author=job.user)
+        db.session.add(report)
+        job.report = report
+        job.status = 'done'
+    except Exception as e:
+        db.session.rollback()
+        print(f"Prediction job {job_id} failed: {e}")
+        count_failure('job')
+        job.status = 'failed'
+        job.error = str(e)
+    finally:
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        _observe_finished(job.status, job.created_at, job.finished_at)
+        if os.path.exists(job.audio_path): os.remove(job.audio_path)
+
+    if job.status == 'done':
+        # Prepare a dictionary for the email template for nicer formatting
+        symptoms_for_email = {
+            "Tremor": form.get('tremor', 'N/A').replace('_', ' ').title(),
+            "Stiffness or Slowness": form.get('stiffness', 'N/A').title(),
+            "Balance Issues": form.get('balance', 'N/A').title(),
+            "Other Notes": form.get('other_symptoms', 'None')
+        }
+        send_email(
+            '[Parkinson Detection System] Your Test Result',
+            sender=current_app.config['ADMINS'][0], recipients=[job.user.email],
+            text_body=render_template('email/result_notification.txt', user=job.user, report=job.report, symptoms=symptoms_for_email),
+            html_body=render_template('email/result_notification.html', user=job.user, report=job.report, symptoms=symptoms_for_email)
+        )
+
+
+@click.command('run-pending-jobs')
+@with_appcontext
+def run_pending_jobs():
+    """Runs every job still pending or orphaned, e.g. after a worker restart."""
+    reclaim_stale_jobs()
+    job_ids = pending_job_ids()
+    for job_id in job_ids:
+        run_prediction_job(job_id)
+    print(f"Processed {len(job_ids)} pending job(s).")
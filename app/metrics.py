@@ -0,0 +1,122 @@
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+
+# Under gunicorn, PROMETHEUS_MULTIPROC_DIR (set in gunicorn.conf.py) makes
+# every worker write its samples to files there; /metrics merges them, so a
+# scrape sees all workers whichever one answers it.
+
+# --- Configuration ---
+# Seconds; from a cached repeat upload (a few ms) to a cold full pipeline
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Seconds; a job includes its wait in the queue, so it can take minutes
+JOB_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+# --- Metrics ---
+STAGE_SECONDS = Histogram(
+    'parkinson_stage_seconds', 'Time spent in each stage of the prediction pipeline.',
+    ['stage'], buckets=LATENCY_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    'parkinson_request_seconds', 'Latency of instrumented HTTP endpoints.',
+    ['endpoint', 'method'], buckets=LATENCY_BUCKETS
+)
+JOB_SECONDS = Histogram(
+    'parkinson_job_seconds', 'Time from submitting a test to its prediction job finishing, by final status.',
+    ['status'], buckets=JOB_BUCKETS
+)
+FAILURES = Counter(
+    'parkinson_failures_total', 'Pipeline failures and fallbacks by stage, e.g. a model score replaced by 0.5.',
+    ['stage']
+)
+IN_PROGRESS = Gauge(
+    'parkinson_in_progress', 'Requests and prediction jobs currently running, summed over live workers.',
+    ['kind'], multiprocess_mode='livesum'
+)
+PREDICTION_WORKERS = Gauge(
+    'parkinson_prediction_workers', 'Prediction job threads configured, summed over live workers.',
+    multiprocess_mode='livesum'
+)
+MODEL_LOAD_SECONDS = Gauge(
+    'parkinson_model_load_seconds', 'Time each worker took to load each model.',
+    ['model'], multiprocess_mode='liveall'
+)
+MODEL_INFO = Gauge(
+    'parkinson_model_info', '1 for the model version each worker serves, 0 for versions it has swapped out.',
+    ['model', 'version'], multiprocess_mode='liveall'
+)
+
+EMAIL_QUEUE_DEPTH = Gauge(
+    'parkinson_email_queue_depth', 'Emails waiting for the delivery threads, summed over live workers.',
+    multiprocess_mode='livesum'
+)
+EMAILS = Counter(
+    'parkinson_emails_total', 'Emails by outcome: sent, retried (one per failed attempt), failed or dropped.',
+    ['outcome']
+)
+SMTP_CONNECTIONS = Counter('parkinson_smtp_connections_total', 'SMTP connections opened by the delivery threads.')
+USER_CACHE = Counter(
+    'parkinson_user_cache_total', 'Logged-in user lookups answered by the user cache (hit) or the database (miss); stale hits also count as misses.',
+    ['outcome']
+)
+
+
+@contextmanager
+def stage_timer(stage):
+    """Observes the time spent inside the block under STAGE_SECONDS{stage}."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage=stage).observe(time.perf_counter() - start)
+
+
+def count_failure(stage):
+    FAILURES.labels(stage=stage).inc()
+
+
+def track_request(endpoint):
+    """Decorator recording a view's latency and in-progress count."""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            in_progress = IN_PROGRESS.labels(kind=endpoint)
+            in_progress.inc()
+            start = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                REQUEST_SECONDS.labels(endpoint=endpoint, method=request.method).observe(time.perf_counter() - start)
+                in_progress.dec()
+        return decorated_function
+    return decorator
+
+
+def set_model_loaded(model, version, load_seconds):
+    MODEL_LOAD_SECONDS.labels(model=model).set(load_seconds)
+    MODEL_INFO.labels(model=model, version=version).set(1)
+
+
+def set_model_unloaded(model, version):
+    MODEL_INFO.labels(model=model, version=version).set(0)
+
+
+def render_metrics():
+    """Returns (body, content type) in the Prometheus text format for all workers."""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead(pid):
+    """Drops a dead worker's live gauges; called from gunicorn's child_exit hook."""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(pid)
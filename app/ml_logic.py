@@ -1,96 +1,506 @@
 import os
-import subprocess
-import shutil
+import random
+import threading
+import time
+from contextlib import contextmanager
 import joblib
 import pandas as pd
-from imageio_ffmpeg import get_ffmpeg_exe
-import tensorflow as tf
-from tensorflow.keras.preprocessing import image
 import numpy as np
-import librosa
-import librosa.display
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import noisereduce as nr
+from app.inference import BatchingEngine, load_backend
+from app.metrics import count_failure, set_model_loaded, set_model_unloaded, stage_timer
+from app.prediction_cache import PredictionCache, hash_file
+from app.model_registry import MODEL_REGISTRY_POLL_S, active_version
+# The audio pipeline (app.audio, app.spectrogram; librosa, noisereduce, scipy)
+# is imported where it is used, like the model runtimes, so CLI commands such
+# as `flask db upgrade` never load it
 
 # --- Configuration ---
-AUDIO_MODEL_PATH = 'parkinson_cnn_model_stft_grayscale.h5' 
+# Audio model runtime: 'keras' (the .h5 from training), or a 'tflite'/'onnx'
+# export written by export_model.py
+AUDIO_BACKEND = os.environ.get('AUDIO_BACKEND') or 'keras'
+AUDIO_MODEL_PATHS = {
+    'keras': 'parkinson_cnn_model_stft_grayscale.h5',
+    'tflite': 'parkinson_cnn_model_stft_grayscale.tflite',
+    'onnx': 'parkinson_cnn_model_stft_grayscale.onnx',
+}
+AUDIO_MODEL_PATH = os.environ.get('AUDIO_MODEL_PATH') or AUDIO_MODEL_PATHS.get(AUDIO_BACKEND)
+AUDIO_NUM_THREADS = int(os.environ.get('AUDIO_NUM_THREADS') or 0) or None
 SYMPTOM_MODEL_PATH = 'symptom_model.joblib'
-SPECTROGRAM_PATH = 'spectrograms_stft_5s_grayscale'
+SYMPTOM_FEATURES = ['tremor', 'stiffness', 'walking_issue'] # Order the symptom model was trained on
 TARGET_DURATION_S = 5
 
-# --- Load Both Models at Startup ---
-try:
-    audio_model = tf.keras.models.load_model(AUDIO_MODEL_PATH)
-    print(f"Successfully loaded Audio CNN model from: {AUDIO_MODEL_PATH}")
-except Exception as e:
-    print(f"FATAL: Could not load AUDIO model. Error: {e}")
-    audio_model = None
-
-try:
-    symptom_model = joblib.load(SYMPTOM_MODEL_PATH)
-    print(f"Successfully loaded Symptom model from: {SYMPTOM_MODEL_PATH}")
-except Exception as e:
-    print(f"FATAL: Could not load SYMPTOM model. Error: {e}")
-    symptom_model = None
-
-# --- Spectrogram Creation Function (Unchanged) ---
-def create_stft_spectrogram_from_audio(audio_path, save_path):
-    """
-    Loads, converts, and saves a high-quality, clean grayscale STFT spectrogram.
-    """
-    audio_path = os.path.abspath(audio_path)
-    save_path = os.path.abspath(save_path)
-    temp_dir = os.path.join(os.path.dirname(audio_path), f"temp_{os.path.basename(audio_path)}")
-    os.makedirs(temp_dir, exist_ok=True)
-    
-    try:
-        if audio_path.lower().endswith('.webm'):
-            temp_wav_path = os.path.join(temp_dir, 'converted_audio.wav')
-            try:
-                ffmpeg_executable = get_ffmpeg_exe()
-                command = [ffmpeg_executable, '-i', audio_path, '-acodec', 'pcm_s16le', '-ac', '1', '-ar', '44100', '-y', temp_wav_path]
-                subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            except Exception as e:
-                shutil.rmtree(temp_dir)
-                return False
-            processing_path = temp_wav_path
-        else:
-            processing_path = audio_path
-        
-        y, sr = librosa.load(processing_path, sr=None)
-        target_samples = TARGET_DURATION_S * sr
-        if len(y) > target_samples:
-            start_index = int((len(y) - target_samples) / 2)
-            y_segment = y[start_index : start_index + target_samples]
+# Audio scoring: 'center' scores the centred TARGET_DURATION_S window;
+# 'windows' scores overlapping windows across the whole recording in one
+# batch and aggregates them with 'mean', 'median' or 'trimmed' (a mean
+# without the top and bottom WINDOW_TRIM_FRACTION)
+AUDIO_SCORING = os.environ.get('AUDIO_SCORING') or 'center'
+WINDOW_HOP_S = float(os.environ.get('WINDOW_HOP_S') or 2.5)
+WINDOW_MAX_COUNT = int(os.environ.get('WINDOW_MAX_COUNT') or 8)
+WINDOW_AGGREGATE = os.environ.get('WINDOW_AGGREGATE') or 'median'
+WINDOW_TRIM_FRACTION = float(os.environ.get('WINDOW_TRIM_FRACTION') or 0.2)
+
+# Micro-batching of concurrent audio model calls
+INFERENCE_MAX_BATCH_SIZE = int(os.environ.get('INFERENCE_MAX_BATCH_SIZE') or 8)
+INFERENCE_MAX_WAIT_MS = float(os.environ.get('INFERENCE_MAX_WAIT_MS') or 5)
+INFERENCE_TIMEOUT_S = float(os.environ.get('INFERENCE_TIMEOUT_S') or 60) # Then the audio score falls back to 0.5
+
+# Cache of audio model results keyed by upload content, shared by all workers
+# on the host. Bump PREPROCESSING_VERSION whenever the audio pipeline changes.
+PREDICTION_CACHE_ENABLED = (os.environ.get('PREDICTION_CACHE') or '1') == '1'
+PREDICTION_CACHE_DIR = os.environ.get('PREDICTION_CACHE_DIR') or 'prediction_cache'
+PREDICTION_CACHE_MAX_ENTRIES = int(os.environ.get('PREDICTION_CACHE_MAX_ENTRIES') or 10000)
+PREDICTION_CACHE_TTL_S = int(os.environ.get('PREDICTION_CACHE_TTL_S') or 7 * 24 * 3600)
+PREPROCESSING_VERSION = 3
+
+# --- Model Lifecycle ---
+# The model runtime is only imported when a model is actually needed, so tooling
+# such as `flask db` and the shell context never pays for it.
+#
+# The models come from the active version in the model registry (see
+# app.model_registry), or from the paths above while it has none. Each
+# version is a ModelSet; a request holds the set it started with, and a
+# watcher thread in each worker loads a newly activated version next to the
+# current one and swaps it in.
+audio_model = None # The current set's models, for scripts such as rescore.py
+symptom_model = None
+_current = None
+_preloaded = None
+_draining = set()
+_models_lock = threading.Lock()
+_watcher = None
+
+class ModelSet:
+    """
+    The audio and symptom models of one version, with their own batching
+    engine so that a batch never mixes versions. Once retired by a swap, the
+    models are released as soon as the last request using them has left.
+    """
+    def __init__(self, version, backend, audio_path, symptom_path):
+        self.version = version
+        self.backend = backend
+        self.audio_path = audio_path
+        self.symptom_path = symptom_path
+        self.audio_model = None
+        self.symptom_model = None
+        self.load_seconds = {}
+        self._audio_bytes = None
+        self._engine = None
+        self._in_flight = 0
+        self._retired = False
+        self._lock = threading.Lock()
+
+    def _load_symptom_model(self):
+        try:
+            start = time.perf_counter()
+            model = joblib.load(self.symptom_path)
+            self.load_seconds['symptom'] = time.perf_counter() - start
+            print(f"Successfully loaded Symptom model from: {self.symptom_path}")
+            return model
+        except Exception as e:
+            print(f"FATAL: Could not load SYMPTOM model. Error: {e}")
+            return None
+
+    def preload(self):
+        """Loads the symptom model and reads the audio model file into memory."""
+        # Imported only so that forked workers share the loaded modules
+        if self.backend == 'onnx':
+            import onnxruntime  # noqa: F401
         else:
-            y_segment = librosa.util.pad_center(y, size=target_samples)
-
-        y_reduced = nr.reduce_noise(y=y_segment, sr=sr)
-        N_FFT = 1024
-        HOP_LENGTH = 256
-        S_audio = librosa.stft(y_reduced, n_fft=N_FFT, hop_length=HOP_LENGTH)
-        Y_db = librosa.amplitude_to_db(np.abs(S_audio), ref=np.max)
-        plt.figure(figsize=(12, 4))
-        librosa.display.specshow(Y_db, sr=sr, hop_length=HOP_LENGTH, x_axis='time', y_axis='log', cmap='gray_r')
-        plt.axis('off')
-        plt.savefig(save_path, bbox_inches='tight', pad_inches=0)
-        plt.close()
-        shutil.rmtree(temp_dir)
-        return True
+            import tensorflow  # noqa: F401
+        import app.spectrogram  # noqa: F401
+        if self.symptom_model is None:
+            self.symptom_model = self._load_symptom_model()
+        try:
+            with open(self.audio_path, 'rb') as f:
+                self._audio_bytes = f.read()
+        except OSError as e:
+            print(f"Could not preload AUDIO model file. Error: {e}")
+        return self
+
+    def load(self):
+        """Builds the audio model and loads whatever preload() did not; a model that fails stays None."""
+        try:
+            start = time.perf_counter()
+            source = self._audio_bytes if self._audio_bytes is not None else self.audio_path
+            self.audio_model = load_backend(self.backend, source, num_threads=AUDIO_NUM_THREADS)
+            self.load_seconds['audio'] = time.perf_counter() - start
+            print(f"Successfully loaded Audio CNN model ({self.backend}) from: {self.audio_path}")
+        except Exception as e:
+            print(f"FATAL: Could not load AUDIO model. Error: {e}")
+        self._audio_bytes = None
+        if self.symptom_model is None:
+            self.symptom_model = self._load_symptom_model()
+        return self
+
+    def warm_up(self):
+        """Traces the predict functions for single requests and full batches."""
+        from app.spectrogram import IMG_HEIGHT, IMG_WIDTH
+        if self.audio_model is not None:
+            batch_sizes = {1, INFERENCE_MAX_BATCH_SIZE}
+            if AUDIO_SCORING == 'windows':
+                batch_sizes.add(WINDOW_MAX_COUNT)
+            for batch_size in batch_sizes:
+                self.audio_model.predict_batch(np.zeros((batch_size, IMG_HEIGHT, IMG_WIDTH, 1), dtype=np.float32))
+        if self.symptom_model is not None:
+            self.symptom_model.predict_proba(pd.DataFrame([{'tremor': 0, 'stiffness': 0, 'walking_issue': 0}]))
+
+    @property
+    def engine(self):
+        """The batching engine for this set's audio model, started on first use."""
+        with self._lock:
+            if self._engine is None:
+                self._engine = BatchingEngine(
+                    self.audio_model.predict_batch,
+                    max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+                    max_wait_ms=INFERENCE_MAX_WAIT_MS,
+                    timeout_s=INFERENCE_TIMEOUT_S
+                )
+            return self._engine
+
+    def enter(self):
+        with self._lock:
+            self._in_flight += 1
+
+    def leave(self):
+        with self._lock:
+            self._in_flight -= 1
+            release = self._retired and self._in_flight == 0
+        if release:
+            self._release()
+
+    def retire(self):
+        """Marks the set as replaced; it is released once no request uses it."""
+        with self._lock:
+            self._retired = True
+            release = self._in_flight == 0
+        if release:
+            self._release()
+
+    def _release(self):
+        if self._engine is not None:
+            self._engine.shutdown()
+        self.audio_model = self.symptom_model = None
+        with _models_lock:
+            _draining.discard(self)
+        print(f"Released model version {self.version}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'version': self.version,
+                'backend': self.backend,
+                'in_flight': self._in_flight,
+                'load_seconds': dict(self.load_seconds),
+            }
+
+def _file_id(path):
+    try:
+        stat = os.stat(path)
+        return f"{stat.st_size}-{int(stat.st_mtime)}"
+    except OSError:
+        return 'missing'
+
+def _active_model_set():
+    """
+    Returns an unloaded ModelSet for the registry's active version, or for
+    AUDIO_MODEL_PATH/SYMPTOM_MODEL_PATH while the registry has no manifest.
+    """
+    entry = active_version()
+    if entry is None:
+        return ModelSet(f"local-{_file_id(AUDIO_MODEL_PATH)}", AUDIO_BACKEND, AUDIO_MODEL_PATH, SYMPTOM_MODEL_PATH)
+    return ModelSet(entry['version'], entry['backend'], entry['audio_path'], entry['symptom_path'])
+
+def _startup_model_set():
+    try:
+        return _active_model_set()
     except Exception as e:
-        if 'temp_dir' in locals() and os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
+        print(f"Could not read the model registry, using {AUDIO_MODEL_PATH}. Error: {e}")
+        return ModelSet(f"local-{_file_id(AUDIO_MODEL_PATH)}", AUDIO_BACKEND, AUDIO_MODEL_PATH, SYMPTOM_MODEL_PATH)
+
+def _install(models):
+    # Caller holds _models_lock. Returns the set it replaced.
+    global _current, audio_model, symptom_model
+    previous, _current = _current, models
+    audio_model, symptom_model = models.audio_model, models.symptom_model
+    for name, seconds in models.load_seconds.items():
+        set_model_loaded(name, models.version, seconds)
+    return previous
+
+def preload_models():
+    """
+    Prepares everything that is safe to share between forked workers: imports
+    the model runtime, loads the symptom model and reads the audio model file
+    into memory. The TF runtime itself must not start before fork (it
+    deadlocks in the children), so the model is built later by load_models().
+    """
+    global _preloaded
+    with _models_lock:
+        if _preloaded is None and _current is None:
+            _preloaded = _startup_model_set().preload()
+
+def load_models():
+    """
+    Loads the active model version on first use. Safe to call repeatedly and
+    from several threads; a model that fails to load stays None.
+    """
+    global _preloaded
+    with _models_lock:
+        if _current is not None:
+            return
+        models, _preloaded = _preloaded or _startup_model_set(), None
+        _install(models.load())
+
+@contextmanager
+def use_models():
+    """
+    Yields the current ModelSet and keeps it loaded until the block exits,
+    even if another version is swapped in meanwhile.
+    """
+    load_models()
+    with _models_lock:
+        models = _current
+        models.enter()
+    try:
+        yield models
+    finally:
+        models.leave()
+
+def swap_models(models):
+    """
+    Loads and warms up `models` next to the current set, then makes it the
+    one new requests get. Requests already running finish on the old set.
+    Returns False, keeping the current set, if it failed to load.
+    """
+    start = time.perf_counter()
+    models.load()
+    if models.audio_model is None or models.symptom_model is None:
+        print(f"Keeping model version {_current.version}: {models.version} failed to load")
+        count_failure('model_swap')
         return False
+    models.warm_up()
+    with _models_lock:
+        previous = _install(models)
+        _draining.add(previous)
+    set_model_unloaded('audio', previous.version)
+    set_model_unloaded('symptom', previous.version)
+    previous.retire()
+    print(f"Swapped model version {previous.version} -> {models.version} in {time.perf_counter() - start:.2f}s")
+    return True
+
+def _watch_registry():
+    # Start at a random point of the interval so that the workers of a host
+    # do not all load the new version at the same moment
+    time.sleep(random.uniform(0, MODEL_REGISTRY_POLL_S))
+    failed_version = None
+    while True:
+        try:
+            models = _active_model_set()
+        except Exception as e:
+            print(f"Could not read the model registry. Error: {e}")
+            models = None
+        if models is not None and models.version not in (_current.version, failed_version):
+            failed_version = None if swap_models(models) else models.version
+        time.sleep(MODEL_REGISTRY_POLL_S)
+
+def start_registry_watcher():
+    """
+    Starts this process's thread that swaps in the registry's active version
+    whenever it changes. MODEL_REGISTRY_POLL_S=0 turns it off.
+    """
+    global _watcher
+    load_models()
+    with _models_lock:
+        if _watcher is None and MODEL_REGISTRY_POLL_S > 0:
+            _watcher = threading.Thread(target=_watch_registry, name='model-registry', daemon=True)
+            _watcher.start()
+
+def get_model_stats():
+    """Returns the version this worker serves and the versions still draining."""
+    with _models_lock:
+        current, draining = _current, list(_draining)
+    if current is None:
+        return None
+    return dict(current.stats(), draining=[models.stats() for models in draining])
+
+def warm_up():
+    """
+    Runs dummy inputs through the whole inference path so graph tracing and
+    lookup-table setup happen before the first real request.
+    """
+    from app.audio import DECODE_SAMPLE_RATE, fit_center
+    from app.spectrogram import compute_stft_db, render_spectrogram
+    load_models()
+    start = time.perf_counter()
+    sr = DECODE_SAMPLE_RATE
+    # A short clip, so the padding path (and librosa's lazy imports) load too
+    y_dummy = 1e-3 * np.random.default_rng(0).standard_normal(sr).astype(np.float32)
+    y_dummy = fit_center(y_dummy, TARGET_DURATION_S * sr)
+    render_spectrogram(compute_stft_db(y_dummy, sr), sr)
+    _current.warm_up()
+    print(f"Model warm-up finished in {time.perf_counter() - start:.2f}s")
+
+# --- Shared Inference Engine ---
+def get_inference_engine():
+    """
+    Returns the batching engine of the current model version, starting it on
+    first use.
+    """
+    load_models()
+    return _current.engine
+
+def get_inference_stats():
+    """Returns the batch-size distribution achieved by the current version's inference engine."""
+    models = _current
+    return models._engine.stats() if models is not None and models._engine is not None else None
+
+# --- Prediction Cache ---
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_prediction_cache():
+    """Returns the process-wide prediction cache, or None when it is disabled."""
+    global _cache
+    if not PREDICTION_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = PredictionCache(
+                PREDICTION_CACHE_DIR,
+                max_entries=PREDICTION_CACHE_MAX_ENTRIES,
+                ttl_s=PREDICTION_CACHE_TTL_S
+            )
+        return _cache
+
+def get_cache_stats():
+    """Returns the prediction cache's hit/miss counters."""
+    cache = get_prediction_cache()
+    return cache.stats() if cache is not None else None
+
+def model_version(models=None):
+    """
+    Identifies the audio model file and preprocessing, so cached results are
+    never served for a different model or pipeline. Describes the current
+    model version unless given a ModelSet.
+    """
+    from app.spectrogram import HOP_LENGTH, IMG_HEIGHT, IMG_WIDTH, N_FFT
+    if models is None:
+        models = _current or ModelSet(None, AUDIO_BACKEND, AUDIO_MODEL_PATH, SYMPTOM_MODEL_PATH)
+    version = (
+        f"{models.backend}:{os.path.basename(models.audio_path)}:{_file_id(models.audio_path)}:"
+        f"p{PREPROCESSING_VERSION}:{TARGET_DURATION_S}s:{N_FFT}:{HOP_LENGTH}:{IMG_HEIGHT}x{IMG_WIDTH}"
+    )
+    if AUDIO_SCORING == 'windows':
+        version += f":windows-{WINDOW_HOP_S}s-{WINDOW_MAX_COUNT}-{WINDOW_AGGREGATE}-{WINDOW_TRIM_FRACTION}"
+    return version
+
+# --- Spectrogram Creation Function ---
+def create_stft_spectrogram_from_audio(audio_path):
+    """
+    Loads and converts an audio file into a grayscale STFT spectrogram image,
+    rendered in memory. Returns a uint8 array, or None if processing failed.
+    """
+    from app.audio import load_audio_window
+    from app.spectrogram import compute_stft_db, render_spectrogram
+    try:
+        with stage_timer('load_window'):
+            y_segment, sr = load_audio_window(os.path.abspath(audio_path), TARGET_DURATION_S)
+        with stage_timer('dsp'):
+            Y_db = compute_stft_db(y_segment, sr)
+        with stage_timer('render'):
+            return render_spectrogram(Y_db, sr)
+    except Exception as e:
+        print(f"Error creating spectrogram for {audio_path}: {e}")
+        count_failure('spectrogram')
+        return None
+
+def create_window_spectrograms_from_audio(audio_path):
+    """
+    Cuts the whole recording into overlapping TARGET_DURATION_S windows and
+    renders them all at once. Returns a (windows, H, W) uint8 array, or None
+    if processing failed.
+    """
+    from app.audio import load_audio_resampled, sliding_windows
+    from app.spectrogram import compute_stft_db, render_spectrogram
+    try:
+        with stage_timer('load_full'):
+            y, sr = load_audio_resampled(os.path.abspath(audio_path))
+            windows = sliding_windows(y, TARGET_DURATION_S * sr, int(WINDOW_HOP_S * sr), WINDOW_MAX_COUNT)
+        with stage_timer('dsp'):
+            Y_db = compute_stft_db(windows, sr)
+        with stage_timer('render'):
+            return render_spectrogram(Y_db, sr)
+    except Exception as e:
+        print(f"Error creating window spectrograms for {audio_path}: {e}")
+        count_failure('spectrogram')
+        return None
+
+def aggregate_window_scores(scores, rule=WINDOW_AGGREGATE, trim_fraction=WINDOW_TRIM_FRACTION):
+    """Combines per-window probabilities into one with the 'mean', 'median' or 'trimmed' rule."""
+    scores = np.asarray(scores, dtype=np.float64)
+    if rule == 'mean':
+        return float(np.mean(scores))
+    if rule == 'median':
+        return float(np.median(scores))
+    if rule == 'trimmed':
+        from scipy.stats import trim_mean
+        return float(trim_mean(scores, trim_fraction))
+    raise ValueError(f"Unknown window aggregation '{rule}'. Choose from: mean, median, trimmed")
+
+def predict_audio(audio_path, models=None):
+    """
+    Runs the audio CNN of `models` (by default the current version) on an
+    upload and returns its probability, from the centred window or from all
+    windows (AUDIO_SCORING). Results are served from the prediction cache
+    when the same file was scored before.
+    """
+    if models is None:
+        with use_models() as models:
+            return predict_audio(audio_path, models)
+
+    def compute():
+        from app.spectrogram import spectrogram_to_tensor
+        if AUDIO_SCORING == 'windows':
+            pixels = create_window_spectrograms_from_audio(audio_path)
+            if pixels is None:
+                raise ValueError("Spectrogram creation failed.")
+            with stage_timer('inference'):
+                # All windows go through the model as one batch
+                scores = models.engine.predict_many(spectrogram_to_tensor(pixels))
+            return aggregate_window_scores(scores)
+        pixels = create_stft_spectrogram_from_audio(audio_path)
+        if pixels is None:
+            raise ValueError("Spectrogram creation failed.")
+        with stage_timer('inference'):
+            return models.engine.predict(spectrogram_to_tensor(pixels))
+
+    cache = get_prediction_cache()
+    if cache is None:
+        return compute()
+    with stage_timer('hash'):
+        key = cache.make_key(hash_file(audio_path), model_version(models))
+    return cache.get_or_compute(key, compute)
+
+def symptom_features_from_form(form):
+    """Maps the test form's answers to the symptom model's input features."""
+    return {
+        'tremor': 1 if form.get('tremor') != 'no' else 0,
+        'stiffness': 1 if form.get('stiffness') == 'yes' else 0,
+        'walking_issue': 1 if form.get('balance') == 'yes' else 0 # Correctly use 'balance' from form for 'walking_issue' feature
+    }
 
 # --- Master Prediction Function (Corrected Version) ---
 def get_combined_prediction(symptom_data, audio_path, user_age):
     """
     Gets predictions from both models, combines them, and applies business logic.
+    Returns (final_result_label, cnn_result_label, final_score, model version).
     """
-    if not audio_model or not symptom_model:
+    with use_models() as models:
+        return _get_combined_prediction(models, symptom_data, audio_path, user_age) + (models.version,)
+
+def _get_combined_prediction(models, symptom_data, audio_path, user_age):
+    if not models.audio_model or not models.symptom_model:
         print("ERROR: One or both models are not loaded.")
+        count_failure('models_not_loaded')
         return "Error: Model not loaded.", "Error", 0.5
 
     # --- 1. Get Prediction from Symptom Model (M1) ---
@@ -99,46 +509,44 @@ def get_combined_prediction(symptom_data, audio_path, user_age):
         symptom_df = pd.DataFrame([symptom_data])
         
         # --- THIS IS THE CORRECTION ---
-        # Define the exact feature order the model was trained on.
-        feature_order = ['tremor', 'stiffness', 'walking_issue']
         # Reorder the DataFrame columns to match the training order.
-        symptom_df_ordered = symptom_df[feature_order]
+        symptom_df_ordered = symptom_df[SYMPTOM_FEATURES]
         
         # Predict the probability using the correctly ordered data.
-        symptom_proba = symptom_model.predict_proba(symptom_df_ordered)[0][1]
+        with stage_timer('symptom'):
+            symptom_proba = models.symptom_model.predict_proba(symptom_df_ordered)[0][1]
         print(f"Symptom Model (M1) Prediction: {symptom_proba:.4f}")
     except Exception as e:
         print(f"Error getting symptom prediction: {e}")
+        count_failure('symptom_fallback')
         symptom_proba = 0.5
 
     # --- 2. Get Prediction from Audio CNN Model (M2) ---
     audio_proba = 0.5
     try:
-        temp_predict_dir = os.path.join(SPECTROGRAM_PATH, 'temp')
-        os.makedirs(temp_predict_dir, exist_ok=True)
-        temp_spectrogram_path = os.path.join(temp_predict_dir, 'temp_spec.png')
-        
-        if create_stft_spectrogram_from_audio(audio_path, temp_spectrogram_path):
-            img = image.load_img(temp_spectrogram_path, target_size=(224, 224), color_mode='grayscale')
-            img_array = image.img_to_array(img)
-            img_array = np.expand_dims(img_array, axis=0)
-            img_array /= 255.0
-            audio_proba = audio_model.predict(img_array)[0][0]
-            print(f"Audio Model (M2) Prediction: {audio_proba:.4f}")
-            if os.path.exists(temp_spectrogram_path):
-                os.remove(temp_spectrogram_path)
-        else:
-            raise ValueError("Spectrogram creation failed.")
+        with stage_timer('audio'):
+            audio_proba = predict_audio(audio_path, models)
+        print(f"Audio Model (M2) Prediction: {audio_proba:.4f}")
     except Exception as e:
         print(f"Error getting audio prediction: {e}")
+        count_failure('audio_fallback')
 
-    # --- 3. Calculate the Final Weighted Score ---
+    # --- 3. Combine Both Scores ---
+    final_result_label, cnn_result_label, final_score = combine_predictions(symptom_proba, audio_proba, user_age)
+    print(f"Final Combined Score: {final_score:.4f}")
+    return final_result_label, cnn_result_label, final_score
+
+def combine_predictions(symptom_proba, audio_proba, user_age):
+    """
+    Weights the two model outputs into the final score and applies the age
+    override. Returns (final_result_label, cnn_result_label, final_score).
+    """
+    # --- Calculate the Final Weighted Score ---
     weight_symptoms = 0.7
     weight_audio = 0.3
     final_score = (weight_symptoms * symptom_proba) + (weight_audio * audio_proba)
-    print(f"Final Combined Score: {final_score:.4f}")
     
-    # --- 4. Make Final Decision Based on the Combined Score ---
+    # --- Make Final Decision Based on the Combined Score ---
     cnn_result_label = "Positive" if final_score > 0.5 else "Negative"
     
     final_result_label = cnn_result_label
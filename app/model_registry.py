@@ -0,0 +1,217 @@
+import json
+import os
+import re
+import shutil
+from datetime import datetime
+import click
+from flask.cli import AppGroup
+
+# A local directory of versioned model artifacts:
+#
+#   model_registry/
+#     active.json             {"active": "v2", "history": ["v1", "v2"], ...}
+#     v1/meta.json            backend and file names of this version
+#     v1/parkinson_cnn_model_stft_grayscale.h5
+#     v1/symptom_model.joblib
+#     v2/...
+#
+# Workers poll active.json and swap to the version it names (see
+# app.ml_logic.start_registry_watcher); `flask models` edits it.
+
+# --- Configuration ---
+MODEL_REGISTRY_DIR = os.environ.get('MODEL_REGISTRY_DIR') or 'model_registry'
+MODEL_REGISTRY_POLL_S = float(os.environ.get('MODEL_REGISTRY_POLL_S') or 5)
+MANIFEST_NAME = 'active.json'
+META_NAME = 'meta.json'
+VERSION_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$')
+BACKEND_EXTENSIONS = {'.h5': 'keras', '.keras': 'keras', '.tflite': 'tflite', '.onnx': 'onnx'}
+
+
+class RegistryError(Exception):
+    """Raised when a registry command cannot be carried out."""
+
+
+# --- Reading ---
+def _write_json(path, data):
+    # Write then rename, so a polling worker never reads half a file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def read_manifest(registry_dir=MODEL_REGISTRY_DIR):
+    """Returns the manifest, or None when the registry has not been set up."""
+    try:
+        with open(os.path.join(registry_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def read_version(version, registry_dir=MODEL_REGISTRY_DIR):
+    """
+    Returns a registered version as a dict with its backend and the full
+    paths of its audio and symptom model files.
+    """
+    version_dir = os.path.join(registry_dir, version)
+    try:
+        with open(os.path.join(version_dir, META_NAME)) as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        raise RegistryError(f"Model version '{version}' is not registered in {registry_dir}.")
+    return dict(
+        meta,
+        version=version,
+        audio_path=os.path.join(version_dir, meta['audio_model']),
+        symptom_path=os.path.join(version_dir, meta['symptom_model']),
+    )
+
+
+def active_version(registry_dir=MODEL_REGISTRY_DIR):
+    """Returns the active version (see read_version()), or None without a manifest."""
+    manifest = read_manifest(registry_dir)
+    if manifest is None:
+        return None
+    return read_version(manifest['active'], registry_dir)
+
+
+def list_versions(registry_dir=MODEL_REGISTRY_DIR):
+    """Returns every registered version, oldest first."""
+    if not os.path.isdir(registry_dir):
+        return []
+    versions = [
+        read_version(name, registry_dir) for name in os.listdir(registry_dir)
+        if os.path.isfile(os.path.join(registry_dir, name, META_NAME))
+    ]
+    return sorted(versions, key=lambda v: (v.get('registered_at', ''), v['version']))
+
+
+# --- Changing ---
+def register_version(version, audio_model, symptom_model, backend=None, note=None, registry_dir=MODEL_REGISTRY_DIR):
+    """
+    Copies a pair of model files into the registry as `version`. The version
+    only becomes visible once all of it has been written.
+    """
+    if not VERSION_PATTERN.match(version):
+        raise RegistryError(f"Invalid version name '{version}': use letters, digits, '.', '_' or '-'.")
+    version_dir = os.path.join(registry_dir, version)
+    if os.path.exists(version_dir):
+        raise RegistryError(f"Model version '{version}' already exists.")
+    if backend is None:
+        backend = BACKEND_EXTENSIONS.get(os.path.splitext(audio_model)[1].lower())
+        if backend is None:
+            raise RegistryError(f"Cannot tell the backend of {audio_model}; pass --backend.")
+
+    tmp_dir = f"{version_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    try:
+        shutil.copy2(audio_model, tmp_dir)
+        shutil.copy2(symptom_model, tmp_dir)
+        _write_json(os.path.join(tmp_dir, META_NAME), {
+            'backend': backend,
+            'audio_model': os.path.basename(audio_model),
+            'symptom_model': os.path.basename(symptom_model),
+            'registered_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'note': note,
+        })
+        os.rename(tmp_dir, version_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return read_version(version, registry_dir)
+
+
+def activate_version(version, registry_dir=MODEL_REGISTRY_DIR):
+    """Makes `version` the active one; workers pick it up on their next poll."""
+    read_version(version, registry_dir) # Must exist
+    manifest = read_manifest(registry_dir) or {'active': None, 'history': []}
+    if manifest['active'] == version:
+        return manifest
+    manifest = {
+        'active': version,
+        'history': manifest['history'] + [version],
+        'updated_at': datetime.utcnow().isoformat(timespec='seconds'),
+    }
+    _write_json(os.path.join(registry_dir, MANIFEST_NAME), manifest)
+    return manifest
+
+
+def rollback(registry_dir=MODEL_REGISTRY_DIR):
+    """Re-activates the version that was active before the current one."""
+    manifest = read_manifest(registry_dir)
+    if manifest is None or len(manifest['history']) < 2:
+        raise RegistryError("There is no earlier version to roll back to.")
+    manifest['history'] = manifest['history'][:-1]
+    manifest['active'] = manifest['history'][-1]
+    manifest['updated_at'] = datetime.utcnow().isoformat(timespec='seconds')
+    _write_json(os.path.join(registry_dir, MANIFEST_NAME), manifest)
+    return manifest
+
+
+# --- CLI ---
+models_cli = AppGroup('models', help="Manage the versioned model registry.")
+
+
+@models_cli.command('list')
+def list_command():
+    """Lists the registered model versions."""
+    manifest = read_manifest() or {}
+    versions = list_versions()
+    if not versions:
+        print(f"No model versions registered in {MODEL_REGISTRY_DIR}.")
+    for v in versions:
+        marker = '*' if v['version'] == manifest.get('active') else ' '
+        print(f"{marker} {v['version']:<24} {v['backend']:<7} {v['audio_model']:<44} {v.get('registered_at', '')}"
+              f"{'  ' + v['note'] if v.get('note') else ''}")
+
+
+@models_cli.command('register')
+@click.argument('version')
+@click.option('--audio-model', required=True, type=click.Path(exists=True, dir_okay=False), help="Audio model file.")
+@click.option('--symptom-model', type=click.Path(exists=True, dir_okay=False),
+              help="Symptom model file; defaults to the active version's.")
+@click.option('--backend', type=click.Choice(sorted(set(BACKEND_EXTENSIONS.values()))),
+              help="Audio model runtime; guessed from the file extension by default.")
+@click.option('--note', help="Free-text description, e.g. the training run.")
+@click.option('--activate', is_flag=True, help="Make it the active version right away.")
+def register_command(version, audio_model, symptom_model, backend, note, activate):
+    """Copies model files into the registry as VERSION."""
+    if symptom_model is None:
+        from app.ml_logic import SYMPTOM_MODEL_PATH
+        current = active_version()
+        symptom_model = current['symptom_path'] if current else SYMPTOM_MODEL_PATH
+    try:
+        registered = register_version(version, audio_model, symptom_model, backend=backend, note=note)
+        print(f"Registered {version} ({registered['backend']}) in {MODEL_REGISTRY_DIR}.")
+        if activate:
+            activate_version(version)
+            print(f"Activated {version}.")
+    except RegistryError as e:
+        raise click.ClickException(str(e))
+
+
+@models_cli.command('activate')
+@click.argument('version')
+def activate_command(version):
+    """Makes VERSION the model every worker serves."""
+    try:
+        activate_version(version)
+    except RegistryError as e:
+        raise click.ClickException(str(e))
+    print(f"Activated {version}; workers start loading it within {MODEL_REGISTRY_POLL_S:g}s.")
+
+
+@models_cli.command('rollback')
+def rollback_command():
+    """Switches back to the previously active version."""
+    try:
+        manifest = rollback()
+    except RegistryError as e:
+        raise click.ClickException(str(e))
+    print(f"Rolled back to {manifest['active']}; workers start loading it within {MODEL_REGISTRY_POLL_S:g}s.")
+
+
+def init_app(app):
+    app.cli.add_command(models_cli)
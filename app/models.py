@@ -1,7 +1,11 @@
+import uuid
 from datetime import datetime
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
 from app import db, login
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from app.user_cache import load_user as load_cached_user
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -9,6 +13,9 @@ class User(UserMixin, db.Model):
     email = db.Column(db.String(120), index=True, unique=True)
     password_hash = db.Column(db.String(128))
     is_admin = db.Column(db.Boolean, default=False)
+    # Renewed whenever the password or admin flag changes (see below); it ends
+    # existing sessions and the cached copies of the user in every worker
+    security_stamp = db.Column(db.String(32), default=lambda: uuid.uuid4().hex)
     reports = db.relationship('Report', backref='author', lazy='dynamic')
 
     def set_password(self, password):
@@ -17,6 +24,10 @@ class User(UserMixin, db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+    def get_id(self):
+        # Flask-Login stores this in the session and remember-me cookie
+        return f'{self.id}:{self.security_stamp}'
+
     def __repr__(self):
         return f'<User {self.username}>'
 
@@ -28,12 +39,67 @@ class Report(db.Model):
     cnn_prediction = db.Column(db.Float)
     cnn_result = db.Column(db.String(20)) # 'Positive' or 'Negative'
     final_result = db.Column(db.String(20)) # Result after considering age
+    model_version = db.Column(db.String(64)) # Model registry version that scored it
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
 
+    # Serves a user's history newest first, paged by (timestamp, id)
+    __table_args__ = (db.Index('ix_report_user_id_timestamp', 'user_id', 'timestamp', 'id'),)
+
     def __repr__(self):
         return f'<Report {self.id} - {self.final_result}>'
 
+class DailyReportCount(db.Model):
+    """Reports per UTC day and final result; kept up to date by app.rollups."""
+    day = db.Column(db.Date, primary_key=True)
+    final_result = db.Column(db.String(32), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DailyReportCount {self.day} {self.final_result}: {self.count}>'
+
+class PredictionJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(10), index=True, default='pending') # 'pending', 'running', 'done' or 'failed'
+    audio_path = db.Column(db.String(255), nullable=False)
+    form_data = db.Column(db.Text, nullable=False) # JSON copy of the submitted test form
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, index=True, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime) # When a worker last claimed it
+    finished_at = db.Column(db.DateTime)
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0') # Times it has been claimed
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    report_id = db.Column(db.Integer, db.ForeignKey('report.id'))
+    user = db.relationship('User')
+    report = db.relationship('Report')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'final_result': self.report.final_result if self.report else None,
+        }
+
+    def __repr__(self):
+        return f'<PredictionJob {self.id} - {self.status}>'
+
+# --- Security Stamp ---
+SECURITY_ATTRIBUTES = ('password_hash', 'is_admin')
+
+@event.listens_for(Session, 'before_flush')
+def _renew_security_stamps(session, flush_context, instances):
+    for obj in session.dirty:
+        if isinstance(obj, User) and any(inspect(obj).attrs[name].history.has_changes() for name in SECURITY_ATTRIBUTES):
+            obj.security_stamp = uuid.uuid4().hex
+
 @login.user_loader
-def load_user(id):
-    return User.query.get(int(id))
\ No newline at end of file
+def load_user(session_id):
+    user_id, _, stamp = session_id.partition(':')
+    user = load_cached_user(User, int(user_id))
+    if user is None or user.security_stamp != stamp:
+        return None # Signed in before a password or admin change, or before stamps existed
+    return user
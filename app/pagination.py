@@ -0,0 +1,72 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import tuple_
+
+
+class KeysetPage:
+    """One page of rows plus opaque cursors for the neighbouring pages (None at either end)."""
+    def __init__(self, items, next_cursor, prev_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """Returns the key values in a cursor, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if len(values) != len(columns):
+            return None
+        return tuple(
+            datetime.fromisoformat(v) if column.type.python_type is datetime else column.type.python_type(v)
+            for column, v in zip(columns, values)
+        )
+    except (ValueError, TypeError, NotImplementedError):
+        return None
+
+
+def keyset_page(query, columns, per_page, after=None, before=None, descending=False):
+    """
+    Pages through `query` in the order of `columns`, which must end in a
+    unique column (e.g. (timestamp, id)). Instead of an OFFSET, a page
+    starts right after the key of the row that ended the previous one, so
+    every page costs one index range scan however deep it is.
+
+    `after` continues forwards from a next_cursor, `before` goes back from a
+    prev_cursor; with neither, the first page is returned.
+    """
+    key = tuple_(*columns)
+    after_key, before_key = decode_cursor(after, columns), decode_cursor(before, columns)
+    backwards = before_key is not None and after_key is None
+
+    # Walking backwards reads the preceding rows in reverse order
+    reverse = descending != backwards
+    order = [column.desc() if reverse else column.asc() for column in columns]
+    if backwards:
+        query = query.filter(key > before_key if descending else key < before_key)
+    elif after_key is not None:
+        query = query.filter(key < after_key if descending else key > after_key)
+    rows = query.order_by(*order).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    def cursor(row):
+        return encode_cursor([getattr(row, column.key) for column in columns])
+    has_next = has_more if not backwards else True
+    has_prev = (after_key is not None) if not backwards else has_more
+    return KeysetPage(
+        rows,
+        next_cursor=cursor(rows[-1]) if rows and has_next else None,
+        prev_cursor=cursor(rows[0]) if rows and has_prev else None,
+    )
@@ -0,0 +1,170 @@
+import fcntl
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# --- Configuration ---
+COUNTERS = ('hits', 'misses', 'coalesced', 'evictions', 'expirations')
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """Returns the sha256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """
+    On-disk cache of audio model probabilities keyed by the content hash of an
+    upload plus a model/preprocessing version string. Entries live in a SQLite
+    database that every gunicorn worker on the host opens, and are evicted
+    least-recently-used beyond `max_entries` or once older than `ttl_s`.
+
+    get_or_compute() coalesces concurrent misses for the same key, across
+    threads and processes, so the pipeline runs once per upload.
+    """
+    def __init__(self, directory, max_entries=10000, ttl_s=7 * 24 * 3600):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._lock_dir = os.path.join(directory, 'locks')
+        os.makedirs(self._lock_dir, exist_ok=True)
+        self._db_path = os.path.join(directory, 'predictions.sqlite3')
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS predictions ('
+                'key TEXT PRIMARY KEY, audio_proba REAL NOT NULL, '
+                'created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_predictions_accessed_at ON predictions (accessed_at)')
+            conn.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            conn.executemany('INSERT OR IGNORE INTO counters VALUES (?, 0)', [(name,) for name in COUNTERS])
+
+    def _connect(self):
+        # One connection per thread; SQLite connections must not be shared
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self._db_path, timeout=30)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(content_hash, version):
+        return hashlib.sha256(f"{version}:{content_hash}".encode()).hexdigest()
+
+    def _count(self, conn, name, amount=1):
+        conn.execute('UPDATE counters SET value = value + ? WHERE name = ?', (amount, name))
+
+    def _lookup(self, conn, key):
+        now = time.time()
+        row = conn.execute('SELECT audio_proba, created_at FROM predictions WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        if now - row[1] > self.ttl_s:
+            conn.execute('DELETE FROM predictions WHERE key = ?', (key,))
+            self._count(conn, 'expirations')
+            return None
+        conn.execute('UPDATE predictions SET accessed_at = ? WHERE key = ?', (now, key))
+        return row[0]
+
+    def get(self, key):
+        """Returns the cached probability for `key`, or None."""
+        conn = self._connect()
+        with conn:
+            value = self._lookup(conn, key)
+            self._count(conn, 'hits' if value is not None else 'misses')
+        return value
+
+    def put(self, key, audio_proba):
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)', (key, float(audio_proba), now, now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        expired = conn.execute('DELETE FROM predictions WHERE created_at < ?', (now - self.ttl_s,)).rowcount
+        if expired:
+            self._count(conn, 'expirations', expired)
+        excess = conn.execute('SELECT COUNT(*) FROM predictions').fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute(
+                'DELETE FROM predictions WHERE key IN '
+                '(SELECT key FROM predictions ORDER BY accessed_at LIMIT ?)', (excess,)
+            )
+            self._count(conn, 'evictions', excess)
+
+    @contextmanager
+    def _key_lock(self, key):
+        # One lock file per key, so only requests for the same upload wait on
+        # each other. flock locks are per open file, so this serialises threads
+        # of one worker as well as separate workers. The holder deletes the file
+        # before unlocking; a waiter that then gets the lock on the deleted file
+        # sees it is stale and starts over on the current one.
+        path = os.path.join(self._lock_dir, f"{key}.lock")
+        while True:
+            lock_file = open(path, 'a')
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if os.stat(path).st_ino == os.fstat(lock_file.fileno()).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            lock_file.close()
+        try:
+            yield
+        finally:
+            os.remove(path)
+            lock_file.close()
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the cached probability for `key`, or calls compute(), stores
+        its result and returns it. Exceptions from compute() are not cached.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._key_lock(key):
+            # Another request may have finished the same upload while we waited
+            conn = self._connect()
+            with conn:
+                value = self._lookup(conn, key)
+                if value is not None:
+                    self._count(conn, 'coalesced')
+            if value is not None:
+                return value
+            value = compute()
+            self.put(key, value)
+            return value
+
+    def stats(self):
+        """Returns entry count and the hit/miss counters shared by all workers."""
+        conn = self._connect()
+        counters = dict(conn.execute('SELECT name, value FROM counters').fetchall())
+        entries = conn.execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+        lookups = counters['hits'] + counters['misses']
+        return dict(
+            counters,
+            entries=entries,
+            max_entries=self.max_entries,
+            ttl_s=self.ttl_s,
+            hit_rate=(counters['hits'] + counters['coalesced']) / lookups if lookups else 0.0,
+        )
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM predictions')
+            conn.execute('UPDATE counters SET value = 0')
@@ -0,0 +1,126 @@
+from collections import Counter
+from datetime import date, datetime, timedelta
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app import db
+from app.models import DailyReportCount, Report
+
+# --- Configuration ---
+UNKNOWN_RESULT = 'Unknown' # Rollup label for reports without a final result
+POSITIVE_RESULT = 'Positive'
+CHART_DAYS = 30 # Length of the admin dashboard's daily time series
+
+
+# --- Incremental Maintenance ---
+def _rollup_key(report):
+    timestamp = report.timestamp or datetime.utcnow()
+    return timestamp.date(), report.final_result or UNKNOWN_RESULT
+
+
+def _apply(connection, changes):
+    """Adds each (day, final_result) delta to the rollup table as an upsert."""
+    table = DailyReportCount.__table__
+    for (day, final_result), delta in changes.items():
+        if delta == 0:
+            continue
+        dialect = connection.dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            insert = (sqlite.insert if dialect == 'sqlite' else postgresql.insert)(table)
+            connection.execute(
+                insert.values(day=day, final_result=final_result, count=delta)
+                .on_conflict_do_update(index_elements=['day', 'final_result'], set_={'count': table.c.count + delta})
+            )
+        else:
+            updated = connection.execute(
+                table.update().where(table.c.day == day, table.c.final_result == final_result)
+                .values(count=table.c.count + delta)
+            ).rowcount
+            if not updated:
+                connection.execute(table.insert().values(day=day, final_result=final_result, count=delta))
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_rollups(session, flush_context):
+    # Runs inside the flush, so the counts commit or roll back together with
+    # the reports that changed them
+    changes = Counter()
+    for obj in session.new:
+        if isinstance(obj, Report):
+            changes[_rollup_key(obj)] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Report):
+            changes[_rollup_key(obj)] -= 1
+    if changes:
+        _apply(session.connection(), changes)
+
+
+# --- Rebuild ---
+def rebuild_rollups():
+    """
+    Recomputes every rollup row from the report table, e.g. after a backfill
+    or bulk import that bypassed the ORM. Returns the number of rows written.
+    Must be called inside an application context.
+    """
+    day = func.date(Report.timestamp)
+    rows = (
+        db.session.query(day, Report.final_result, func.count(Report.id))
+        .filter(Report.timestamp.isnot(None)).group_by(day, Report.final_result).all()
+    )
+    counts = Counter()
+    for report_day, final_result, count in rows:
+        if isinstance(report_day, str):
+            report_day = date.fromisoformat(report_day) # SQLite returns date() as text
+        counts[(report_day, final_result or UNKNOWN_RESULT)] += count
+    db.session.query(DailyReportCount).delete()
+    db.session.add_all(
+        DailyReportCount(day=report_day, final_result=final_result, count=count)
+        for (report_day, final_result), count in counts.items()
+    )
+    db.session.commit()
+    return len(counts)
+
+
+@click.command('rebuild-rollups')
+@with_appcontext
+def rebuild_rollups_command():
+    """Rebuilds the admin dashboard's daily report counts from the report table."""
+    print(f"Rebuilt {rebuild_rollups()} daily rollup row(s).")
+
+
+# --- Queries ---
+def result_totals():
+    """Returns [(final_result, count)] over all time, largest first."""
+    total = func.sum(DailyReportCount.count)
+    return [
+        (final_result, int(count)) for final_result, count in
+        db.session.query(DailyReportCount.final_result, total)
+        .group_by(DailyReportCount.final_result).having(total > 0).order_by(total.desc()).all()
+    ]
+
+
+def daily_series(days):
+    """
+    Returns (labels, submissions, positives) for the last `days` UTC days,
+    with zeros on days without reports.
+    """
+    start = datetime.utcnow().date() - timedelta(days=days - 1)
+    submissions, positives = Counter(), Counter()
+    for day, final_result, count in db.session.query(
+        DailyReportCount.day, DailyReportCount.final_result, DailyReportCount.count
+    ).filter(DailyReportCount.day >= start):
+        submissions[day] += count
+        if final_result == POSITIVE_RESULT:
+            positives[day] += count
+    all_days = [start + timedelta(days=i) for i in range(days)]
+    return (
+        [day.isoformat() for day in all_days],
+        [submissions[day] for day in all_days],
+        [positives[day] for day in all_days],
+    )
+
+
+def init_app(app):
+    app.cli.add_command(rebuild_rollups_command)
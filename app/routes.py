@@ -1,15 +1,18 @@
-import os
-from datetime import datetime
+from datetime import datetime, timedelta
 from functools import wraps
-from flask import Blueprint, render_template, flash, redirect, url_for, request, current_app
+from flask import Blueprint, render_template, flash, redirect, url_for, request, jsonify, abort, current_app
 from flask_login import current_user, login_required
-from werkzeug.utils import secure_filename
-from sqlalchemy import func
+from sqlalchemy import func, or_
 from app import db
-from app.models import User, Report
-# IMPORTANT: We import the master prediction function
-from app.ml_logic import get_combined_prediction
-from app.email import send_email
+from app.models import User, Report, PredictionJob
+from app.pagination import keyset_page
+from app.rollups import CHART_DAYS, daily_series, result_totals
+# IMPORTANT: Predictions run in the background job queue
+from app.jobs import enqueue_prediction, QueueFullError
+from app.metrics import count_failure, render_metrics, stage_timer, track_request
+from app.ml_logic import get_cache_stats, get_inference_stats, get_model_stats
+from app.uploads import UploadRejected, discard_upload, save_upload, validate_upload
+from app.user_cache import get_user_cache_stats
 
 bp = Blueprint('main', __name__)
 
@@ -36,9 +39,27 @@ def index():
 @bp.route('/dashboard')
 @login_required
 def dashboard():
-    """Renders the main user dashboard, which displays past reports."""
-    reports = Report.query.filter_by(user_id=current_user.id).order_by(Report.timestamp.desc()).all()
-    return render_template('dashboard.html', title='Dashboard', reports=reports)
+    """Renders the main user dashboard, which displays past reports a page at a time."""
+    reports = keyset_page(
+        Report.query.filter_by(user_id=current_user.id), [Report.timestamp, Report.id],
+        current_app.config['PAGE_SIZE'], after=request.args.get('after'), before=request.args.get('before'),
+        descending=True
+    )
+    # Tests still being analysed, plus any that failed in the last day
+    recent = datetime.utcnow() - timedelta(days=1)
+    jobs = PredictionJob.query.filter(
+        PredictionJob.user_id == current_user.id,
+        PredictionJob.status != 'done',
+        or_(PredictionJob.status != 'failed', PredictionJob.created_at >= recent)
+    ).order_by(PredictionJob.created_at.desc()).all()
+    return render_template('dashboard.html', title='Dashboard', reports=reports, jobs=jobs)
+
+@bp.route('/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    """Returns the status of one of the current user's prediction jobs as JSON."""
+    job = PredictionJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    return jsonify(job.to_dict())
 
 # STAGE 1: Serves the symptom form and handles its submission.
 @bp.route('/new_test', methods=['GET', 'POST'])
@@ -70,8 +91,9 @@ def new_test():
 # STAGE 2: Serves the audio form and handles the final combined prediction.
 @bp.route('/audio_test', methods=['GET', 'POST'])
 @login_required
+@track_request('audio_test')
 def audio_test():
-    """On GET, displays audio form. On POST, runs both models and saves the report."""
+    """On GET, displays audio form. On POST, queues both models to run and save the report."""
     if request.method == 'POST':
         # Determine which audio file source was used.
         if 'uploaded_audio_data' in request.files and request.files['uploaded_audio_data'].filename != '':
@@ -82,61 +104,38 @@ def audio_test():
             flash('No audio file was provided. Please record or upload a file.', 'danger')
             return redirect(url_for('main.audio_test', **request.form))
 
-        # --- Prepare data for BOTH models ---
-        
-        # 1. Prepare data for Symptom Model (M1)
-        symptom_data_for_model = {
-            'tremor': 1 if request.form.get('tremor') != 'no' else 0,
-            'stiffness': 1 if request.form.get('stiffness') == 'yes' else 0,
-            'walking_issue': 1 if request.form.get('balance') == 'yes' else 0 # Correctly use 'balance' from form for 'walking_issue' feature
-        }
-
-        # 2. Get user age and gender
+        # Check the data both models need before accepting the upload
         age = request.form.get('age', type=int)
         gender = request.form.get('gender')
 
         if not age or not gender:
+            file.close()
             flash('Required user data was lost. Please start the test over.', 'danger')
             return redirect(url_for('main.new_test'))
-            
-        # Save the audio file temporarily
-        base_filename = secure_filename(file.filename if file.filename else "recording.webm")
-        unique_filename = f"user_{current_user.id}_{datetime.utcnow().timestamp()}_{base_filename}"
-        audio_path = os.path.join('temp_uploads', unique_filename)
-        file.save(audio_path)
-        
-        # Call the master prediction function from ml_logic
-        final_result, cnn_result, cnn_pred_value = get_combined_prediction(symptom_data_for_model, audio_path, age)
-        
-        # Create a detailed string for the database report
-        symptoms_for_report = (
-            f"Tremor: {request.form.get('tremor', 'N/A').replace('_', ' ').title()}, "
-            f"Stiffness: {request.form.get('stiffness', 'N/A').title()}, "
-            f"Balance: {request.form.get('balance', 'N/A').title()}. "
-            f"Other Notes: {request.form.get('other_symptoms', 'None')}"
-        )
-
-        # Save the final report to the database
-        report = Report(age=age, gender=gender, symptoms=symptoms_for_report, cnn_prediction=cnn_pred_value, cnn_result=cnn_result, final_result=final_result, author=current_user)
-        db.session.add(report)
-        db.session.commit()
-
-        # Prepare a dictionary for the email template for nicer formatting
-        symptoms_for_email = {
-            "Tremor": request.form.get('tremor', 'N/A').replace('_', ' ').title(),
-            "Stiffness or Slowness": request.form.get('stiffness', 'N/A').title(),
-            "Balance Issues": request.form.get('balance', 'N/A').title(),
-            "Other Notes": request.form.get('other_symptoms', 'None')
-        }
-        send_email(
-            '[Parkinson Detection System] Your Test Result',
-            sender=current_app.config['ADMINS'][0], recipients=[current_user.email],
-            text_body=render_template('email/result_notification.txt', user=current_user, report=report, symptoms=symptoms_for_email),
-            html_body=render_template('email/result_notification.html', user=current_user, report=report, symptoms=symptoms_for_email)
-        )
-        
-        flash('Your test is complete! The result has been sent to your email and is available on your dashboard.', 'success')
-        if os.path.exists(audio_path): os.remove(audio_path)
+
+        # Reject unusable audio before it is written anywhere or queued
+        audio_path, queued = None, False
+        try:
+            with stage_timer('upload_validation'):
+                container = validate_upload(file)
+            audio_path = save_upload(file, current_user.id, container)
+
+            # Queue the prediction; the worker saves the report, sends the email and deletes the file
+            enqueue_prediction(current_user, audio_path, request.form.to_dict())
+            queued = True
+        except UploadRejected as e:
+            count_failure('upload_rejected')
+            flash(str(e), 'danger')
+            return redirect(url_for('main.audio_test', **request.form))
+        except QueueFullError:
+            flash('The system is busy right now. Please submit your test again in a minute.', 'warning')
+            return redirect(url_for('main.audio_test', **request.form))
+        finally:
+            file.close()
+            if not queued:
+                discard_upload(audio_path)
+
+        flash('Your test has been submitted! The result will appear on your dashboard and be sent to your email shortly.', 'success')
         return redirect(url_for('main.dashboard'))
     
     # For a GET request, pass URL parameters to the template as hidden fields
@@ -150,23 +149,69 @@ def audio_test():
 @login_required
 @admin_required
 def admin_dashboard():
+    # Report statistics come from the daily rollups, never the report table
     user_count = User.query.count()
-    report_count = Report.query.count()
-    result_stats = db.session.query(Report.final_result, func.count(Report.final_result)).group_by(Report.final_result).all()
+    result_stats = result_totals()
+    report_count = sum(count for result, count in result_stats)
     chart_labels = [result for result, count in result_stats]
     chart_data = [count for result, count in result_stats]
+    series_labels, series_submissions, series_positives = daily_series(CHART_DAYS)
     return render_template(
         'admin/dashboard.html', 
         title='Admin Dashboard', 
         user_count=user_count, 
         report_count=report_count,
         chart_labels=chart_labels,
-        chart_data=chart_data
+        chart_data=chart_data,
+        chart_days=CHART_DAYS,
+        series_labels=series_labels,
+        series_submissions=series_submissions,
+        series_positives=series_positives
     )
 
 @bp.route('/admin/users')
 @login_required
 @admin_required
 def admin_users():
-    users = User.query.order_by(User.id).all()
-    return render_template('admin/users.html', title='Manage Users', users=users)
\ No newline at end of file
+    users = keyset_page(
+        User.query, [User.id], current_app.config['PAGE_SIZE'],
+        after=request.args.get('after'), before=request.args.get('before')
+    )
+    # Report counts for the whole page in one grouped query
+    user_ids = [user.id for user in users.items]
+    report_counts = dict(
+        db.session.query(Report.user_id, func.count(Report.id))
+        .filter(Report.user_id.in_(user_ids)).group_by(Report.user_id).all()
+    ) if user_ids else {}
+    return render_template('admin/users.html', title='Manage Users', users=users, report_counts=report_counts)
+
+@bp.route('/admin/inference_stats')
+@login_required
+@admin_required
+def admin_inference_stats():
+    """
+    Returns the model version, micro-batching statistics and user cache
+    counters of this worker, and the prediction cache counters shared by all
+    workers, as JSON.
+    """
+    return jsonify(
+        models=get_model_stats() or {},
+        batching=get_inference_stats() or {},
+        prediction_cache=get_cache_stats() or {},
+        user_cache=get_user_cache_stats() or {}
+    )
+
+# =============================================================================
+# === MONITORING
+# =============================================================================
+@bp.route('/metrics')
+def metrics():
+    """
+    Prometheus text exposition of the pipeline metrics of every worker. When
+    METRICS_TOKEN is set, scrapers must send it as a bearer token.
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        abort(401)
+    body, content_type = render_metrics()
+    return body, 200, {'Content-Type': content_type}
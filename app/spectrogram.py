@@ -0,0 +1,157 @@
+import io
+from functools import lru_cache
+import numpy as np
+import librosa
+import noisereduce as nr
+from app.dsp import get_engine
+
+# --- Configuration ---
+N_FFT = 1024
+HOP_LENGTH = 256
+IMG_HEIGHT, IMG_WIDTH = 224, 224
+
+# The training PNGs are a 12x4 inch figure at 100 dpi cropped to the axes,
+# which leaves a 930x308 pixel image before Keras resizes it to 224x224.
+RENDER_HEIGHT, RENDER_WIDTH = 308, 930
+
+# specshow(y_axis='log') uses a base-2 symlog scale that is linear below C2.
+LOG_AXIS_LINTHRESH = 65.40639132514966
+
+# Maximum mean absolute pixel difference (0-1 scale) allowed between the
+# in-memory renderer and the matplotlib PNG pipeline.
+PARITY_TOLERANCE = 0.01
+
+# Maximum absolute dB difference allowed between the single-pass DSP engine
+# and noisereduce + librosa.stft.
+DSP_PARITY_TOLERANCE_DB = 0.05
+
+
+# --- STFT ---
+def compute_stft_db(y_segment, sr):
+    """
+    Denoises a fixed-length segment and returns its dB-scaled STFT magnitude,
+    using the single-pass engine in app.dsp. A (windows, samples) array is
+    processed as a batch, giving (windows, bins, frames).
+    """
+    return get_engine(N_FFT, HOP_LENGTH).stft_db(y_segment, sr)
+
+
+def compute_stft_db_reference(y_segment, sr):
+    """
+    The original two-step pipeline: noisereduce, then a second STFT. Only
+    used to check the DSP engine against it.
+    """
+    y_reduced = nr.reduce_noise(y=y_segment, sr=sr)
+    S_audio = librosa.stft(y_reduced, n_fft=N_FFT, hop_length=HOP_LENGTH)
+    return librosa.amplitude_to_db(np.abs(S_audio), ref=np.max)
+
+
+def check_dsp_parity(y_segment, sr, tolerance=DSP_PARITY_TOLERANCE_DB):
+    """
+    Returns (maximum absolute dB difference, within tolerance) between the DSP
+    engine and the reference pipeline for one segment.
+    """
+    difference = float(np.max(np.abs(compute_stft_db(y_segment, sr) - compute_stft_db_reference(y_segment, sr))))
+    return difference, difference <= tolerance
+
+
+# --- In-Memory Rendering ---
+def _symlog(x):
+    x = np.asarray(x, dtype=np.float64)
+    log_part = LOG_AXIS_LINTHRESH * (1.0 + np.log2(np.maximum(np.abs(x), 1e-12) / LOG_AXIS_LINTHRESH))
+    return np.where(np.abs(x) <= LOG_AXIS_LINTHRESH, x, np.sign(x) * log_part)
+
+
+def _inverse_symlog(y):
+    y = np.asarray(y, dtype=np.float64)
+    log_part = LOG_AXIS_LINTHRESH * np.exp2(np.abs(y) / LOG_AXIS_LINTHRESH - 1.0)
+    return np.where(np.abs(y) <= LOG_AXIS_LINTHRESH, y, np.sign(y) * log_part)
+
+
+@lru_cache(maxsize=32)
+def _pixel_index_maps(n_bins, n_frames, sr, height, width):
+    """
+    Works out which (frequency bin, frame) of the STFT lands on each output
+    pixel, reproducing specshow's log axis followed by a nearest-neighbour resize.
+    """
+    # Bin edges exactly as pcolormesh(shading='nearest') builds them
+    df = sr / (2.0 * (n_bins - 1))
+    freqs = np.arange(n_bins) * df
+    edges = np.concatenate([[freqs[0] - df / 2], (freqs[1:] + freqs[:-1]) / 2, [freqs[-1] + df / 2]])
+    y_low, y_high = _symlog(edges[0]), _symlog(edges[-1])
+
+    # Pixels of the full-size render that the nearest-neighbour resize picks
+    rows = np.floor((np.arange(height) + 0.5) * RENDER_HEIGHT / height)
+    cols = np.floor((np.arange(width) + 0.5) * RENDER_WIDTH / width)
+
+    # Row 0 is the top of the image, i.e. the highest frequency
+    row_freqs = _inverse_symlog(y_high - (rows + 0.5) / RENDER_HEIGHT * (y_high - y_low))
+    bin_index = np.clip(np.searchsorted(edges, row_freqs, side='right') - 1, 0, n_bins - 1)
+    frame_index = np.clip(np.floor((cols + 0.5) / RENDER_WIDTH * n_frames).astype(int), 0, n_frames - 1)
+    return bin_index, frame_index
+
+
+def render_spectrogram(Y_db, sr, size=(IMG_HEIGHT, IMG_WIDTH)):
+    """
+    Renders a dB spectrogram to a uint8 grayscale image without matplotlib.
+    The result matches the PNG written by specshow(cmap='gray_r') and loaded
+    back with Keras' load_img(target_size=size, color_mode='grayscale').
+    A (clips, bins, frames) stack renders to (clips, height, width), each
+    clip scaled on its own.
+    """
+    n_bins, n_frames = Y_db.shape[-2:]
+    bin_index, frame_index = _pixel_index_maps(n_bins, n_frames, float(sr), size[0], size[1])
+
+    # Normalize to [0, 1] like matplotlib's autoscaled Normalize, then apply
+    # the 256-entry gray_r lookup table. The range comes from the whole
+    # spectrogram, but only the pixels the image shows are converted.
+    vmin = Y_db.min(axis=(-2, -1), keepdims=True)
+    span = Y_db.max(axis=(-2, -1), keepdims=True).astype(np.float64) - vmin.astype(np.float64)
+    shown = Y_db[..., bin_index[:, np.newaxis], frame_index[np.newaxis, :]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        levels = np.where(span > 0, (shown - vmin) / span.astype(Y_db.dtype), 0)
+    lut_index = np.clip((levels * 256).astype(np.int16), 0, 255)
+    return (255 - lut_index).astype(np.uint8)
+
+
+def spectrogram_to_tensor(pixels):
+    """
+    Converts a uint8 spectrogram image into a (1, H, W, 1) float32 model
+    input, or a (clips, H, W) stack into a (clips, H, W, 1) batch.
+    """
+    tensor = pixels.astype(np.float32) / 255.0
+    return tensor.reshape((-1,) + tensor.shape[-2:] + (1,))
+
+
+# --- Reference PNG Pipeline ---
+def render_spectrogram_png(Y_db, sr, size=(IMG_HEIGHT, IMG_WIDTH)):
+    """
+    Renders through the original specshow/savefig/load_img path, in memory.
+    Only used to check the array renderer against the training images.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import librosa.display
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    plt.figure(figsize=(12, 4))
+    librosa.display.specshow(Y_db, sr=sr, hop_length=HOP_LENGTH, x_axis='time', y_axis='log', cmap='gray_r')
+    plt.axis('off')
+    plt.savefig(buffer, bbox_inches='tight', pad_inches=0)
+    plt.close()
+    buffer.seek(0)
+    img = Image.open(buffer).convert('L').resize((size[1], size[0]), Image.NEAREST)
+    return np.asarray(img, dtype=np.uint8)
+
+
+def check_render_parity(Y_db, sr, tolerance=PARITY_TOLERANCE):
+    """
+    Returns (mean absolute difference, within tolerance) between the array
+    renderer and the matplotlib PNG pipeline for one spectrogram.
+    """
+    expected = render_spectrogram_png(Y_db, sr).astype(np.float32) / 255.0
+    actual = render_spectrogram(Y_db, sr).astype(np.float32) / 255.0
+    difference = float(np.mean(np.abs(expected - actual)))
+    return difference, difference <= tolerance
@@ -54,4 +54,44 @@ document.addEventListener("DOMContentLoaded", function () {
       },
     })
   }
+
+  // Daily submissions and positives from the rollup table
+  if (
+    document.getElementById("dailyChart") &&
+    typeof seriesLabels !== "undefined"
+  ) {
+    new Chart(document.getElementById("dailyChart"), {
+      type: "line",
+      data: {
+        labels: seriesLabels,
+        datasets: [
+          {
+            label: "Submissions",
+            data: seriesSubmissions,
+            borderColor: "#4e73df",
+            backgroundColor: "rgba(78, 115, 223, 0.05)",
+            fill: true,
+            tension: 0.3,
+          },
+          {
+            label: "Positive",
+            data: seriesPositives,
+            borderColor: "#f6c23e",
+            backgroundColor: "rgba(246, 194, 62, 0.05)",
+            fill: true,
+            tension: 0.3,
+          },
+        ],
+      },
+      options: {
+        maintainAspectRatio: false,
+        scales: {
+          y: { beginAtZero: true, ticks: { precision: 0 } },
+        },
+        plugins: {
+          legend: { position: "bottom" },
+        },
+      },
+    })
+  }
 })
@@ -0,0 +1,31 @@
+document.addEventListener("DOMContentLoaded", function () {
+  // Poll every test that is still being analysed (rendered in dashboard.html)
+  const pendingJobs = document.querySelectorAll(
+    "[data-job-url][data-job-status='pending'], [data-job-url][data-job-status='running']"
+  )
+  if (pendingJobs.length === 0) return
+
+  const POLL_INTERVAL_MS = 3000
+
+  function poll() {
+    const requests = Array.from(pendingJobs).map((item) =>
+      fetch(item.dataset.jobUrl, { headers: { Accept: "application/json" } })
+        .then((response) => (response.ok ? response.json() : null))
+        .catch(() => null)
+    )
+
+    Promise.all(requests).then((jobs) => {
+      // Reload once any job has finished so the new report (or error) is shown
+      const finished = jobs.some(
+        (job) => job && (job.status === "done" || job.status === "failed")
+      )
+      if (finished) {
+        window.location.reload()
+      } else {
+        setTimeout(poll, POLL_INTERVAL_MS)
+      }
+    })
+  }
+
+  setTimeout(poll, POLL_INTERVAL_MS)
+})
@@ -0,0 +1,207 @@
+import os
+import subprocess
+import time
+from datetime import datetime
+from tempfile import SpooledTemporaryFile
+import click
+import numpy as np
+from flask import Request, current_app
+from flask.cli import with_appcontext
+from werkzeug.utils import secure_filename
+
+# --- Configuration ---
+UPLOAD_DIR = 'temp_uploads'
+UPLOAD_MAX_AGE_S = int(os.environ.get('UPLOAD_MAX_AGE_S') or 24 * 3600) # Unclaimed uploads older than this are swept
+MIN_DURATION_S = float(os.environ.get('UPLOAD_MIN_DURATION_S') or 1.0)
+INSPECT_DURATION_S = 10 # Level checks look at the start of the recording only
+SILENCE_DBFS = float(os.environ.get('UPLOAD_SILENCE_DBFS') or -50) # Loudest 50 ms below this is silence
+CLIPPING_LEVEL = 0.999
+CLIPPING_FRACTION = float(os.environ.get('UPLOAD_CLIPPING_FRACTION') or 0.01)
+SNIFF_BYTES = 12
+
+# Extension each sniffed container is saved under; the decoders pick by extension
+CONTAINER_EXTENSIONS = {
+    'webm': '.webm', 'wav': '.wav', 'ogg': '.ogg', 'flac': '.flac',
+    'mp3': '.mp3', 'mp4': '.m4a', 'aac': '.aac',
+}
+
+
+class UploadRejected(Exception):
+    """Raised when an upload fails validation; the message is shown to the user."""
+
+
+def sniff_container(head):
+    """Names the audio container from the first bytes of a file, or returns None."""
+    if head.startswith(b'\x1a\x45\xdf\xa3'):
+        return 'webm' # EBML: webm and matroska
+    if head.startswith(b'RIFF') and head[8:12] == b'WAVE':
+        return 'wav'
+    if head.startswith(b'OggS'):
+        return 'ogg'
+    if head.startswith(b'fLaC'):
+        return 'flac'
+    if head[4:8] == b'ftyp':
+        return 'mp4'
+    if head.startswith(b'ID3'):
+        return 'mp3'
+    if len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+        # MPEG frame sync; layer bits 00 mark an ADTS (AAC) stream
+        return 'aac' if head[1] & 0x06 == 0 else 'mp3'
+    return None
+
+
+# --- Spooled Upload Buffer ---
+class UploadBuffer(SpooledTemporaryFile):
+    """
+    Receives a file part of a multipart upload. The data stays in memory up to
+    `max_memory` bytes and only then spills to an anonymous temporary file.
+    The container is sniffed from the first chunk, and an unknown container
+    or more than `max_bytes` rejects the upload: the rest of the body is then
+    drained without being stored.
+    """
+    def __init__(self, max_memory, max_bytes):
+        super().__init__(max_size=max_memory, mode='w+b')
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.head = b''
+        self.container = None
+        self.rejection = None
+
+    def write(self, data):
+        if self.rejection is not None:
+            return len(data)
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.reject(f"The recording is larger than {self.max_bytes / (1024 * 1024):.0f} MB.")
+            return len(data)
+        if len(self.head) < SNIFF_BYTES:
+            self.head += bytes(data[:SNIFF_BYTES - len(self.head)])
+            if len(self.head) >= SNIFF_BYTES:
+                self.container = sniff_container(self.head)
+                if self.container is None:
+                    self.reject("The file is not a supported audio format.")
+                    return len(data)
+        return super().write(data)
+
+    def reject(self, message):
+        # Drop what was stored so far; nothing more is kept
+        self.rejection = message
+        super().seek(0)
+        super().truncate(0)
+
+
+class UploadRequest(Request):
+    """Request class that streams file uploads into UploadBuffers."""
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadBuffer(current_app.config['UPLOAD_MEMORY_BYTES'], current_app.config['UPLOAD_MAX_BYTES'])
+
+
+# --- Validation ---
+def validate_upload(file):
+    """
+    Runs the cheap checks on an uploaded FileStorage before any of the model
+    pipeline: size and container (already done while streaming), then length,
+    silence and clipping from a decode of at most INSPECT_DURATION_S seconds
+    of the buffer. Returns the container name or raises UploadRejected.
+    """
+    buffer = file.stream
+    if not isinstance(buffer, UploadBuffer):
+        raise UploadRejected("The upload could not be read.")
+    if buffer.rejection is not None:
+        raise UploadRejected(buffer.rejection)
+    if buffer.size == 0:
+        raise UploadRejected("The recording is empty.")
+    container = buffer.container or sniff_container(buffer.head)
+    if container is None:
+        raise UploadRejected("The file is not a supported audio format.")
+
+    from app.audio import FFMPEG_FORMATS, read_head
+    buffer.seek(0)
+    try:
+        y, sr, n_samples = read_head(buffer, CONTAINER_EXTENSIONS[container] in FFMPEG_FORMATS, INSPECT_DURATION_S)
+    except Exception as e:
+        print(f"Rejected an unreadable {container} upload: {e}")
+        raise UploadRejected("The recording could not be read as audio.")
+    finally:
+        buffer.seek(0)
+
+    if (n_samples if n_samples is not None else len(y)) < MIN_DURATION_S * sr:
+        raise UploadRejected(f"The recording is shorter than {MIN_DURATION_S:g} seconds.")
+    if loudest_dbfs(y, sr) < SILENCE_DBFS:
+        raise UploadRejected("The recording is silent. Please check your microphone and try again.")
+    if np.mean(np.abs(y) >= CLIPPING_LEVEL) > CLIPPING_FRACTION:
+        raise UploadRejected("The recording is too loud and distorted. Please move away from the microphone and try again.")
+    return container
+
+
+def loudest_dbfs(y, sr, frame_s=0.05):
+    """Level of the loudest `frame_s` frame of `y` in dB relative to full scale."""
+    frame = max(1, int(frame_s * sr))
+    n_frames = max(1, len(y) // frame)
+    padded = np.zeros(n_frames * frame, np.float32)
+    padded[:min(len(y), len(padded))] = y[:len(padded)]
+    rms = np.sqrt(np.mean(np.square(padded.reshape(n_frames, frame)), axis=1)).max()
+    return 20 * np.log10(max(float(rms), 1e-10))
+
+
+# --- Storage ---
+def save_upload(file, user_id, container):
+    """
+    Writes a validated upload into UPLOAD_DIR for the prediction worker, named
+    by the sniffed container so the decoder matches the content. Returns the path.
+    """
+    stem = os.path.splitext(secure_filename(file.filename or '') or 'recording')[0] or 'recording'
+    filename = f"user_{user_id}_{datetime.utcnow().timestamp()}_{stem}{CONTAINER_EXTENSIONS[container]}"
+    audio_path = os.path.join(UPLOAD_DIR, filename)
+    file.save(audio_path)
+    return audio_path
+
+
+def discard_upload(audio_path):
+    if audio_path and os.path.exists(audio_path):
+        os.remove(audio_path)
+
+
+def _tracked_files(directory):
+    # Sample recordings committed to the repository (used by rescore.py and
+    # the benchmarks) are never swept; outside a git checkout there are none
+    try:
+        result = subprocess.run(['git', 'ls-files', '-z', '--', '.'], cwd=directory, check=True,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return set()
+    return {os.path.abspath(os.path.join(directory, name)) for name in result.stdout.decode().split('\0') if name}
+
+
+def sweep_stale_uploads(max_age_s=UPLOAD_MAX_AGE_S):
+    """
+    Deletes files in UPLOAD_DIR older than `max_age_s` that no pending or
+    running job still needs and that are not tracked by git. Must be called
+    inside an application context; run it from cron via `flask sweep-uploads`.
+    """
+    from app.models import PredictionJob
+    in_use = {
+        os.path.abspath(job.audio_path)
+        for job in PredictionJob.query.filter(PredictionJob.status.in_(['pending', 'running']))
+    }
+    in_use |= _tracked_files(UPLOAD_DIR)
+    cutoff = time.time() - max_age_s
+    removed = 0
+    for entry in os.scandir(UPLOAD_DIR):
+        if entry.is_file() and entry.stat().st_mtime < cutoff and os.path.abspath(entry.path) not in in_use:
+            os.remove(entry.path)
+            removed += 1
+    return removed
+
+
+@click.command('sweep-uploads')
+@click.option('--max-age', type=int, default=UPLOAD_MAX_AGE_S, help="Age in seconds beyond which uploads are removed.")
+@with_appcontext
+def sweep_uploads(max_age):
+    """Removes stale files left in temp_uploads."""
+    print(f"Removed {sweep_stale_uploads(max_age)} stale upload(s).")
+
+
+def init_app(app):
+    app.request_class = UploadRequest
+    app.cli.add_command(sweep_uploads)
@@ -0,0 +1,164 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from app import db
+from app.metrics import USER_CACHE
+
+# Session.info key holding the ids of users changed in the open transaction
+_CHANGED_KEY = 'user_cache_changed'
+
+
+class UserCache:
+    """
+    Per-process cache of the column values of logged-in users, so that
+    Flask-Login's user_loader can skip the database on most requests. Entries
+    expire after `ttl_s` and the least recently used are evicted beyond
+    `max_entries`.
+
+    Users changed or deleted through the ORM in this process are dropped on
+    flush and again on commit. Other workers see other changes once their
+    entry expires, except for the password and admin flag: load_user() checks
+    the user's security stamp against the database on every hit.
+    """
+    def __init__(self, ttl_s=60, max_entries=1024):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # user id -> (stored at, column values)
+        self._lock = threading.Lock()
+        self._counters = dict(hits=0, misses=0, evictions=0, expirations=0, invalidations=0)
+
+    def get(self, user_id):
+        """Returns the cached column values for `user_id`, or None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[0] > self.ttl_s:
+                del self._entries[user_id]
+                self._counters['expirations'] += 1
+                entry = None
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self._counters['hits'] += 1
+            return entry[1]
+
+    def put(self, user_id, values):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic(), values)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self._counters['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Returns the entry count and hit/miss counters of this process."""
+        with self._lock:
+            counters = dict(self._counters)
+            entries = len(self._entries)
+        lookups = counters['hits'] + counters['misses']
+        return dict(
+            counters,
+            entries=entries,
+            max_entries=self.max_entries,
+            ttl_s=self.ttl_s,
+            hit_rate=counters['hits'] / lookups if lookups else 0.0,
+        )
+
+
+def _column_values(user):
+    return {attr.key: getattr(user, attr.key) for attr in inspect(user).mapper.column_attrs}
+
+
+def load_user(model, user_id):
+    """
+    Returns the `model` row with primary key `user_id` attached to the
+    current session, or None. A cache hit rebuilds it from the cached values,
+    reading only the security stamp when the model has one; lazy
+    relationships still load normally when used.
+    """
+    cache = current_app.extensions.get('user_cache')
+    if cache is None:
+        return db.session.get(model, user_id)
+    values = cache.get(user_id)
+    if values is not None and 'security_stamp' in values:
+        # One primary-key lookup catches a password or admin change committed
+        # by another worker, which the listeners below only see in that one
+        stamp = db.session.query(model.security_stamp).filter(model.id == user_id).scalar()
+        if stamp != values['security_stamp']:
+            USER_CACHE.labels(outcome='stale').inc()
+            cache.invalidate(user_id)
+            values = None
+    if values is None:
+        USER_CACHE.labels(outcome='miss').inc()
+        user = db.session.get(model, user_id)
+        if user is not None:
+            cache.put(user_id, _column_values(user))
+        return user
+    USER_CACHE.labels(outcome='hit').inc()
+    # A fresh instance per request: ORM objects must not be shared between
+    # sessions. merge(load=False) attaches it as if it had just been queried.
+    user = model(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+# --- Invalidation ---
+def _invalidate(ids):
+    cache = current_app.extensions.get('user_cache') if has_app_context() else None
+    if cache is not None:
+        for user_id in ids:
+            cache.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    # Dropping entries at flush keeps this request from reading its own stale
+    # entry; dropping them again on commit discards anything another request
+    # re-cached from the old row in the meantime
+    ids = {
+        obj.id for obj in session.dirty | session.deleted
+        if isinstance(obj, UserMixin) and (obj in session.deleted or session.is_modified(obj))
+    }
+    if ids:
+        session.info.setdefault(_CHANGED_KEY, set()).update(ids)
+        _invalidate(ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_users(session):
+    ids = session.info.pop(_CHANGED_KEY, None)
+    if ids:
+        _invalidate(ids)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_changed_users(session, previous_transaction):
+    session.info.pop(_CHANGED_KEY, None)
+
+
+def get_user_cache_stats():
+    cache = current_app.extensions.get('user_cache')
+    return cache.stats() if cache is not None else None
+
+
+def init_app(app):
+    """Creates the user cache; USER_CACHE_TTL_S=0 turns it off."""
+    if app.config['USER_CACHE_TTL_S'] > 0:
+        app.extensions['user_cache'] = UserCache(
+            ttl_s=app.config['USER_CACHE_TTL_S'],
+            max_entries=app.config['USER_CACHE_MAX_ENTRIES']
+        )
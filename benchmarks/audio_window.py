@@ -0,0 +1,99 @@
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+import numpy as np
+import soxr
+from scipy.signal import correlate
+from imageio_ffmpeg import get_ffmpeg_exe
+
+from app.audio import DECODE_SAMPLE_RATE, fit_center, load_audio, load_audio_window, read_native
+
+TARGET_DURATION_S = 5
+CLIP_LENGTHS_S = [3, 30, 120, 600]
+# (extension, native sample rate, extra ffmpeg output arguments)
+FORMATS = [
+    ('wav', 44100, []),
+    ('wav', 8000, []),
+    ('mp3', 48000, []),
+    ('m4a', 48000, ['-c:a', 'aac']),
+    ('webm', 48000, ['-c:a', 'libopus']),
+]
+
+
+def make_clip(directory, seconds, extension, rate, extra_args):
+    """Writes a tone-plus-noise test clip with ffmpeg and returns its path."""
+    path = os.path.join(directory, f"clip_{seconds}s_{rate}.{extension}")
+    if not os.path.exists(path):
+        subprocess.run([
+            get_ffmpeg_exe(), '-v', 'error', '-y',
+            '-f', 'lavfi', '-i', f"sine=frequency=220:duration={seconds}:sample_rate={rate}",
+            '-f', 'lavfi', '-i', f"anoisesrc=d={seconds}:r={rate}:a=0.1",
+            '-filter_complex', 'amix=inputs=2', '-ar', str(rate), *extra_args, path
+        ], check=True)
+    return path
+
+
+def load_full(path):
+    """The previous loader: decode everything, then slice out the centred window."""
+    y, sr = load_audio(path)
+    return fit_center(y, TARGET_DURATION_S * sr)
+
+
+def reference_window(path):
+    """Full native decode, full resample, then the centred window."""
+    y, native_sr = read_native(path)
+    if native_sr != DECODE_SAMPLE_RATE:
+        y = soxr.resample(y, native_sr, DECODE_SAMPLE_RATE, quality='HQ')
+    return fit_center(y, TARGET_DURATION_S * DECODE_SAMPLE_RATE)
+
+
+def alignment(actual, expected, max_shift=2048):
+    """
+    Returns (shift in samples, max |diff| after the shift). Compressed headers
+    can state a length a few ms off the decoded one, which moves the centre.
+    """
+    correlation = correlate(actual, expected, mode='full', method='fft')
+    lags = np.arange(-len(expected) + 1, len(actual))
+    valid = np.abs(lags) <= max_shift
+    shift = int(lags[valid][np.argmax(correlation[valid])])
+    if shift >= 0:
+        return shift, float(np.abs(actual[shift:] - expected[:len(expected) - shift]).max())
+    return shift, float(np.abs(actual[:shift] - expected[-shift:]).max())
+
+
+def median_ms(function, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return 1000.0 * float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time full versus windowed audio loading across clip lengths. "
+                                                 "Run from the project root: python -m benchmarks.audio_window")
+    parser.add_argument('--lengths', type=int, nargs='+', default=CLIP_LENGTHS_S)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--clip-dir', default=None, help="Keep the generated clips here (default: a temp dir).")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        directory = args.clip_dir or temp_dir
+        os.makedirs(directory, exist_ok=True)
+        print(f"{'clip':<24} {'full ms':>9} {'window ms':>10} {'shift ms':>9} {'max |diff|':>11}")
+        for extension, rate, extra_args in FORMATS:
+            for seconds in args.lengths:
+                path = make_clip(directory, seconds, extension, rate, extra_args)
+                load_audio_window(path, TARGET_DURATION_S) # Warm-up
+                full_ms = median_ms(lambda: load_full(path), args.repeats)
+                window_ms = median_ms(lambda: load_audio_window(path, TARGET_DURATION_S), args.repeats)
+                shift, difference = alignment(load_audio_window(path, TARGET_DURATION_S)[0], reference_window(path))
+                print(f"{os.path.basename(path):<24} {full_ms:>9.1f} {window_ms:>10.1f} "
+                      f"{1000.0 * shift / DECODE_SAMPLE_RATE:>9.2f} {difference:>11.2e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import glob
+import time
+import numpy as np
+import librosa
+import noisereduce as nr
+
+from app.audio import load_audio_window
+from app.dsp import get_engine
+from app.spectrogram import (
+    DSP_PARITY_TOLERANCE_DB, HOP_LENGTH, N_FFT, check_dsp_parity, render_spectrogram,
+    compute_stft_db, compute_stft_db_reference
+)
+
+DEFAULT_RECORDINGS = 'debug_files/submission_*/*.webm'
+TARGET_DURATION_S = 5
+
+
+def load_segment(path):
+    """Loads the centred 5s segment, as the app does."""
+    return load_audio_window(path, TARGET_DURATION_S)
+
+
+def time_reference(y, sr):
+    """Per-stage timings of noisereduce + librosa.stft + amplitude_to_db."""
+    timings = {}
+    clock = time.perf_counter()
+    y_reduced = nr.reduce_noise(y=y, sr=sr)
+    timings['denoise'] = time.perf_counter() - clock
+    clock = time.perf_counter()
+    S = np.abs(librosa.stft(y_reduced, n_fft=N_FFT, hop_length=HOP_LENGTH))
+    timings['stft_out'] = time.perf_counter() - clock
+    clock = time.perf_counter()
+    librosa.amplitude_to_db(S, ref=np.max)
+    timings['db'] = time.perf_counter() - clock
+    timings['total'] = sum(timings.values())
+    return timings
+
+
+def median_timings(function, repeats):
+    runs = [function() for _ in range(repeats)]
+    return {stage: 1000.0 * float(np.median([run[stage] for run in runs])) for stage in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the DSP engine against noisereduce + librosa and time each stage. "
+                                                 "Run from the project root: python -m benchmarks.dsp_engine")
+    parser.add_argument('recordings', nargs='*', help=f"Audio files (default: {DEFAULT_RECORDINGS})")
+    parser.add_argument('--repeats', type=int, default=10)
+    args = parser.parse_args()
+
+    paths = args.recordings or sorted(glob.glob(DEFAULT_RECORDINGS))
+    if not paths:
+        raise SystemExit("No recordings found.")
+
+    engine = get_engine(N_FFT, HOP_LENGTH)
+    failures = 0
+    for path in paths:
+        y, sr = load_segment(path)
+        compute_stft_db(y, sr) # Warm-up (plan, FFT caches)
+        difference, ok = check_dsp_parity(y, sr)
+        pixels = np.abs(render_spectrogram(compute_stft_db(y, sr), sr).astype(int)
+                        - render_spectrogram(compute_stft_db_reference(y, sr), sr).astype(int))
+        failures += not ok
+
+        def run_engine():
+            engine.stft_db(y, sr)
+            return dict(engine.timings)
+        reference = median_timings(lambda: time_reference(y, sr), args.repeats)
+        fused = median_timings(run_engine, args.repeats)
+
+        print(f"\n{path}")
+        print(f"  parity: max |dB diff| {difference:.4f} ({'ok' if ok else 'FAIL'}, tolerance {DSP_PARITY_TOLERANCE_DB}), "
+              f"model input max pixel diff {pixels.max()}/255")
+        print("  reference (ms): " + ', '.join(f"{stage} {ms:.1f}" for stage, ms in reference.items()))
+        print("  engine    (ms): " + ', '.join(f"{stage} {ms:.1f}" for stage, ms in fused.items()))
+        print(f"  speed-up: {reference['total'] / fused['total']:.2f}x")
+
+    if failures:
+        raise SystemExit(f"{failures} recording(s) outside the parity tolerance.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,463 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import queue
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlparse
+import numpy as np
+import requests
+
+from benchmarks.pipeline import git_commit
+from smtp_sink import SMTPSink
+
+RECORDING_PATTERNS = ['debug_files/*/1_original_recording.webm']
+RESULTS_DIR = os.path.join('benchmarks', 'results')
+PASSWORD = 'load-test-password'
+CSRF_PATTERN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+HIDDEN_PATTERN = re.compile(r'<input\s+type="hidden"\s+name="([^"]*)"\s+value="([^"]*)"')
+ALERT_PATTERN = re.compile(r'alert-(success|warning|danger|info)\b')
+STEPS = ['new_test', 'audio_test', 'flow', 'result']
+
+
+# Server
+class TimedSMTPSink(SMTPSink):
+    """An SMTP sink that also records when each recipient's message arrived."""
+    def __init__(self, address):
+        super().__init__(address)
+        self.arrivals = defaultdict(list) # recipient -> arrival times (perf_counter)
+
+    def store(self, sender, recipients, data):
+        super().store(sender, recipients, data)
+        now = time.perf_counter()
+        with self.lock:
+            for recipient in recipients:
+                self.arrivals[recipient].append(now)
+
+
+def start_server(args, temp_dir, smtp_port):
+    """Starts the app under gunicorn with its own database and mail settings. Returns the Popen."""
+    env = dict(
+        os.environ,
+        SECRET_KEY=os.environ.get('SECRET_KEY') or 'load-test',
+        DATABASE_URL=args.database_url or f"sqlite:///{os.path.join(temp_dir, 'load_test.sqlite')}",
+        MAIL_SERVER='127.0.0.1', MAIL_PORT=str(smtp_port), MAIL_USE_TLS='0',
+        MAIL_USERNAME='load-test@localhost', MAIL_PASSWORD='x',
+        PREDICTION_CACHE='1' if args.prediction_cache else '0',
+        PREDICTION_CACHE_DIR=os.path.join(temp_dir, 'prediction_cache'),
+        PROMETHEUS_MULTIPROC_DIR=os.path.join(temp_dir, 'metrics'),
+    )
+    command = [
+        sys.executable, '-m', 'gunicorn', 'wsgi:app',
+        '--bind', args.bind, '--workers', str(args.workers), '--threads', str(args.threads),
+        '--timeout', '120',
+    ]
+    log = open(os.path.join(temp_dir, 'server.log'), 'w')
+    return subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_until_ready(base_url, server, timeout_s):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            raise SystemExit("The server exited during startup; see its log.")
+        try:
+            if requests.get(f"{base_url}/", timeout=5).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise SystemExit(f"The server did not answer within {timeout_s}s.")
+
+
+def stop_server(server):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+# Worker Resources
+def _child_pids(pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def _read_usage(pid):
+    """Returns (CPU seconds, RSS MB) of a process from /proc, or None once it has gone."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f"/proc/{pid}/statm") as f:
+            rss_pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    ticks = os.sysconf('SC_CLK_TCK')
+    return (int(fields[11]) + int(fields[12])) / ticks, rss_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+class ResourceSampler:
+    """Samples the CPU time and RSS of the gunicorn master and its workers (Linux /proc)."""
+    def __init__(self, master_pid, interval_s=1.0):
+        self.master_pid = master_pid
+        self.interval_s = interval_s
+        self.samples = defaultdict(list) # pid -> [(time, cpu seconds, rss MB)]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='resource-sampler', daemon=True)
+
+    def start(self):
+        self._sample()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    def _sample(self):
+        now = time.perf_counter()
+        for pid in [self.master_pid] + _child_pids(self.master_pid):
+            usage = _read_usage(pid)
+            if usage is not None:
+                self.samples[pid].append((now,) + usage)
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self._sample()
+
+    def summary(self):
+        processes = []
+        for pid, samples in sorted(self.samples.items()):
+            (t0, cpu0, _), (t1, cpu1, _) = samples[0], samples[-1]
+            rss = [rss for _, _, rss in samples]
+            processes.append({
+                'pid': pid,
+                'role': 'master' if pid == self.master_pid else 'worker',
+                'cpu_percent': 100.0 * (cpu1 - cpu0) / (t1 - t0) if t1 > t0 else 0.0,
+                'cpu_s': cpu1 - cpu0,
+                'rss_mb': {'mean': float(np.mean(rss)), 'max': float(max(rss)), 'last': rss[-1]},
+            })
+        return processes
+
+
+# Virtual Users
+class VirtualUser:
+    """A synthetic account with its own HTTP session (cookies) against the app."""
+    def __init__(self, base_url, name):
+        self.base_url = base_url
+        self.username = name
+        self.email = f"{name}@example.com"
+        self.session = requests.Session()
+
+    def _csrf_post(self, path, data):
+        page = self.session.get(self.base_url + path, timeout=30)
+        token = CSRF_PATTERN.search(page.text)
+        if token is None:
+            raise RuntimeError(f"No CSRF token on {path} (status {page.status_code})")
+        return self.session.post(self.base_url + path, data=dict(data, csrf_token=token.group(1)), timeout=30)
+
+    def register_and_login(self):
+        response = self._csrf_post('/auth/register', {
+            'username': self.username, 'email': self.email, 'password': PASSWORD, 'password2': PASSWORD,
+        })
+        if urlparse(response.url).path.startswith('/auth/register'):
+            raise RuntimeError(f"Could not register {self.username}")
+        response = self._csrf_post('/auth/login', {'username': self.username, 'password': PASSWORD})
+        if urlparse(response.url).path.startswith('/auth/login'):
+            raise RuntimeError(f"Could not log in as {self.username}")
+
+    def take_test(self, recording, symptoms):
+        """
+        Replays the two-step test: posts the symptom form, follows the redirect
+        to the audio page and uploads the recording with its hidden fields.
+        Returns (outcome, {step: seconds}).
+        """
+        timings = {}
+        start = time.perf_counter()
+        response = self.session.post(f"{self.base_url}/new_test", data=symptoms, timeout=60)
+        timings['new_test'] = time.perf_counter() - start
+        if response.status_code != 200 or urlparse(response.url).path != '/audio_test':
+            return f"new_test_{response.status_code}", timings
+        fields = dict(HIDDEN_PATTERN.findall(response.text))
+
+        step_start = time.perf_counter()
+        with open(recording, 'rb') as f:
+            response = self.session.post(
+                f"{self.base_url}/audio_test", data=fields,
+                files={'uploaded_audio_data': (os.path.basename(recording), f, 'audio/webm')}, timeout=120
+            )
+        timings['audio_test'] = time.perf_counter() - step_start
+        timings['flow'] = time.perf_counter() - start
+        if response.status_code != 200:
+            return f"audio_test_{response.status_code}", timings
+        alerts = set(ALERT_PATTERN.findall(response.text))
+        if urlparse(response.url).path == '/dashboard' and 'success' in alerts:
+            return 'submitted', timings
+        if 'warning' in alerts:
+            return 'queue_full', timings
+        return 'rejected', timings
+
+
+def random_symptoms(rng):
+    return {
+        'tremor': rng.choice(['at_rest', 'action', 'no']),
+        'stiffness': rng.choice(['yes', 'no']),
+        'walking_issue': rng.choice(['yes', 'no']),
+        'age': str(int(rng.integers(30, 85))),
+        'gender': rng.choice(['Male', 'Female', 'Other']),
+        'other_symptoms': '',
+    }
+
+
+# Load
+def run_load(users, recordings, args):
+    """
+    Runs tests for `args.duration` seconds (or `args.tests` tests). With a
+    rate, arrivals are Poisson and each test's latency counts from its
+    scheduled start, including any wait for a free user; without one, every
+    user runs tests back to back.
+    """
+    rng = np.random.default_rng(args.seed)
+    free_users = queue.Queue()
+    for user in users:
+        free_users.put(user)
+    records, lock = [], threading.Lock()
+
+    def one_test(user, recording, symptoms, scheduled):
+        started = time.perf_counter()
+        try:
+            outcome, timings = user.take_test(recording, symptoms)
+        except Exception as e:
+            outcome, timings = type(e).__name__, {}
+        finished = time.perf_counter()
+        free_users.put(user)
+        with lock:
+            records.append({
+                'user': user.email, 'recording': recording, 'outcome': outcome, 'timings': timings,
+                'queue_wait': started - scheduled, 'latency': finished - scheduled, 'finished': finished,
+            })
+
+    start = time.perf_counter()
+    next_at, count = start, 0
+    with ThreadPoolExecutor(max_workers=len(users)) as executor:
+        while time.perf_counter() - start < args.duration and (args.tests is None or count < args.tests):
+            if args.rate:
+                next_at += rng.exponential(1.0 / args.rate)
+                time.sleep(max(0.0, next_at - time.perf_counter()))
+                scheduled = next_at
+            else:
+                scheduled = None
+            user = free_users.get()
+            scheduled = scheduled or time.perf_counter()
+            recording = recordings[count % len(recordings)]
+            executor.submit(one_test, user, recording, random_symptoms(rng), scheduled)
+            count += 1
+    return records, time.perf_counter() - start
+
+
+def match_results(records, sink, timeout_s):
+    """
+    Waits for the result email of every submitted test and stores its delay
+    after the upload finished. A user's emails are matched to their tests in
+    order. Returns how many never arrived.
+    """
+    submitted = [r for r in records if r['outcome'] == 'submitted']
+    expected = Counter(r['user'] for r in submitted)
+    deadline = time.perf_counter() + timeout_s
+    while time.perf_counter() < deadline:
+        with sink.lock:
+            if all(len(sink.arrivals[user]) >= n for user, n in expected.items()):
+                break
+        time.sleep(0.5)
+    with sink.lock:
+        arrivals = {user: deque(sorted(times)) for user, times in sink.arrivals.items()}
+    missing = 0
+    for record in sorted(submitted, key=lambda r: r['finished']):
+        pending = arrivals.get(record['user'])
+        if pending:
+            record['timings']['result'] = pending.popleft() - record['finished']
+        else:
+            missing += 1
+    return missing
+
+
+# Reporting
+def percentiles(values):
+    if not values:
+        return None
+    ms = 1000.0 * np.asarray(values)
+    return {
+        'count': len(ms), 'mean': float(ms.mean()),
+        'p50': float(np.percentile(ms, 50)), 'p95': float(np.percentile(ms, 95)),
+        'p99': float(np.percentile(ms, 99)), 'max': float(ms.max()),
+    }
+
+
+def summarize(records, elapsed_s, missing_results):
+    outcomes = Counter(r['outcome'] for r in records)
+    submitted = outcomes.get('submitted', 0)
+    # Results keep arriving after the last upload, so their rate is taken
+    # from the first scheduled test to the last result email
+    results = [r for r in records if 'result' in r['timings']]
+    span_s = (
+        max(r['finished'] + r['timings']['result'] for r in results) - min(r['finished'] - r['latency'] for r in records)
+        if results else 0.0
+    )
+    return {
+        'tests': len(records),
+        'elapsed_s': elapsed_s,
+        'throughput_per_s': submitted / elapsed_s if elapsed_s else 0.0,
+        'results_per_s': len(results) / span_s if span_s else 0.0,
+        'error_rate': (len(records) - submitted) / len(records) if records else 0.0,
+        'outcomes': dict(outcomes),
+        'missing_results': missing_results,
+        'latency_ms': {
+            step: percentiles([r['timings'][step] for r in records if step in r['timings']]) for step in STEPS
+        },
+        'end_to_end_ms': percentiles([r['latency'] for r in records]),
+        'queue_wait_ms': percentiles([r['queue_wait'] for r in records]),
+    }
+
+
+def print_results(report):
+    summary = report['summary']
+    print(f"\n{summary['tests']} tests in {summary['elapsed_s']:.1f}s: "
+          f"{summary['throughput_per_s']:.2f} submitted/s, {summary['results_per_s']:.2f} results/s, error rate {100 * summary['error_rate']:.1f}%, "
+          f"{summary['missing_results']} result email(s) missing")
+    print(f"  outcomes: {summary['outcomes']}")
+    print(f"  {'latency ms':<12} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    rows = list(summary['latency_ms'].items()) + [('scheduled', summary['end_to_end_ms'])]
+    for step, stats in rows:
+        if stats:
+            print(f"  {step:<12} {stats['count']:>6} {stats['p50']:>9.1f} {stats['p95']:>9.1f} "
+                  f"{stats['p99']:>9.1f} {stats['max']:>9.1f}")
+    if report.get('processes'):
+        print(f"  {'process':<14} {'cpu %':>7} {'cpu s':>8} {'rss MB':>8} {'max MB':>8}")
+        for process in report['processes']:
+            print(f"  {process['role'] + ' ' + str(process['pid']):<14} {process['cpu_percent']:>7.1f} "
+                  f"{process['cpu_s']:>8.1f} {process['rss_mb']['mean']:>8.0f} {process['rss_mb']['max']:>8.0f}")
+
+
+def compare(report, baseline_path):
+    """Prints the change in throughput, error rate and latency percentiles against an earlier results file."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    old, new = baseline['summary'], report['summary']
+    print(f"\nCompared with {baseline_path} (commit {baseline.get('commit')}):")
+    for label, key in (('submitted', 'throughput_per_s'), ('results', 'results_per_s')):
+        if key in old:
+            print(f"  {label:<16} {old[key]:>9.2f} -> {new[key]:>9.2f} /s")
+    print(f"  error rate       {100 * old['error_rate']:>8.1f}% -> {100 * new['error_rate']:>8.1f}%")
+    for step in STEPS:
+        before, after = old['latency_ms'].get(step), new['latency_ms'].get(step)
+        if not before or not after:
+            continue
+        for key in ('p50', 'p95', 'p99'):
+            change = 100.0 * (after[key] - before[key]) / before[key] if before[key] else 0.0
+            print(f"  {step + ' ' + key:<16} {before[key]:>9.1f} -> {after[key]:>9.1f} ms ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the two-step test flow against a locally started app "
+                                                 "and save throughput, latency and per-worker usage as JSON. "
+                                                 "Run from the project root: python -m benchmarks.load_test")
+    parser.add_argument('recordings', nargs='*', help="Audio files to upload (default: the recordings in debug_files/)")
+    parser.add_argument('--users', type=int, default=4, help="Synthetic users, i.e. the maximum concurrency.")
+    parser.add_argument('--rate', type=float, default=0.0,
+                        help="Tests started per second (Poisson arrivals); 0 runs every user back to back.")
+    parser.add_argument('--duration', type=float, default=60.0, help="Seconds to keep starting tests.")
+    parser.add_argument('--tests', type=int, default=None, help="Stop after this many tests.")
+    parser.add_argument('--workers', type=int, default=2, help="Gunicorn worker processes.")
+    parser.add_argument('--threads', type=int, default=1, help="Gunicorn threads per worker.")
+    parser.add_argument('--bind', default='127.0.0.1:8765')
+    parser.add_argument('--url', default=None, help="Test an app that is already running instead; "
+                                                    "its mail must go to --smtp-port and no usage is sampled.")
+    parser.add_argument('--smtp-port', type=int, default=2526)
+    parser.add_argument('--database-url', default=None, help="Database for the started app (default: a temp SQLite file).")
+    parser.add_argument('--prediction-cache', action='store_true',
+                        help="Keep the prediction cache on; replayed recordings then mostly hit it.")
+    parser.add_argument('--startup-timeout', type=float, default=180.0)
+    parser.add_argument('--result-timeout', type=float, default=120.0,
+                        help="Seconds to wait after the load for outstanding result emails.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help=f"Results file (default: {RESULTS_DIR}/load_<commit>.json)")
+    parser.add_argument('--compare', default=None, help="An earlier results file to compare against.")
+    args = parser.parse_args()
+
+    recordings = args.recordings or sorted(p for pattern in RECORDING_PATTERNS for p in glob.glob(pattern))
+    if not recordings:
+        raise SystemExit("No recordings to upload.")
+
+    sink = TimedSMTPSink(('127.0.0.1', args.smtp_port)).start()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        server = None
+        base_url = (args.url or f"http://{args.bind}").rstrip('/')
+        if args.url is None:
+            print(f"Starting {args.workers} worker(s) on {args.bind} (log: {temp_dir}/server.log)...")
+            server = start_server(args, temp_dir, args.smtp_port)
+        try:
+            wait_until_ready(base_url, server, args.startup_timeout)
+            run_id = datetime.utcnow().strftime('%H%M%S')
+            users = [VirtualUser(base_url, f"load{run_id}u{i}") for i in range(args.users)]
+            for user in users:
+                user.register_and_login()
+            print(f"Logged in {len(users)} user(s); replaying {len(recordings)} recording(s) "
+                  f"{'at %.2f/s' % args.rate if args.rate else 'back to back'} for {args.duration:.0f}s...")
+
+            sampler = ResourceSampler(server.pid).start() if server is not None else None
+            records, elapsed = run_load(users, recordings, args)
+            missing = match_results(records, sink, args.result_timeout)
+            if sampler is not None:
+                sampler.stop()
+        finally:
+            if server is not None:
+                stop_server(server)
+            sink.stop()
+
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'platform': {'python': platform.python_version(), 'machine': platform.machine(), 'cpu_count': os.cpu_count()},
+        'settings': {
+            'users': args.users, 'rate': args.rate, 'duration': args.duration, 'tests': args.tests,
+            'workers': args.workers, 'threads': args.threads, 'prediction_cache': args.prediction_cache,
+            'recordings': recordings, 'url': args.url,
+        },
+        'summary': summarize(records, elapsed, missing),
+        'processes': sampler.summary() if sampler is not None else [],
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"load_{report['commit']}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print_results(report)
+    if args.compare:
+        compare(report, args.compare)
+    print(f"\nResults saved to {output}")
+
+
+if __name__ == '__main__':
+    main()
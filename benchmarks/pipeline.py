@@ -0,0 +1,246 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+from app import ml_logic
+from app.audio import FFMPEG_FORMATS, fit_center, load_audio, load_audio_window, probe_audio, read_head
+from app.prediction_cache import hash_file
+from app.spectrogram import (
+    HOP_LENGTH, N_FFT, compute_stft_db, render_spectrogram, render_spectrogram_png, spectrogram_to_tensor
+)
+from app.uploads import INSPECT_DURATION_S, loudest_dbfs
+from benchmarks.audio_window import make_clip
+
+RECORDING_PATTERNS = ['debug_files/*/1_original_recording.webm', 'temp_uploads/*.wav']
+SYNTHETIC_LENGTHS_S = [3, 10, 30, 120]
+TARGET_DURATION_S = ml_logic.TARGET_DURATION_S
+RESULTS_DIR = os.path.join('benchmarks', 'results')
+SYMPTOMS = {'tremor': 1, 'stiffness': 0, 'walking_issue': 1}
+
+
+# Stages
+# Each stage takes the state built by the stages before it and returns its
+# output, which is stored in the state under the stage's name.
+def _inspect(state):
+    path = state['path']
+    y, sr, _ = read_head(path, path.lower().endswith(FFMPEG_FORMATS), INSPECT_DURATION_S)
+    return loudest_dbfs(y, sr)
+
+def _predict(state):
+    return ml_logic.audio_model.predict_batch(state['tensor'])
+
+def _symptoms(state):
+    frame = pd.DataFrame([SYMPTOMS])[ml_logic.SYMPTOM_FEATURES]
+    return ml_logic.symptom_model.predict_proba(frame)[0][1]
+
+PIPELINE_STAGES = [
+    ('inspect', _inspect),
+    ('hash', lambda state: hash_file(state['path'])),
+    ('load_window', lambda state: load_audio_window(state['path'], TARGET_DURATION_S)),
+    ('dsp', lambda state: compute_stft_db(*state['load_window'])),
+    ('render', lambda state: render_spectrogram(state['dsp'], state['load_window'][1])),
+    ('tensor', lambda state: spectrogram_to_tensor(state['render'])),
+    ('predict', _predict),
+    ('symptoms', _symptoms),
+]
+
+def _reference_segment(state):
+    y, sr = state['decode_full']
+    return fit_center(y, TARGET_DURATION_S * sr), sr
+
+def _reduce_noise(state):
+    import noisereduce as nr
+    y, sr = state['segment']
+    return nr.reduce_noise(y=y, sr=sr)
+
+def _reference_stft(state):
+    import librosa
+    S = librosa.stft(state['reduce_noise'], n_fft=N_FFT, hop_length=HOP_LENGTH)
+    return librosa.amplitude_to_db(np.abs(S), ref=np.max)
+
+# The pipeline before the DSP engine, windowed loading and in-memory
+# rendering, for comparison: full decode, noisereduce, librosa.stft, and
+# specshow/savefig read back through PIL like load_img
+REFERENCE_STAGES = [
+    ('decode_full', lambda state: load_audio(state['path'])),
+    ('segment', _reference_segment),
+    ('reduce_noise', _reduce_noise),
+    ('stft', _reference_stft),
+    ('specshow_png', lambda state: render_spectrogram_png(state['stft'], state['segment'][1])),
+]
+
+
+# Measurement
+def measure(function, state, warmup, repeats):
+    """
+    Times `repeats` calls after `warmup` untimed ones. Wall and CPU time come
+    from untraced runs; the peak comes from one extra run under tracemalloc,
+    so it counts Python and numpy allocations but not native buffers such as
+    TensorFlow's or the decoders'.
+    """
+    for _ in range(warmup):
+        function(state)
+    wall, cpu = [], []
+    for _ in range(repeats):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        function(state)
+        wall.append(time.perf_counter() - wall_start)
+        cpu.append(time.process_time() - cpu_start)
+    tracemalloc.start()
+    try:
+        function(state)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    wall_ms, cpu_ms = 1000.0 * np.array(wall), 1000.0 * np.array(cpu)
+    return {
+        'wall_ms': {
+            'median': float(np.median(wall_ms)), 'mean': float(wall_ms.mean()),
+            'min': float(wall_ms.min()), 'max': float(wall_ms.max()),
+        },
+        'cpu_ms': {'median': float(np.median(cpu_ms)), 'mean': float(cpu_ms.mean())},
+        'peak_mb': peak / (1024 * 1024),
+    }
+
+
+def run_stages(stages, path, warmup, repeats):
+    state, results = {'path': path}, {}
+    for name, function in stages:
+        if name in ('predict', 'symptoms') and (ml_logic.audio_model is None or ml_logic.symptom_model is None):
+            continue
+        results[name] = measure(function, state, warmup, repeats)
+        state[name] = function(state)
+    return results
+
+
+# Inputs
+def collect_inputs(clip_dir, lengths, include_recordings):
+    inputs = []
+    if include_recordings:
+        for pattern in RECORDING_PATTERNS:
+            inputs.extend(sorted(glob.glob(pattern)))
+    for seconds in lengths:
+        inputs.append(make_clip(clip_dir, seconds, 'webm', 48000, ['-c:a', 'libopus']))
+    return inputs
+
+
+def describe_input(path):
+    try:
+        n_samples, sr = probe_audio(path)
+    except Exception:
+        n_samples, sr = None, None
+    return {
+        'path': path,
+        'bytes': os.path.getsize(path),
+        'duration_s': n_samples / sr if n_samples is not None else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+# Reporting
+def print_results(report):
+    for item in report['inputs']:
+        duration = f"{item['duration_s']:.1f}s" if item['duration_s'] is not None else '?s'
+        print(f"\n{item['path']} ({duration}, {item['bytes'] / 1024:.0f} KB)")
+        print(f"  {'stage':<14} {'wall ms':>9} {'cpu ms':>9} {'peak MB':>9}")
+        for group in ('pipeline', 'reference'):
+            for stage, result in item.get(group, {}).items():
+                print(f"  {stage:<14} {result['wall_ms']['median']:>9.2f} "
+                      f"{result['cpu_ms']['median']:>9.2f} {result['peak_mb']:>9.2f}")
+            if group in item:
+                total = sum(result['wall_ms']['median'] for result in item[group].values())
+                print(f"  {group + ' total':<14} {total:>9.2f}")
+
+
+def compare(report, baseline_path):
+    """Prints the change in median wall time per stage against an earlier results file."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before = {item['path']: item for item in baseline['inputs']}
+    print(f"\nCompared with {baseline_path} (commit {baseline.get('commit')}):")
+    for item in report['inputs']:
+        if item['path'] not in before:
+            continue
+        print(f"  {item['path']}")
+        for group in ('pipeline', 'reference'):
+            for stage, result in item.get(group, {}).items():
+                old = before[item['path']].get(group, {}).get(stage)
+                if old is None:
+                    continue
+                new_ms, old_ms = result['wall_ms']['median'], old['wall_ms']['median']
+                change = 100.0 * (new_ms - old_ms) / old_ms if old_ms else 0.0
+                print(f"    {stage:<14} {old_ms:>9.2f} -> {new_ms:>9.2f} ms ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each stage of the prediction pipeline and save the results as JSON. "
+                                                 "Run from the project root: python -m benchmarks.pipeline")
+    parser.add_argument('recordings', nargs='*', help="Audio files (default: the repo's recordings plus synthetic clips)")
+    parser.add_argument('--lengths', type=int, nargs='*', default=SYNTHETIC_LENGTHS_S, help="Synthetic webm clip lengths in seconds.")
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--reference', action='store_true', help="Also time the original decode/noisereduce/specshow pipeline.")
+    parser.add_argument('--output', default=None, help=f"Results file (default: {RESULTS_DIR}/pipeline_<commit>.json)")
+    parser.add_argument('--compare', default=None, help="An earlier results file to compare against.")
+    parser.add_argument('--clip-dir', default=None, help="Keep the synthetic clips here (default: a temp dir).")
+    args = parser.parse_args()
+
+    ml_logic.load_models()
+    if ml_logic.audio_model is None or ml_logic.symptom_model is None:
+        print("Models not loaded: the predict and symptoms stages are skipped.")
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'platform': {
+            'python': platform.python_version(), 'machine': platform.machine(),
+            'cpu_count': os.cpu_count(), 'audio_backend': ml_logic.AUDIO_BACKEND,
+        },
+        'settings': {'warmup': args.warmup, 'repeats': args.repeats},
+        'inputs': [],
+    }
+    with tempfile.TemporaryDirectory() as temp_dir:
+        clip_dir = args.clip_dir or temp_dir
+        os.makedirs(clip_dir, exist_ok=True)
+        paths = args.recordings or collect_inputs(clip_dir, args.lengths, include_recordings=True)
+        for path in paths:
+            item = describe_input(path)
+            print(f"Benchmarking {path}...")
+            item['pipeline'] = run_stages(PIPELINE_STAGES, path, args.warmup, args.repeats)
+            if args.reference:
+                item['reference'] = run_stages(REFERENCE_STAGES, path, args.warmup, args.repeats)
+            if not args.recordings and os.path.dirname(path) == clip_dir:
+                item['path'] = f"synthetic_{os.path.basename(path)}" # Stable across runs for --compare
+            report['inputs'].append(item)
+    report['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline_{commit}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print_results(report)
+    if args.compare:
+        compare(report, args.compare)
+    print(f"\nResults saved to {output}")
+
+
+if __name__ == '__main__':
+    main()
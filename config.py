@@ -20,4 +20,40 @@ class Config:
     MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS') == '1'
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
-    ADMINS = [os.environ.get('MAIL_USERNAME')]
\ No newline at end of file
+    ADMINS = [os.environ.get('MAIL_USERNAME')]
+
+    # Email delivery threads (per process), their queue, and SMTP retry policy
+    MAIL_WORKERS = int(os.environ.get('MAIL_WORKERS') or 1)
+    MAIL_QUEUE_SIZE = int(os.environ.get('MAIL_QUEUE_SIZE') or 256)
+    MAIL_BATCH_SIZE = int(os.environ.get('MAIL_BATCH_SIZE') or 20)
+    MAIL_MAX_RETRIES = int(os.environ.get('MAIL_MAX_RETRIES') or 3)
+    MAIL_RETRY_BACKOFF_S = float(os.environ.get('MAIL_RETRY_BACKOFF_S') or 2)
+    MAIL_IDLE_TIMEOUT_S = float(os.environ.get('MAIL_IDLE_TIMEOUT_S') or 30)
+
+    # Per-worker cache of logged-in users; 0 disables it. Another worker's
+    # change to a user reaches this one within USER_CACHE_TTL_S.
+    USER_CACHE_TTL_S = float(os.environ.get('USER_CACHE_TTL_S') or 60)
+    USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES') or 1024)
+
+    # Prediction job queue ('thread', 'inline' or an import path to a backend class)
+    PREDICTION_QUEUE_BACKEND = os.environ.get('PREDICTION_QUEUE_BACKEND') or 'thread'
+    PREDICTION_WORKERS = int(os.environ.get('PREDICTION_WORKERS') or 2)
+    PREDICTION_QUEUE_SIZE = int(os.environ.get('PREDICTION_QUEUE_SIZE') or 32)
+
+    # A job still 'running' this long after it was claimed is taken to be
+    # orphaned by a crashed worker: it is queued again, and fails once it has
+    # been claimed PREDICTION_JOB_MAX_ATTEMPTS times
+    PREDICTION_JOB_TIMEOUT_S = float(os.environ.get('PREDICTION_JOB_TIMEOUT_S') or 600)
+    PREDICTION_JOB_MAX_ATTEMPTS = int(os.environ.get('PREDICTION_JOB_MAX_ATTEMPTS') or 2)
+
+    # Audio uploads: hard size cap, and how much of an upload stays in memory
+    # before it spills to a temporary file
+    UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES') or 20 * 1024 * 1024)
+    UPLOAD_MEMORY_BYTES = int(os.environ.get('UPLOAD_MEMORY_BYTES') or 4 * 1024 * 1024)
+    MAX_CONTENT_LENGTH = UPLOAD_MAX_BYTES + 1024 * 1024 # Room for the form fields
+
+    # Rows per page on the dashboard and admin listings
+    PAGE_SIZE = int(os.environ.get('PAGE_SIZE') or 20)
+
+    # Bearer token required to scrape /metrics (open when unset)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
\ No newline at end of file
@@ -0,0 +1,264 @@
+import argparse
+import gzip
+import json
+import multiprocessing
+import os
+import queue
+import time
+import numpy as np
+from PIL import Image
+
+from app.inference import load_backend
+
+
+KERAS_MODEL_PATH = 'parkinson_cnn_model_stft_grayscale.h5'
+SPECTROGRAM_PATH = 'spectrograms_stft_5s_grayscale'
+IMG_HEIGHT, IMG_WIDTH = 224, 224
+QUANTIZATION_MODES = ['none', 'dynamic', 'float16', 'int8']
+ONNX_QUANTIZATION_MODES = ['none', 'dynamic']
+BENCHMARK_BATCH_SIZES = [1, 8, 32]
+PROFILE_TIMEOUT_S = 600 # Per backend; the child is killed after this
+
+
+# Validation Data
+def load_validation_spectrograms(limit=None):
+    """
+    Loads the validation PNGs exactly as Keras' load_img does for training
+    (grayscale, nearest-neighbour resize, scaled to [0, 1]).
+    """
+    images, labels = [], []
+    for label, category in enumerate(['healthy', 'parkinson']):
+        category_dir = os.path.join(SPECTROGRAM_PATH, 'validation', category)
+        if not os.path.isdir(category_dir):
+            continue
+        for filename in sorted(os.listdir(category_dir)):
+            if not filename.lower().endswith('.png'):
+                continue
+            img = Image.open(os.path.join(category_dir, filename)).convert('L')
+            img = img.resize((IMG_WIDTH, IMG_HEIGHT), Image.NEAREST)
+            images.append(np.asarray(img, dtype=np.float32) / 255.0)
+            labels.append(label)
+    images = np.stack(images)[..., np.newaxis] if images else np.zeros((0, IMG_HEIGHT, IMG_WIDTH, 1), np.float32)
+    labels = np.asarray(labels)
+    if limit:
+        # Sample across both classes rather than taking the first files
+        order = np.random.default_rng(0).permutation(len(images))[:limit]
+        images, labels = images[order], labels[order]
+    return images, labels
+
+
+# Export
+def export_tflite(keras_path, output_path, quantization='none', calibration_images=None):
+    """
+    Converts the Keras model to TensorFlow Lite with optional post-training
+    quantization. 'int8' quantizes weights and activations using the
+    calibration images; inputs and outputs stay float32.
+    """
+    if quantization not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization '{quantization}'.")
+    if quantization == 'int8' and (calibration_images is None or len(calibration_images) == 0):
+        raise ValueError("int8 quantization needs calibration spectrograms.")
+    import tensorflow as tf
+    model = tf.keras.models.load_model(keras_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+    if quantization == 'dynamic':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif quantization == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'int8':
+        def representative_dataset():
+            for sample in calibration_images[:200]:
+                yield [sample[np.newaxis].astype(np.float32)]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    with open(output_path, 'wb') as f:
+        f.write(converter.convert())
+    print(f"Wrote TFLite model ({quantization}) to {output_path}")
+
+
+def export_onnx(keras_path, output_path, quantization='none'):
+    """
+    Converts the Keras model to ONNX (requires tf2onnx). 'dynamic' applies
+    ONNX Runtime's dynamic int8 weight quantization to the dense layers of the
+    result; convolutions stay float, as the CPU provider has no ConvInteger
+    kernel for int8 weights.
+    """
+    if quantization not in ONNX_QUANTIZATION_MODES:
+        raise ValueError(f"ONNX export supports 'none' or 'dynamic' quantization, not '{quantization}'.")
+    import tensorflow as tf
+    import tf2onnx
+    model = tf.keras.models.load_model(keras_path)
+    spec = (tf.TensorSpec((None, IMG_HEIGHT, IMG_WIDTH, 1), tf.float32, name='input'),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=13, output_path=output_path)
+
+    if quantization == 'dynamic':
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(output_path, output_path, op_types_to_quantize=['MatMul', 'Gemm'], weight_type=QuantType.QInt8)
+    print(f"Wrote ONNX model ({quantization}) to {output_path}")
+
+
+# Comparison
+def _current_rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024.0
+    return float('nan')
+
+
+def _profile_backend(backend, model_path, images, repeats, results):
+    # Runs in a fresh process so memory numbers are not polluted by other backends
+    rss_before = _current_rss_mb()
+    start = time.perf_counter()
+    model = load_backend(backend, model_path)
+    load_s = time.perf_counter() - start
+
+    predictions = np.concatenate([
+        model.predict_batch(images[i:i + 32]).reshape(-1) for i in range(0, len(images), 32)
+    ]) if len(images) else np.zeros(0)
+
+    latency_ms = {}
+    for batch_size in BENCHMARK_BATCH_SIZES:
+        batch = np.resize(images, (batch_size,) + images.shape[1:]).astype(np.float32) if len(images) else \
+            np.zeros((batch_size, IMG_HEIGHT, IMG_WIDTH, 1), np.float32)
+        model.predict_batch(batch)  # warm-up
+        timings = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            model.predict_batch(batch)
+            timings.append(time.perf_counter() - t0)
+        latency_ms[batch_size] = 1000.0 * float(np.median(timings))
+
+    results.put({
+        'params': model.model.count_params() if backend == 'keras' else None,
+        'load_s': load_s,
+        'rss_mb': _current_rss_mb() - rss_before,
+        'predictions': predictions.tolist(),
+        'latency_ms': latency_ms,
+    })
+
+
+def _wait_for_result(process, results, timeout_s, name):
+    # A child that crashes (e.g. killed for memory) never reports, so poll
+    # the queue and give up once the child is gone or the time is up
+    deadline = time.monotonic() + timeout_s
+    while True:
+        try:
+            return results.get(timeout=1.0)
+        except queue.Empty:
+            pass
+        if not process.is_alive():
+            try:
+                return results.get(timeout=5.0) # Anything still in the pipe
+            except queue.Empty:
+                raise RuntimeError(f"Profiling {name} failed: the child exited with code {process.exitcode}.")
+        if time.monotonic() > deadline:
+            process.terminate()
+            process.join()
+            raise RuntimeError(f"Profiling {name} timed out after {timeout_s:g}s.")
+
+
+def profile_backend(backend, model_path, images, repeats=10, timeout_s=PROFILE_TIMEOUT_S):
+    """Loads a model in a child process and measures memory, latency and outputs."""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_profile_backend, args=(backend, model_path, images, repeats, results))
+    process.start()
+    result = _wait_for_result(process, results, timeout_s, f"{model_path} ({backend})")
+    process.join()
+    result['predictions'] = np.asarray(result['predictions'])
+    result['file_mb'] = os.path.getsize(model_path) / (1024.0 * 1024.0)
+    # Pruned weights are stored as dense zeros; they only shrink compressed copies
+    with open(model_path, 'rb') as f:
+        result['gzip_mb'] = len(gzip.compress(f.read(), compresslevel=6)) / (1024.0 * 1024.0)
+    return result
+
+
+def compare_backends(candidates, images, labels, repeats=10, timeout_s=PROFILE_TIMEOUT_S):
+    """
+    Profiles the Keras model and each (backend, path) candidate, and checks the
+    candidates' outputs against Keras on the validation spectrograms.
+    """
+    reference = profile_backend('keras', KERAS_MODEL_PATH, images, repeats, timeout_s)
+    expected = reference['predictions']
+    report = {}
+    for backend, path in [('keras', KERAS_MODEL_PATH)] + candidates:
+        result = reference if path == KERAS_MODEL_PATH else profile_backend(backend, path, images, repeats, timeout_s)
+        predictions = result.pop('predictions')
+        entry = dict(result, backend=backend)
+        if len(images):
+            difference = np.abs(predictions - expected)
+            entry.update({
+                'max_abs_diff': float(difference.max()),
+                'mean_abs_diff': float(difference.mean()),
+                'label_agreement': float(np.mean((predictions > 0.5) == (expected > 0.5))),
+                'accuracy': float(np.mean((predictions > 0.5) == labels)),
+            })
+        report[os.path.basename(path)] = entry
+    return report
+
+
+def print_report(report):
+    header = f"{'model':<50} {'params':>10} {'file MB':>8} {'gzip MB':>8} {'RSS MB':>8} {'load s':>7} " + \
+        ' '.join(f"{'b=' + str(b) + ' ms':>9}" for b in BENCHMARK_BATCH_SIZES) + \
+        f" {'max diff':>9} {'agree':>6} {'acc':>6}"
+    print(header)
+    print('-' * len(header))
+    for name, entry in report.items():
+        latencies = ' '.join(f"{entry['latency_ms'][b]:>9.2f}" for b in BENCHMARK_BATCH_SIZES)
+        params = f"{entry['params']:>10,}" if entry.get('params') is not None else f"{'-':>10}"
+        print(
+            f"{name:<50} {params} {entry['file_mb']:>8.1f} {entry['gzip_mb']:>8.1f} {entry['rss_mb']:>8.1f} "
+            f"{entry['load_s']:>7.2f} {latencies} "
+            f"{entry.get('max_abs_diff', float('nan')):>9.5f} {entry.get('label_agreement', float('nan')):>6.3f} "
+            f"{entry.get('accuracy', float('nan')):>6.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the audio CNN to lightweight CPU runtimes and compare them with Keras.")
+    parser.add_argument('--format', choices=['tflite', 'onnx'], nargs='+', default=['tflite'])
+    parser.add_argument('--keras-models', nargs='+', default=[],
+                        help="Also compare these Keras models, e.g. the variants from train_model.py --architecture.")
+    parser.add_argument('--skip-export', action='store_true', help="Only compare the Keras models.")
+    parser.add_argument('--quantize', choices=QUANTIZATION_MODES, default='none')
+    parser.add_argument('--output-dir', default='.')
+    parser.add_argument('--limit', type=int, default=None, help="Only use this many validation spectrograms.")
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--timeout', type=float, default=PROFILE_TIMEOUT_S, help="Seconds allowed to profile each model.")
+    parser.add_argument('--skip-compare', action='store_true')
+    parser.add_argument('--report', default='export_report.json')
+    args = parser.parse_args()
+    if not args.skip_export and 'onnx' in args.format and args.quantize not in ONNX_QUANTIZATION_MODES:
+        parser.error(f"ONNX export supports --quantize {' or '.join(ONNX_QUANTIZATION_MODES)}, not {args.quantize}.")
+
+    images, labels = load_validation_spectrograms(args.limit)
+    print(f"Loaded {len(images)} validation spectrograms.")
+
+    base_name = os.path.splitext(os.path.basename(KERAS_MODEL_PATH))[0]
+    suffix = '' if args.quantize == 'none' else f'_{args.quantize}'
+    candidates = [('keras', path) for path in args.keras_models]
+    for fmt in ([] if args.skip_export else args.format):
+        output_path = os.path.join(args.output_dir, f"{base_name}{suffix}.{fmt}")
+        if fmt == 'tflite':
+            export_tflite(KERAS_MODEL_PATH, output_path, args.quantize, calibration_images=images)
+        else:
+            export_onnx(KERAS_MODEL_PATH, output_path, args.quantize)
+        candidates.append((fmt, output_path))
+
+    if args.skip_compare:
+        return
+    report = compare_backends(candidates, images, labels, repeats=args.repeats, timeout_s=args.timeout)
+    print_report(report)
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Comparison saved to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
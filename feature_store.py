@@ -0,0 +1,163 @@
+import json
+import os
+import shutil
+import numpy as np
+
+
+# Feature Store
+# A store is a directory of fixed-shape array shards (.npy, opened as
+# memory maps) plus an index.json sidecar describing every row:
+#
+#   features_stft_5s/
+#       index.json
+#       train-00000.npy      (N, *shape) rows of one split
+#       validation-00000.npy
+#
+# Shards never mix splits, so a batch of consecutive rows is a zero-copy
+# slice of a single memory map.
+INDEX_FILENAME = 'index.json'
+STORE_VERSION = 1
+
+
+class FeatureStoreWriter:
+    """
+    Writes fixed-shape feature arrays into per-split shards. The store is
+    assembled in a temporary directory and swapped into place on close(), so
+    readers never see a half-written store.
+    """
+    def __init__(self, path, shape, dtype='uint8', feature='image', shard_size=512, parameters=None):
+        self.path = path
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.feature = feature
+        self.shard_size = shard_size
+        self.parameters = parameters or {}
+        self._temp_path = path.rstrip(os.sep) + '.tmp'
+        if os.path.exists(self._temp_path):
+            shutil.rmtree(self._temp_path)
+        os.makedirs(self._temp_path)
+        self._buffers = {}
+        self._shards = []
+        self._records = []
+
+    def add(self, split, array, label, **metadata):
+        """Queues one row; metadata (source file, augmentation index, ...) goes to the index."""
+        array = np.asarray(array)
+        if array.shape != self.shape:
+            raise ValueError(f"Expected a feature of shape {self.shape}, got {array.shape}.")
+        buffer = self._buffers.setdefault(split, [])
+        buffer.append((array.astype(self.dtype, copy=False), int(label), metadata))
+        if len(buffer) >= self.shard_size:
+            self._flush(split)
+
+    def _flush(self, split):
+        buffer = self._buffers.pop(split, [])
+        if not buffer:
+            return
+        shard_number = sum(1 for shard in self._shards if shard['split'] == split)
+        filename = f"{split}-{shard_number:05d}.npy"
+        shard = np.lib.format.open_memmap(
+            os.path.join(self._temp_path, filename), mode='w+', dtype=self.dtype, shape=(len(buffer),) + self.shape
+        )
+        for offset, (array, label, metadata) in enumerate(buffer):
+            shard[offset] = array
+            self._records.append(dict(metadata, shard=len(self._shards), offset=offset, split=split, label=label))
+        shard.flush()
+        del shard
+        self._shards.append({'file': filename, 'split': split, 'count': len(buffer)})
+
+    def close(self):
+        for split in list(self._buffers):
+            self._flush(split)
+        index = {
+            'version': STORE_VERSION,
+            'feature': self.feature,
+            'shape': list(self.shape),
+            'dtype': self.dtype.str,
+            'parameters': self.parameters,
+            'shards': self._shards,
+            'records': self._records,
+        }
+        with open(os.path.join(self._temp_path, INDEX_FILENAME), 'w') as f:
+            json.dump(index, f, indent=1)
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.replace(self._temp_path, self.path)
+
+
+class FeatureStore:
+    """
+    Read-only view of a store written by FeatureStoreWriter. Shards are opened
+    lazily as read-only memory maps and every array returned is a view into
+    them; nothing is decoded or copied until the caller converts it.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILENAME)) as f:
+            self.index = json.load(f)
+        if self.index['version'] != STORE_VERSION:
+            raise ValueError(f"Unsupported feature store version {self.index['version']}.")
+        self.feature = self.index['feature']
+        self.shape = tuple(self.index['shape'])
+        self.dtype = np.dtype(self.index['dtype'])
+        self.parameters = self.index['parameters']
+        self._arrays = {}
+        self._labels = [np.zeros(shard['count'], dtype=np.int64) for shard in self.index['shards']]
+        for record in self.index['records']:
+            self._labels[record['shard']][record['offset']] = record['label']
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(os.path.join(path, INDEX_FILENAME))
+
+    @property
+    def splits(self):
+        return sorted({shard['split'] for shard in self.index['shards']})
+
+    def __len__(self):
+        return len(self.index['records'])
+
+    def count(self, split):
+        return sum(shard['count'] for shard in self.index['shards'] if shard['split'] == split)
+
+    def records(self, split=None):
+        """Metadata of every row (optionally of one split), in storage order."""
+        return [r for r in self.index['records'] if split is None or r['split'] == split]
+
+    def shard(self, number):
+        """Returns (features, labels) of one shard; features is a read-only memmap."""
+        if number not in self._arrays:
+            filename = self.index['shards'][number]['file']
+            self._arrays[number] = np.load(os.path.join(self.path, filename), mmap_mode='r')
+        return self._arrays[number], self._labels[number]
+
+    def shards(self, split):
+        """Returns (features, labels) for every shard of a split."""
+        return [self.shard(number) for number, shard in enumerate(self.index['shards']) if shard['split'] == split]
+
+    def labels(self, split):
+        return np.concatenate([labels for _, labels in self.shards(split)] or [np.zeros(0, np.int64)])
+
+    def batch_slices(self, split, batch_size):
+        """Lists (shard number, start, stop) for consecutive batches of a split."""
+        slices = []
+        for number, shard in enumerate(self.index['shards']):
+            if shard['split'] != split:
+                continue
+            for start in range(0, shard['count'], batch_size):
+                slices.append((number, start, min(start + batch_size, shard['count'])))
+        return slices
+
+    def iter_batches(self, split, batch_size, shuffle=False, seed=None):
+        """
+        Yields (features, labels) batches as zero-copy slices of the shards.
+        Shuffling permutes the order of the batches; rows are shuffled once
+        at write time.
+        """
+        slices = self.batch_slices(split, batch_size)
+        if shuffle:
+            order = np.random.default_rng(seed).permutation(len(slices))
+            slices = [slices[i] for i in order]
+        for number, start, stop in slices:
+            features, labels = self.shard(number)
+            yield features[start:stop], labels[start:stop]
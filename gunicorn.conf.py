@@ -0,0 +1,49 @@
+# gunicorn.conf.py
+# Gunicorn picks this file up automatically from the working directory.
+import os
+import shutil
+import tempfile
+
+# ML_PRELOAD=1 imports TensorFlow and reads the model files once in the
+# master so workers share those pages copy-on-write after fork.
+preload_app = os.environ.get('ML_PRELOAD') == '1'
+
+# ML_WARMUP=0 skips the dummy inference pass each worker runs at boot.
+ml_warmup = os.environ.get('ML_WARMUP', '1') == '1'
+
+# Workers write their metrics into this directory so that /metrics reports
+# all of them. It must exist before the app is imported (preloading imports
+# it ahead of on_starting). Stale files are cleared in on_starting, which
+# unlike this module is not re-run on a HUP reload.
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'parkinson_metrics'))
+os.makedirs(metrics_dir, exist_ok=True)
+
+
+def on_starting(server):
+    # Start from an empty directory: files left by an earlier run would be
+    # counted as live workers' samples
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+    if preload_app:
+        from app import ml_logic
+        ml_logic.preload_models()
+
+
+def post_fork(server, worker):
+    # Build the Keras model in the worker: the TF runtime is not fork-safe
+    from app import ml_logic
+    ml_logic.load_models()
+    if ml_warmup:
+        ml_logic.warm_up()
+    # Swap in newly activated registry versions without a restart
+    ml_logic.start_registry_watcher()
+
+
+def post_worker_init(worker):
+    # Queue the jobs a crashed or restarted worker left pending or running
+    worker.wsgi.extensions['prediction_queue'].start()
+
+
+def child_exit(server, worker):
+    from app.metrics import mark_worker_dead
+    mark_worker_dead(worker.pid)
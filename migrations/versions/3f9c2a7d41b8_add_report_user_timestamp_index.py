@@ -0,0 +1,30 @@
+"""add composite index on report (user_id, timestamp, id)
+
+Revision ID: 3f9c2a7d41b8
+Revises: 
+Create Date: 2026-10-17 01:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2a7d41b8'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The tables come from db.create_all(), which also creates this index on
+    # new databases; only add it where it is missing.
+    indexes = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('report')}
+    if 'ix_report_user_id_timestamp' not in indexes:
+        with op.batch_alter_table('report', schema=None) as batch_op:
+            batch_op.create_index('ix_report_user_id_timestamp', ['user_id', 'timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('report', schema=None) as batch_op:
+        batch_op.drop_index('ix_report_user_id_timestamp')
@@ -0,0 +1,38 @@
+"""add daily report count rollup table
+
+Revision ID: 8b1e5d03c6f2
+Revises: 3f9c2a7d41b8
+Create Date: 2026-10-17 02:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b1e5d03c6f2'
+down_revision = '3f9c2a7d41b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() may already have created the (empty) table
+    if not sa.inspect(op.get_bind()).has_table('daily_report_count'):
+        op.create_table('daily_report_count',
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('final_result', sa.String(length=32), nullable=False),
+            sa.Column('count', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('day', 'final_result')
+        )
+    # Backfill from the existing reports
+    op.execute('DELETE FROM daily_report_count')
+    op.execute(
+        "INSERT INTO daily_report_count (day, final_result, count) "
+        "SELECT date(timestamp), COALESCE(final_result, 'Unknown'), COUNT(*) FROM report "
+        "WHERE timestamp IS NOT NULL GROUP BY date(timestamp), COALESCE(final_result, 'Unknown')"
+    )
+
+
+def downgrade():
+    op.drop_table('daily_report_count')
@@ -0,0 +1,35 @@
+"""add security_stamp to user
+
+Revision ID: a94d6e2b7c13
+Revises: e5b2c8f17a90
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+import uuid
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a94d6e2b7c13'
+down_revision = 'e5b2c8f17a90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() already adds the column on new databases
+    bind = op.get_bind()
+    columns = {column['name'] for column in sa.inspect(bind).get_columns('user')}
+    if 'security_stamp' not in columns:
+        with op.batch_alter_table('user', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('security_stamp', sa.String(length=32), nullable=True))
+    # Every existing user gets a stamp; sessions from before it must sign in again
+    user = sa.table('user', sa.column('id', sa.Integer), sa.column('security_stamp', sa.String))
+    for (user_id,) in bind.execute(sa.select(user.c.id).where(user.c.security_stamp.is_(None))).fetchall():
+        bind.execute(user.update().where(user.c.id == user_id).values(security_stamp=uuid.uuid4().hex))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('security_stamp')
@@ -0,0 +1,29 @@
+"""add model version to report
+
+Revision ID: c71d4e9a2f35
+Revises: 8b1e5d03c6f2
+Create Date: 2026-10-17 03:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c71d4e9a2f35'
+down_revision = '8b1e5d03c6f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() already adds the column on new databases
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('report')}
+    if 'model_version' not in columns:
+        with op.batch_alter_table('report', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('model_version', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('report', schema=None) as batch_op:
+        batch_op.drop_column('model_version')
@@ -0,0 +1,36 @@
+"""add started_at and attempts to prediction_job
+
+Revision ID: e5b2c8f17a90
+Revises: c71d4e9a2f35
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b2c8f17a90'
+down_revision = 'c71d4e9a2f35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The table itself only comes from db.create_all(), which also adds the
+    # columns on new databases
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('prediction_job'):
+        return
+    columns = {column['name'] for column in inspector.get_columns('prediction_job')}
+    with op.batch_alter_table('prediction_job', schema=None) as batch_op:
+        if 'started_at' not in columns:
+            batch_op.add_column(sa.Column('started_at', sa.DateTime(), nullable=True))
+        if 'attempts' not in columns:
+            batch_op.add_column(sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('prediction_job', schema=None) as batch_op:
+        batch_op.drop_column('attempts')
+        batch_op.drop_column('started_at')
@@ -0,0 +1,244 @@
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from app import ml_logic
+from app.spectrogram import spectrogram_to_tensor
+
+
+RECORDING_PATTERNS = ['debug_files/submission_*/*', 'temp_uploads/*']
+AUDIO_EXTENSIONS = ('.webm', '.wav', '.mp3', '.m4a', '.mp4', '.aac', '.ogg', '.flac')
+OUTPUT_PATH = 'rescore_results.csv'
+FIELDS = [
+    'key', 'kind', 'age', 'features_from', 'old_score', 'old_result',
+    'symptom_proba', 'audio_proba', 'new_score', 'new_result', 'symptom_only_changed', 'model_version',
+]
+# Reports written by the job queue store the answers in this form
+SYMPTOMS_PATTERN = re.compile(r"Tremor: (?P<tremor>[^,]*), Stiffness: (?P<stiffness>[^,]*), Balance: (?P<balance>[^.]*)\.")
+
+
+# Results Table
+def load_done_keys(output_path):
+    """Returns the keys already in the results table, so an interrupted run can resume."""
+    if not os.path.exists(output_path):
+        return set()
+    with open(output_path, newline='') as f:
+        return {row['key'] for row in csv.DictReader(f)}
+
+
+class ResultsWriter:
+    """Appends rows to the CSV comparison table, flushing after every batch."""
+    def __init__(self, output_path):
+        new_file = not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+        if not new_file:
+            with open(output_path, newline='') as f:
+                if next(csv.reader(f), None) != FIELDS:
+                    raise SystemExit(f"{output_path} has different columns; re-run with --restart.")
+        self.file = open(output_path, 'a', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=FIELDS)
+        if new_file:
+            self.writer.writeheader()
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+# Recordings
+def find_recordings():
+    paths = []
+    for pattern in RECORDING_PATTERNS:
+        paths.extend(p for p in sorted(glob.glob(pattern)) if p.lower().endswith(AUDIO_EXTENSIONS))
+    return paths
+
+
+def _featurize(audio_path):
+    # Runs in a worker process: decode, noise reduction, STFT and rendering,
+    # of the centred window or of every window as the app does (AUDIO_SCORING).
+    # Returns a (windows, H, W) stack, or None.
+    if ml_logic.AUDIO_SCORING == 'windows':
+        return ml_logic.create_window_spectrograms_from_audio(audio_path)
+    pixels = ml_logic.create_stft_spectrogram_from_audio(audio_path)
+    return None if pixels is None else pixels[np.newaxis]
+
+
+def score_recordings(models, paths, executor, batch_size):
+    """
+    Featurizes recordings in the process pool and runs the audio model of
+    `models` on batches of about `batch_size` windows. Yields (paths,
+    probabilities) per batch; a probability is None when the recording could
+    not be decoded.
+    """
+    features = executor.map(_featurize, paths, chunksize=4)
+    batch_paths, batch_stacks, failed, windows = [], [], [], 0
+    for path, stack in zip(paths, features):
+        if stack is None:
+            failed.append(path)
+        else:
+            batch_paths.append(path)
+            batch_stacks.append(stack)
+            windows += len(stack)
+        if windows + len(failed) >= batch_size:
+            yield _predict_batch(models, batch_paths, batch_stacks, failed)
+            batch_paths, batch_stacks, failed, windows = [], [], [], 0
+    if batch_paths or failed:
+        yield _predict_batch(models, batch_paths, batch_stacks, failed)
+
+
+def _predict_batch(models, paths, stacks, failed):
+    probabilities = []
+    if stacks:
+        scores = np.asarray(models.audio_model.predict_batch(spectrogram_to_tensor(np.concatenate(stacks)))).reshape(-1)
+        # Split the batch back into recordings and combine their windows
+        for recording_scores in np.split(scores, np.cumsum([len(stack) for stack in stacks])[:-1]):
+            if ml_logic.AUDIO_SCORING == 'windows':
+                probabilities.append(ml_logic.aggregate_window_scores(recording_scores))
+            else:
+                probabilities.append(float(recording_scores[0]))
+    return paths + failed, probabilities + [None] * len(failed)
+
+
+# Reports
+def parse_symptoms(text):
+    """
+    Recovers the symptom model's features from a Report's symptoms text.
+    Returns (features, how): 'report' when the structured summary written by
+    the job queue was found, 'keywords' for older free-text reports.
+    """
+    match = SYMPTOMS_PATTERN.search(text or '')
+    if match:
+        form = {name: value.strip().lower().replace(' ', '_') for name, value in match.groupdict().items()}
+        return ml_logic.symptom_features_from_form(form), 'report'
+    text = (text or '').lower()
+    return {
+        'tremor': int('tremor' in text or 'shak' in text),
+        'stiffness': int('stiff' in text or 'slow' in text),
+        'walking_issue': int('balance' in text or 'walk' in text),
+    }, 'keywords'
+
+
+def load_reports(done_keys):
+    """Collects every Report not yet re-scored, with the best available symptom features."""
+    from app.models import PredictionJob, Report
+    forms = {job.report_id: json.loads(job.form_data) for job in PredictionJob.query.filter(PredictionJob.report_id.isnot(None))}
+    rows = []
+    for report in Report.query.order_by(Report.id):
+        key = f"report:{report.id}"
+        if key in done_keys:
+            continue
+        if report.id in forms:
+            features, how = ml_logic.symptom_features_from_form(forms[report.id]), 'form'
+        else:
+            features, how = parse_symptoms(report.symptoms)
+        rows.append({
+            'key': key, 'kind': 'report', 'age': report.age, 'features': features, 'features_from': how,
+            'old_score': report.cnn_prediction, 'old_result': report.final_result,
+        })
+    return rows
+
+
+def score_symptoms(models, rows):
+    """Scores every row's symptom features with a single predict_proba call."""
+    if not rows:
+        return np.zeros(0)
+    frame = pd.DataFrame([row['features'] for row in rows])[ml_logic.SYMPTOM_FEATURES]
+    return models.symptom_model.predict_proba(frame)[:, 1]
+
+
+# Backfill
+# Both kinds of row are stamped with the ModelSet version, the same value the
+# app stores in Report.model_version.
+def rescore_recordings(models, writer, done_keys, workers, batch_size, limit=None):
+    paths = [p for p in find_recordings() if p not in done_keys][:limit]
+    print(f"Re-scoring {len(paths)} recording(s) with {workers} worker(s), batch size {batch_size}, "
+          f"{ml_logic.AUDIO_SCORING} scoring...")
+    if not paths:
+        return 0
+    start, scored = time.perf_counter(), 0
+    context = multiprocessing.get_context('spawn') # Workers never touch the model runtime
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        for batch_paths, probabilities in score_recordings(models, paths, executor, batch_size):
+            writer.write([{
+                'key': path, 'kind': 'recording', 'audio_proba': proba, 'model_version': models.version,
+            } for path, proba in zip(batch_paths, probabilities)])
+            scored += len(batch_paths)
+            elapsed = time.perf_counter() - start
+            print(f"  {scored}/{len(paths)} recordings, {scored / elapsed:.1f}/s")
+    return scored
+
+
+def rescore_reports(models, writer, done_keys, limit=None):
+    rows = load_reports(done_keys)[:limit]
+    print(f"Re-scoring {len(rows)} report(s)...")
+    if not rows:
+        return 0
+    start = time.perf_counter()
+    probabilities = score_symptoms(models, rows)
+    for row, symptom_proba in zip(rows, probabilities):
+        # The recording behind a report is deleted after scoring, so the audio
+        # term is held at the 0.5 the app uses when audio is unavailable. The
+        # new result therefore reflects the symptom model only and is not a
+        # like-for-like comparison with the stored one.
+        final_result, _, final_score = ml_logic.combine_predictions(symptom_proba, 0.5, row['age'])
+        row.update({
+            'symptom_proba': float(symptom_proba), 'new_score': final_score, 'new_result': final_result,
+            'symptom_only_changed': final_result != row['old_result'], 'model_version': models.version,
+        })
+        del row['features']
+    writer.write(rows)
+    elapsed = time.perf_counter() - start
+    print(f"  {len(rows)} reports in {elapsed:.2f}s ({len(rows) / elapsed:.0f}/s), "
+          f"{sum(row['symptom_only_changed'] for row in rows)} differ on the symptom model alone")
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score stored recordings and past reports with the current models.")
+    parser.add_argument('--source', choices=['recordings', 'reports', 'all'], default='all')
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument('--batch-size', type=int, default=32, help="Spectrogram windows per model call.")
+    parser.add_argument('--limit', type=int, default=None, help="Only re-score this many items per source.")
+    parser.add_argument('--restart', action='store_true', help="Discard previous results instead of resuming.")
+    args = parser.parse_args()
+
+    if args.restart and os.path.exists(args.output):
+        os.remove(args.output)
+    done_keys = load_done_keys(args.output)
+    if done_keys:
+        print(f"Resuming: {len(done_keys)} item(s) already in {args.output}")
+
+    writer = ResultsWriter(args.output)
+    start = time.perf_counter()
+    total = 0
+    # One model version for the whole run, even if the registry changes meanwhile
+    with ml_logic.use_models() as models:
+        if models.audio_model is None or models.symptom_model is None:
+            raise SystemExit("Both models must load before re-scoring.")
+        print(f"Scoring with model version {models.version}")
+        try:
+            if args.source in ('recordings', 'all'):
+                total += rescore_recordings(models, writer, done_keys, args.workers, args.batch_size, args.limit)
+            if args.source in ('reports', 'all'):
+                from app import create_app
+                with create_app().app_context():
+                    total += rescore_reports(models, writer, done_keys, args.limit)
+        finally:
+            writer.close()
+    elapsed = time.perf_counter() - start
+    print(f"Re-scored {total} item(s) in {elapsed:.1f}s; results in {args.output}")
+
+
+if __name__ == '__main__':
+    main()
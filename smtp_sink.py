@@ -0,0 +1,129 @@
+import argparse
+import os
+import socketserver
+import threading
+import time
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """
+    A local SMTP stand-in for development and load tests. It accepts every
+    message (and any AUTH PLAIN credentials), keeps them in `messages`, and
+    counts the connections it served. With `fail_every=N`, every Nth DATA
+    command gets a temporary 451 reply so retries can be exercised.
+
+        sink = SMTPSink(('127.0.0.1', 2525)).start()
+        ...
+        sink.stop()
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, fail_every=0, maildir=None):
+        super().__init__(address, _SMTPHandler)
+        self.fail_every = fail_every
+        self.maildir = maildir
+        self.messages = []
+        self.connections = 0
+        self.data_commands = 0
+        self.lock = threading.Lock()
+        if maildir:
+            os.makedirs(maildir, exist_ok=True)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='smtp-sink', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def store(self, sender, recipients, data):
+        with self.lock:
+            self.messages.append({'sender': sender, 'recipients': recipients, 'data': data})
+            if self.maildir:
+                path = os.path.join(self.maildir, f"{time.time():.6f}_{len(self.messages)}.eml")
+                with open(path, 'wb') as f:
+                    f.write(data)
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply('220 smtp-sink ready')
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self.wfile.write(b'250-smtp-sink\r\n250-8BITMIME\r\n250-SMTPUTF8\r\n250 AUTH PLAIN\r\n')
+            elif verb == 'HELO':
+                self.reply('250 smtp-sink')
+            elif verb == 'AUTH':
+                self.reply('235 2.7.0 Authentication successful')
+            elif verb == 'MAIL':
+                sender, recipients = command[10:].split(' ')[0].strip('<>'), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command[8:].split(' ')[0].strip('<>'))
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = self._read_data()
+                with server.lock:
+                    server.data_commands += 1
+                    fail = server.fail_every and server.data_commands % server.fail_every == 0
+                if fail:
+                    self.reply('451 4.3.0 Temporary failure, try again')
+                else:
+                    server.store(sender, recipients, data)
+                    self.reply('250 OK: queued')
+                sender, recipients = None, []
+            elif verb in ('RSET', 'NOOP'):
+                sender, recipients = (None, []) if verb == 'RSET' else (sender, recipients)
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+    def _read_data(self):
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line or line in (b'.\r\n', b'.\n'):
+                break
+            lines.append(line[1:] if line.startswith(b'..') else line) # Undo dot-stuffing
+        return b''.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local SMTP server that accepts and keeps every message. "
+                                                 "Point MAIL_SERVER/MAIL_PORT at it with MAIL_USE_TLS unset.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2525)
+    parser.add_argument('--maildir', default=None, help="Also write each message here as a .eml file.")
+    parser.add_argument('--fail-every', type=int, default=0, help="Answer every Nth message with a temporary 451.")
+    args = parser.parse_args()
+
+    sink = SMTPSink((args.host, args.port), fail_every=args.fail_every, maildir=args.maildir)
+    print(f"SMTP sink listening on {args.host}:{args.port}")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"{len(sink.messages)} message(s) over {sink.connections} connection(s)")
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
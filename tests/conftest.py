@@ -0,0 +1,47 @@
+import os
+import pytest
+from app import create_app, db
+from app.models import User
+from config import Config
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WEBM_RECORDING = os.path.join(REPO_DIR, 'debug_files', 'submission_1750134828.793108', '1_original_recording.webm')
+
+
+class TestConfig(Config):
+    TESTING = True
+    SECRET_KEY = 'test'
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    PREDICTION_QUEUE_BACKEND = 'inline'
+    USER_CACHE_TTL_S = 0
+    MAIL_SUPPRESS_SEND = True
+    ADMINS = ['admin@example.com']
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # Uploads are written relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    app = create_app(TestConfig)
+    with app.app_context():
+        yield app
+        db.session.remove()
+    app.extensions['email_outbox'].shutdown()
+
+
+@pytest.fixture
+def user(app):
+    user = User(username='tester', email='tester@example.com')
+    user.set_password('secret')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def client(app, user):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = user.get_id()
+        session['_fresh'] = True
+    return client
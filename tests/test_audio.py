@@ -0,0 +1,99 @@
+import subprocess
+import numpy as np
+import pytest
+from app import audio
+from tests.conftest import WEBM_RECORDING
+
+pytest.importorskip('imageio_ffmpeg')
+
+WINDOW_S = 5
+
+
+@pytest.fixture
+def m4a_recording(tmp_path):
+    # A 6 s AAC file, whose container records its duration (unlike browser webm)
+    path = tmp_path / 'recording.m4a'
+    subprocess.run([audio.get_ffmpeg_exe(), '-v', 'error', '-i', WEBM_RECORDING, '-t', '6', '-c:a', 'aac', str(path)],
+                   check=True)
+    return str(path)
+
+
+def wav_round_trip(path, tmp_path):
+    # How uploads were decoded before: ffmpeg writes a WAV that librosa reads back
+    wav_path = tmp_path / 'converted_audio.wav'
+    subprocess.run([audio.get_ffmpeg_exe(), '-v', 'error', '-i', path, '-acodec', 'pcm_s16le', '-ac', '1',
+                    '-ar', str(audio.DECODE_SAMPLE_RATE), str(wav_path)], check=True)
+    return audio.librosa.load(str(wav_path), sr=None)
+
+
+def test_webm_decodes_in_memory_like_the_wav_round_trip(monkeypatch, tmp_path):
+    expected, expected_sr = wav_round_trip(WEBM_RECORDING, tmp_path)
+    monkeypatch.setattr(audio, 'av', None)
+    uploads = tmp_path / 'uploads'
+    uploads.mkdir()
+    upload = uploads / 'recording.webm'
+    upload.write_bytes(open(WEBM_RECORDING, 'rb').read())
+    y, sr = audio.load_audio(str(upload))
+    # No temp_<name> directory or converted WAV next to the upload
+    assert list(uploads.iterdir()) == [upload]
+    assert sr == expected_sr
+    np.testing.assert_array_equal(y, expected)
+
+
+def test_webm_decodes_in_process_with_pyav(tmp_path):
+    if audio.av is None:
+        pytest.skip('PyAV is not installed')
+    expected, _ = wav_round_trip(WEBM_RECORDING, tmp_path)
+    y, _ = audio.decode_audio(WEBM_RECORDING)
+    assert len(y) == len(expected)
+    assert np.abs(y - expected).max() <= 1 / 32768
+
+
+def test_probe_without_pyav(monkeypatch, m4a_recording):
+    monkeypatch.setattr(audio, 'av', None)
+    assert audio.probe_audio(WEBM_RECORDING) == (None, 48000)
+    n_samples, rate = audio.probe_audio(m4a_recording)
+    assert rate == 48000
+    assert n_samples == pytest.approx(6 * rate, abs=0.05 * rate)
+
+
+def test_window_without_pyav_is_an_expected_path(monkeypatch, capsys, m4a_recording):
+    monkeypatch.setattr(audio, 'av', None)
+    for path in (WEBM_RECORDING, m4a_recording):
+        y, sr = audio.load_audio_window(path, WINDOW_S)
+        assert (len(y), sr) == (WINDOW_S * audio.DECODE_SAMPLE_RATE, audio.DECODE_SAMPLE_RATE)
+    assert 'Could not probe' not in capsys.readouterr().out
+
+
+def test_window_without_pyav_matches_pyav(monkeypatch):
+    if audio.av is None:
+        pytest.skip('PyAV is not installed')
+    expected, _ = audio.load_audio_window(WEBM_RECORDING, WINDOW_S)
+    monkeypatch.setattr(audio, 'av', None)
+    actual, _ = audio.load_audio_window(WEBM_RECORDING, WINDOW_S)
+    np.testing.assert_allclose(actual, expected, atol=1e-4)
+
+
+def test_native_slice_without_pyav(monkeypatch, m4a_recording):
+    monkeypatch.setattr(audio, 'av', None)
+    full, rate = audio.read_native(m4a_recording)
+    start = 2 * rate
+    window, _ = audio.read_native(m4a_recording, start, start + rate)
+    assert len(window) == rate
+    # A seek into AAC lands within a few ms of the sample asked for
+    errors = [np.abs(full[start + lag:start + lag + rate // 2] - window[:rate // 2]).mean() for lag in range(-480, 481, 48)]
+    assert min(errors) < 0.01
+
+
+def test_sliding_windows_are_centred_views():
+    y = np.arange(100, dtype=np.float32)
+    windows = audio.sliding_windows(y, 40, 25)
+    # Spans 0-90 by 25 leave 10 samples over, split evenly at both ends
+    assert windows[:, 0].tolist() == [5, 30, 55]
+    assert np.shares_memory(windows, y)
+    # Capping the count widens the hop
+    assert audio.sliding_windows(y, 40, 10, max_windows=3)[:, 0].tolist() == [0, 30, 60]
+    assert audio.sliding_windows(y, 40, 10, max_windows=1)[:, 0].tolist() == [30]
+    short = audio.sliding_windows(y[:30], 40, 10)
+    assert short.shape == (1, 40)
+    np.testing.assert_array_equal(short[0], audio.fit_center(y[:30], 40))
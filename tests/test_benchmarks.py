@@ -0,0 +1,34 @@
+import json
+import pytest
+from app import ml_logic
+from benchmarks import pipeline
+from tests.conftest import WEBM_RECORDING
+
+pytest.importorskip('imageio_ffmpeg')
+
+
+def test_measure_times_repeats_after_warmup():
+    calls = []
+    result = pipeline.measure(lambda state: calls.append(state), {}, warmup=2, repeats=3)
+    # Plus one run under tracemalloc for the peak
+    assert len(calls) == 6
+    assert set(result) == {'wall_ms', 'cpu_ms', 'peak_mb'}
+    assert result['wall_ms']['min'] <= result['wall_ms']['median'] <= result['wall_ms']['max']
+
+
+def test_stages_without_models_skip_prediction(monkeypatch):
+    monkeypatch.setattr(ml_logic, 'audio_model', None)
+    results = pipeline.run_stages(pipeline.PIPELINE_STAGES, WEBM_RECORDING, warmup=0, repeats=1)
+    assert list(results) == ['inspect', 'hash', 'load_window', 'dsp', 'render', 'tensor']
+    reference = pipeline.run_stages(pipeline.REFERENCE_STAGES, WEBM_RECORDING, warmup=0, repeats=1)
+    assert list(reference) == [name for name, _ in pipeline.REFERENCE_STAGES]
+
+
+def test_compare_reports_the_change_per_stage(tmp_path, capsys):
+    def report(median):
+        return {'commit': 'abc', 'inputs': [{'path': 'a.webm', 'pipeline': {'dsp': {'wall_ms': {'median': median}}}}]}
+
+    baseline = tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps(report(20.0)))
+    pipeline.compare(report(15.0), str(baseline))
+    assert '20.00 ->     15.00 ms (-25.0%)' in capsys.readouterr().out
@@ -0,0 +1,66 @@
+import time
+import pytest
+from flask_mail import Message
+from app import create_app
+from app.email import EmailOutbox, send_email
+from smtp_sink import SMTPSink
+from tests.conftest import TestConfig
+
+
+@pytest.fixture
+def sink():
+    sink = SMTPSink(('127.0.0.1', 0)).start()
+    yield sink
+    sink.stop()
+
+
+@pytest.fixture
+def mail_app(tmp_path, monkeypatch, sink):
+    monkeypatch.chdir(tmp_path)
+
+    class MailConfig(TestConfig):
+        MAIL_SUPPRESS_SEND = False
+        MAIL_SERVER, MAIL_PORT = sink.server_address
+        MAIL_RETRY_BACKOFF_S = 0.01
+
+    app = create_app(MailConfig)
+    yield app
+    app.extensions['email_outbox'].shutdown()
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def send(app, count):
+    with app.app_context():
+        for i in range(count):
+            assert send_email(f'Result {i}', 'admin@example.com', [f'user{i}@example.com'], 'text', '<p>html</p>')
+
+
+def test_queued_messages_share_one_connection(mail_app, sink):
+    send(mail_app, 10)
+    assert wait_for(lambda: len(sink.messages) == 10)
+    assert sink.connections == 1
+    assert sorted(m['recipients'][0] for m in sink.messages) == sorted(f'user{i}@example.com' for i in range(10))
+
+
+def test_temporary_failures_are_retried(mail_app, sink):
+    sink.fail_every = 2
+    send(mail_app, 4)
+    assert wait_for(lambda: len(sink.messages) == 4)
+    assert sink.data_commands > 4
+
+
+def test_full_queue_drops_instead_of_blocking(mail_app):
+    mail_app.config['MAIL_QUEUE_SIZE'] = 1
+    outbox = EmailOutbox(mail_app)
+    outbox._start = lambda: None # No delivery threads, so the queue stays full
+    with mail_app.app_context():
+        assert outbox.submit(Message('first', sender='a@example.com', recipients=['b@example.com']))
+        start = time.monotonic()
+        assert not outbox.submit(Message('second', sender='a@example.com', recipients=['b@example.com']))
+        assert time.monotonic() - start < 1
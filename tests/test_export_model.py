@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip('tensorflow')
+import export_model
+from app.inference import load_backend
+
+IMAGES = np.random.default_rng(0).random((8, export_model.IMG_HEIGHT, export_model.IMG_WIDTH, 1), dtype=np.float32)
+
+
+@pytest.fixture(scope='module')
+def keras_path(tmp_path_factory):
+    # A small model with the app's input shape and sigmoid output
+    tf.keras.utils.set_random_seed(0)
+    model = tf.keras.Sequential([
+        tf.keras.layers.Input((export_model.IMG_HEIGHT, export_model.IMG_WIDTH, 1)),
+        tf.keras.layers.Conv2D(4, 3, strides=4, activation='relu'),
+        tf.keras.layers.GlobalAveragePooling2D(),
+        tf.keras.layers.Dense(1, activation='sigmoid'),
+    ])
+    path = str(tmp_path_factory.mktemp('models') / 'model.h5')
+    model.save(path)
+    return path
+
+
+@pytest.fixture(scope='module')
+def expected(keras_path):
+    return load_backend('keras', keras_path).predict_batch(IMAGES).reshape(-1)
+
+
+def predict(backend, source, tolerance):
+    # One sample, then a batch, so the interpreter has to resize its input.
+    # Dynamic quantization scales activations per batch, hence the tolerance.
+    model = load_backend(backend, source)
+    single = model.predict_batch(IMAGES[:1]).reshape(-1)
+    batch = model.predict_batch(IMAGES).reshape(-1)
+    np.testing.assert_allclose(single, batch[:1], atol=tolerance)
+    return batch
+
+
+@pytest.mark.parametrize('quantization, tolerance', [('none', 1e-5), ('float16', 1e-2), ('dynamic', 1e-2)])
+def test_tflite_export_matches_keras(keras_path, expected, tmp_path, quantization, tolerance):
+    path = str(tmp_path / 'model.tflite')
+    export_model.export_tflite(keras_path, path, quantization)
+    np.testing.assert_allclose(predict('tflite', path, tolerance), expected, atol=tolerance)
+    with open(path, 'rb') as f:
+        np.testing.assert_allclose(predict('tflite', f.read(), tolerance), expected, atol=tolerance)
+
+
+def test_int8_tflite_export_matches_keras(keras_path, expected, tmp_path):
+    path = str(tmp_path / 'model_int8.tflite')
+    with pytest.raises(ValueError):
+        export_model.export_tflite(keras_path, path, 'int8')
+    export_model.export_tflite(keras_path, path, 'int8', calibration_images=IMAGES)
+    np.testing.assert_allclose(predict('tflite', path, 0.05), expected, atol=0.05)
+
+
+@pytest.mark.parametrize('quantization, tolerance', [('none', 1e-5), ('dynamic', 0.05)])
+def test_onnx_export_matches_keras(keras_path, expected, tmp_path, quantization, tolerance):
+    pytest.importorskip('tf2onnx')
+    pytest.importorskip('onnxruntime')
+    path = str(tmp_path / 'model.onnx')
+    export_model.export_onnx(keras_path, path, quantization)
+    with open(path, 'rb') as f:
+        np.testing.assert_allclose(predict('onnx', f.read(), tolerance), expected, atol=tolerance)
+
+
+def test_unknown_backend_is_rejected(keras_path):
+    with pytest.raises(ValueError, match='Unknown audio model backend'):
+        load_backend('torch', keras_path)
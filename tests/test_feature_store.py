@@ -0,0 +1,73 @@
+import json
+import os
+import numpy as np
+import pytest
+from feature_store import INDEX_FILENAME, FeatureStore, FeatureStoreWriter
+
+SHAPE = (4, 3, 1)
+
+
+def feature(value):
+    return np.full(SHAPE, value, dtype=np.uint8)
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    # 5 train rows in shards of 2, 2 and 1 (written last, on close); 2 validation rows
+    path = str(tmp_path / 'features')
+    writer = FeatureStoreWriter(path, SHAPE, shard_size=2, parameters={'n_fft': 1024})
+    for i in range(5):
+        writer.add('train', feature(i), i % 2, source=f'train_{i}.wav')
+    for i in range(2):
+        writer.add('validation', feature(100 + i), 1, source=f'validation_{i}.wav')
+    writer.close()
+    return path
+
+
+def test_rows_round_trip(store_path):
+    store = FeatureStore(store_path)
+    assert (len(store), store.splits, store.parameters) == (7, ['train', 'validation'], {'n_fft': 1024})
+    assert (store.count('train'), store.count('validation')) == (5, 2)
+    assert [r['source'] for r in store.records('train')] == [f'train_{i}.wav' for i in range(5)]
+    assert list(store.labels('train')) == [0, 1, 0, 1, 0]
+
+    features, labels = zip(*store.iter_batches('validation', 8))
+    assert features[0].shape == (2,) + SHAPE
+    assert features[0][:, 0, 0, 0].tolist() == [100, 101]
+
+
+def test_batches_are_zero_copy_slices_of_one_shard(store_path):
+    store = FeatureStore(store_path)
+    slices = store.batch_slices('train', 8)
+    assert slices == [(0, 0, 2), (1, 0, 2), (3, 0, 1)]
+    for (number, _, _), (features, _) in zip(slices, store.iter_batches('train', 8)):
+        assert isinstance(features, np.memmap)
+        assert np.shares_memory(features, store.shard(number)[0])
+        assert not features.flags.writeable
+    shuffled = [features[0, 0, 0, 0] for features, _ in store.iter_batches('train', 8, shuffle=True, seed=0)]
+    assert sorted(shuffled) == [0, 2, 4]
+    rows = np.concatenate([features[:, 0, 0, 0] for features, _ in store.iter_batches('train', 8)])
+    assert rows.tolist() == [0, 1, 2, 3, 4]
+
+
+def test_rewrite_replaces_the_store_atomically(store_path):
+    writer = FeatureStoreWriter(store_path, SHAPE)
+    with pytest.raises(ValueError):
+        writer.add('train', np.zeros((2, 2, 1)), 0)
+    # Until close() readers still see the old store
+    assert FeatureStore(store_path).count('train') == 5
+    writer.add('train', feature(7), 1)
+    writer.close()
+    assert FeatureStore(store_path).count('train') == 1
+    assert not os.path.exists(store_path + '.tmp')
+
+
+def test_unknown_store_version_is_rejected(store_path):
+    index_path = os.path.join(store_path, INDEX_FILENAME)
+    with open(index_path) as f:
+        index = json.load(f)
+    index['version'] += 1
+    with open(index_path, 'w') as f:
+        json.dump(index, f)
+    with pytest.raises(ValueError, match='version'):
+        FeatureStore(store_path)
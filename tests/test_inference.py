@@ -0,0 +1,64 @@
+import threading
+from concurrent.futures import TimeoutError
+import numpy as np
+import pytest
+from app.inference import BatchingEngine
+
+
+def _inputs(n):
+    return np.zeros((n, 2, 2, 1), dtype=np.float32)
+
+
+def test_batches_results_back_to_callers():
+    engine = BatchingEngine(lambda batch: np.arange(len(batch), dtype=np.float32), max_wait_ms=1)
+    try:
+        assert list(engine.predict_many(_inputs(3))) == [0, 1, 2]
+        assert engine.predict(_inputs(1)) == 0.0
+    finally:
+        engine.shutdown()
+
+
+def test_backend_errors_reach_callers_and_the_engine_keeps_running():
+    fail = threading.Event()
+    fail.set()
+
+    def predict_batch(batch):
+        if fail.is_set():
+            raise RuntimeError("model failed")
+        return np.full(len(batch), 0.7)
+
+    engine = BatchingEngine(predict_batch, max_wait_ms=1, timeout_s=5)
+    try:
+        with pytest.raises(RuntimeError, match="model failed"):
+            engine.predict(_inputs(1))
+        fail.clear()
+        assert engine.predict(_inputs(1)) == pytest.approx(0.7)
+    finally:
+        engine.shutdown()
+
+
+def test_wrong_output_count_fails_the_batch_without_killing_the_engine():
+    outputs = iter([np.zeros(1), np.full(2, 0.3)])
+    engine = BatchingEngine(lambda batch: next(outputs), max_wait_ms=1, timeout_s=5)
+    try:
+        with pytest.raises(ValueError):
+            engine.predict_many(_inputs(2))
+        assert list(engine.predict_many(_inputs(2))) == pytest.approx([0.3, 0.3])
+    finally:
+        engine.shutdown()
+
+
+def test_callers_stop_waiting_on_a_stuck_backend():
+    release = threading.Event()
+
+    def predict_batch(batch):
+        release.wait(10)
+        return np.zeros(len(batch))
+
+    engine = BatchingEngine(predict_batch, max_wait_ms=1, timeout_s=0.2)
+    try:
+        with pytest.raises(TimeoutError):
+            engine.predict(_inputs(1))
+    finally:
+        release.set()
+        engine.shutdown()
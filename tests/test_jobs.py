@@ -0,0 +1,128 @@
+import json
+import os
+from datetime import datetime, timedelta
+import pytest
+from prometheus_client import REGISTRY
+from app import db, jobs
+from app.models import PredictionJob, User
+from app.uploads import UPLOAD_DIR
+from tests.conftest import WEBM_RECORDING
+
+FORM = {'age': '64', 'gender': 'female', 'tremor': 'resting', 'stiffness': 'mild', 'walking_issue': 'no'}
+
+
+@pytest.fixture(autouse=True)
+def fake_prediction(monkeypatch):
+    monkeypatch.setattr(jobs, 'get_combined_prediction', lambda *args: ('Positive', 'Positive', 0.9, 'test'))
+
+
+def orphaned_job(user, tmp_path, attempts=1, status='running'):
+    # A job whose worker died: claimed an hour ago and never finished
+    audio_path = tmp_path / f'orphan_{attempts}.wav'
+    audio_path.write_bytes(b'')
+    job = PredictionJob(user=user, audio_path=str(audio_path), form_data=json.dumps(FORM), status=status,
+                        started_at=datetime.utcnow() - timedelta(hours=1), attempts=attempts)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def test_queue_start_reruns_orphaned_job(app, user, tmp_path):
+    job = orphaned_job(user, tmp_path)
+    app.extensions['prediction_queue'].start()
+
+    db.session.refresh(job)
+    assert job.status == 'done'
+    assert job.attempts == 2
+    assert job.report.model_version == 'test'
+
+
+def test_orphaned_job_fails_after_max_attempts(app, user, tmp_path):
+    job = orphaned_job(user, tmp_path, attempts=app.config['PREDICTION_JOB_MAX_ATTEMPTS'])
+    assert jobs.reclaim_stale_jobs() == []
+
+    db.session.refresh(job)
+    assert job.status == 'failed'
+    assert job.finished_at is not None
+    assert not (tmp_path / f'orphan_{job.attempts}.wav').exists()
+
+
+def test_recent_running_job_is_left_alone(app, user, tmp_path):
+    job = orphaned_job(user, tmp_path)
+    job.started_at = datetime.utcnow()
+    db.session.commit()
+    assert jobs.reclaim_stale_jobs() == []
+    db.session.refresh(job)
+    assert job.status == 'running'
+
+
+def test_queue_start_submits_pending_jobs(app, user, tmp_path):
+    job = orphaned_job(user, tmp_path, attempts=0, status='pending')
+    app.extensions['prediction_queue'].start()
+    db.session.refresh(job)
+    assert job.status == 'done'
+
+
+def finished_jobs(status):
+    return REGISTRY.get_sample_value('parkinson_job_seconds_count', {'status': status}) or 0
+
+
+def test_finished_jobs_observe_end_to_end_latency(app, user, tmp_path):
+    done_before, failed_before = finished_jobs('done'), finished_jobs('failed')
+    orphaned_job(user, tmp_path, attempts=0, status='pending')
+    orphaned_job(user, tmp_path, attempts=app.config['PREDICTION_JOB_MAX_ATTEMPTS'])
+    app.extensions['prediction_queue'].start()
+    assert finished_jobs('done') == done_before + 1
+    assert finished_jobs('failed') == failed_before + 1
+
+
+def test_worker_gauge_is_set_when_the_pool_starts(app):
+    # With ML_PRELOAD the queue is built in the gunicorn master, so only
+    # start() (run in each worker) may count the threads
+    jobs.PREDICTION_WORKERS.set(0)
+    queue = jobs.ThreadPoolQueue(app)
+    assert REGISTRY.get_sample_value('parkinson_prediction_workers') == 0
+    queue.start()
+    try:
+        assert REGISTRY.get_sample_value('parkinson_prediction_workers') == queue.max_workers
+    finally:
+        queue.shutdown()
+
+
+def post_recording(client):
+    with open(WEBM_RECORDING, 'rb') as f:
+        return client.post('/audio_test', data=dict(FORM, recorded_audio_data=(f, 'recording.webm')),
+                           content_type='multipart/form-data')
+
+
+def test_audio_test_runs_a_job_the_status_endpoint_reports(app, client):
+    response = post_recording(client)
+    assert response.headers['Location'].endswith('/dashboard')
+
+    job = PredictionJob.query.one()
+    status = client.get(f'/jobs/{job.id}').get_json()
+    assert status['status'] == 'done'
+    assert status['final_result'] == 'Positive'
+    assert not os.path.exists(job.audio_path)
+
+
+def test_job_status_is_private(app, client, tmp_path):
+    other = User(username='other', email='other@example.com')
+    other.set_password('secret')
+    db.session.add(other)
+    db.session.commit()
+    job = orphaned_job(other, tmp_path, attempts=0, status='pending')
+    assert client.get(f'/jobs/{job.id}').status_code == 404
+
+
+class FullQueue:
+    def submit(self, job_id):
+        raise jobs.QueueFullError('The prediction queue is full.')
+
+
+def test_full_queue_keeps_no_job_or_upload(app, client, tmp_path):
+    app.extensions['prediction_queue'] = FullQueue()
+    response = post_recording(client)
+    assert response.headers['Location'].startswith('/audio_test')
+    assert PredictionJob.query.count() == 0
+    assert os.listdir(tmp_path / UPLOAD_DIR) == []
@@ -0,0 +1,56 @@
+import threading
+from argparse import Namespace
+import pytest
+from werkzeug.serving import make_server
+from app import create_app, jobs
+from tests.conftest import WEBM_RECORDING, TestConfig
+
+pytest.importorskip('requests')
+from benchmarks import load_test
+
+
+@pytest.fixture
+def sink():
+    sink = load_test.TimedSMTPSink(('127.0.0.1', 0)).start()
+    yield sink
+    sink.stop()
+
+
+@pytest.fixture
+def base_url(tmp_path, monkeypatch, sink):
+    # The app served over real HTTP, as gunicorn would, with the models faked
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(jobs, 'get_combined_prediction', lambda *args: ('Positive', 'Positive', 0.9, 'test'))
+
+    class LoadTestConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'load_test.sqlite'}"
+        MAIL_SUPPRESS_SEND = False
+        MAIL_SERVER, MAIL_PORT = sink.server_address
+
+    app = create_app(LoadTestConfig)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    app.extensions['email_outbox'].shutdown()
+
+
+def test_replayed_tests_are_submitted_and_their_results_matched(base_url, sink):
+    users = [load_test.VirtualUser(base_url, f'load{i}') for i in range(2)]
+    for user in users:
+        user.register_and_login()
+    args = Namespace(duration=60, tests=4, rate=0.0, seed=0)
+    records, elapsed_s = load_test.run_load(users, [WEBM_RECORDING], args)
+
+    assert [r['outcome'] for r in records] == ['submitted'] * 4
+    assert load_test.match_results(records, sink, timeout_s=10) == 0
+    summary = load_test.summarize(records, elapsed_s, 0)
+    assert summary['error_rate'] == 0.0
+    assert summary['latency_ms']['result']['count'] == 4
+    assert set(summary['latency_ms']) == set(load_test.STEPS)
+
+
+def test_percentiles():
+    stats = load_test.percentiles([0.001 * i for i in range(1, 101)])
+    assert (stats['count'], stats['p50'], stats['max']) == (100, pytest.approx(50.5), pytest.approx(100.0))
+    assert load_test.percentiles([]) is None
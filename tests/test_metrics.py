@@ -0,0 +1,20 @@
+from app.metrics import count_failure, stage_timer
+
+
+def test_metrics_endpoint_exposes_pipeline_metrics(app, client):
+    with stage_timer('test_stage'):
+        pass
+    count_failure('test_stage')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+    body = response.get_data(as_text=True)
+    assert 'parkinson_stage_seconds_count{stage="test_stage"}' in body
+    assert 'parkinson_failures_total{stage="test_stage"}' in body
+
+
+def test_metrics_token_is_required_when_set(app, client):
+    app.config['METRICS_TOKEN'] = 'secret'
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
@@ -0,0 +1,38 @@
+import sqlite3
+from alembic.script import ScriptDirectory
+from app import create_app, migrate
+from tests.conftest import REPO_DIR, TestConfig
+
+
+def database_config(path):
+    class Config(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{path}'
+    return Config
+
+
+def alembic_revision(path):
+    with sqlite3.connect(path) as connection:
+        return connection.execute('SELECT version_num FROM alembic_version').fetchone()[0]
+
+
+def test_new_database_is_stamped_with_head(tmp_path, monkeypatch):
+    monkeypatch.chdir(REPO_DIR) # flask db finds migrations/ from the working directory
+    app = create_app(database_config(tmp_path / 'new.sqlite'))
+    with app.app_context():
+        head = ScriptDirectory.from_config(migrate.get_config()).get_current_head()
+    app.extensions['email_outbox'].shutdown()
+    assert alembic_revision(tmp_path / 'new.sqlite') == head
+
+
+def test_outdated_database_warns(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(REPO_DIR) # flask db finds migrations/ from the working directory
+    path = tmp_path / 'old.sqlite'
+    app = create_app(database_config(path))
+    app.extensions['email_outbox'].shutdown()
+    with sqlite3.connect(path) as connection:
+        connection.execute("UPDATE alembic_version SET version_num = 'c71d4e9a2f35'")
+    capsys.readouterr()
+
+    app = create_app(database_config(path))
+    app.extensions['email_outbox'].shutdown()
+    assert 'flask db upgrade' in capsys.readouterr().out
@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+import pytest
+from app import ml_logic
+from app.inference import BatchingEngine
+from app.spectrogram import spectrogram_to_tensor
+from tests.conftest import REPO_DIR, WEBM_RECORDING
+
+AUDIO_STACK = ('librosa', 'noisereduce', 'scipy', 'soxr', 'app.audio', 'app.spectrogram', 'app.dsp')
+
+
+def test_building_the_app_does_not_load_the_audio_stack(tmp_path):
+    # What every `flask db ...` command and the gunicorn master pay for
+    script = (
+        "import sys\n"
+        "from app import create_app\n"
+        "create_app()\n"
+        f"print('loaded:', [m for m in {AUDIO_STACK!r} if m in sys.modules])\n"
+    )
+    env = dict(os.environ, PYTHONPATH=REPO_DIR, SECRET_KEY='test',
+               DATABASE_URL=f"sqlite:///{tmp_path / 'app.sqlite'}")
+    result = subprocess.run([sys.executable, '-c', script], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == 'loaded: []'
+
+
+@pytest.mark.parametrize('rule, expected', [('mean', 0.5), ('median', 0.5), ('trimmed', (0.4 + 0.5 + 0.5) / 3)])
+def test_aggregate_window_scores(rule, expected):
+    scores = [0.1, 0.4, 0.5, 0.5, 1.0]
+    assert ml_logic.aggregate_window_scores(scores, rule, 0.2) == pytest.approx(expected)
+
+
+@pytest.fixture
+def long_recording(tmp_path):
+    # The bundled recording played three times over, about 18 s
+    from imageio_ffmpeg import get_ffmpeg_exe
+    path = str(tmp_path / 'long.webm')
+    subprocess.run([get_ffmpeg_exe(), '-v', 'error', '-stream_loop', '2', '-i', WEBM_RECORDING, '-c:a', 'libopus', path],
+                   check=True)
+    return path
+
+
+def test_window_scoring_runs_all_windows_in_one_batch(monkeypatch, long_recording):
+    monkeypatch.setattr(ml_logic, 'AUDIO_SCORING', 'windows')
+    monkeypatch.setattr(ml_logic, 'PREDICTION_CACHE_ENABLED', False)
+    engine = BatchingEngine(lambda batch: batch.mean(axis=(1, 2, 3)), max_wait_ms=1)
+    try:
+        score = ml_logic.predict_audio(long_recording, SimpleNamespace(engine=engine))
+        stats = engine.stats()
+    finally:
+        engine.shutdown()
+
+    pixels = ml_logic.create_window_spectrograms_from_audio(long_recording)
+    assert len(pixels) == 6
+    assert (stats['requests'], stats['samples']) == (1, len(pixels))
+    expected = ml_logic.aggregate_window_scores(spectrogram_to_tensor(pixels).mean(axis=(1, 2, 3)))
+    assert score == pytest.approx(expected, rel=1e-5)
+
+
+def test_model_version_covers_window_settings(monkeypatch):
+    models = ml_logic.ModelSet(None, 'keras', 'model.h5', 'symptoms.joblib')
+    center = ml_logic.model_version(models)
+    monkeypatch.setattr(ml_logic, 'AUDIO_SCORING', 'windows')
+    windows = ml_logic.model_version(models)
+    monkeypatch.setattr(ml_logic, 'WINDOW_AGGREGATE', 'mean')
+    assert len({center, windows, ml_logic.model_version(models)}) == 3
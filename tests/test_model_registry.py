@@ -0,0 +1,101 @@
+import os
+import pytest
+from app import ml_logic
+from app.model_registry import (
+    RegistryError, activate_version, active_version, list_versions, read_manifest, register_version, rollback
+)
+from tests.conftest import REPO_DIR
+
+SYMPTOM_MODEL = os.path.join(REPO_DIR, 'symptom_model.joblib')
+
+
+@pytest.fixture(scope='module')
+def audio_model(tmp_path_factory):
+    # A small Keras model with the app's input shape
+    tf = pytest.importorskip('tensorflow')
+    model = tf.keras.Sequential([
+        tf.keras.layers.Input((224, 224, 1)),
+        tf.keras.layers.Conv2D(2, 3, strides=8, activation='relu'),
+        tf.keras.layers.GlobalAveragePooling2D(),
+        tf.keras.layers.Dense(1, activation='sigmoid'),
+    ])
+    path = str(tmp_path_factory.mktemp('models') / 'audio.h5')
+    model.save(path)
+    return path
+
+
+def test_register_activate_and_roll_back(tmp_path, audio_model):
+    registry = str(tmp_path / 'registry')
+    assert active_version(registry) is None
+    for version in ('v1', 'v2'):
+        registered = register_version(version, audio_model, SYMPTOM_MODEL, note=version, registry_dir=registry)
+        assert registered['backend'] == 'keras'
+        assert os.path.exists(registered['audio_path'])
+        activate_version(version, registry)
+    assert [v['version'] for v in list_versions(registry)] == ['v1', 'v2']
+    assert active_version(registry)['version'] == 'v2'
+
+    assert rollback(registry)['active'] == 'v1'
+    assert read_manifest(registry)['history'] == ['v1']
+    with pytest.raises(RegistryError):
+        rollback(registry)
+
+
+@pytest.mark.parametrize('version, audio_name', [('v1', 'audio.h5'), ('../v2', 'audio.h5'), ('v3', 'audio.bin')])
+def test_bad_registrations_are_refused(tmp_path, audio_model, version, audio_name):
+    registry = str(tmp_path / 'registry')
+    register_version('v1', audio_model, SYMPTOM_MODEL, registry_dir=registry)
+    source = tmp_path / audio_name
+    source.write_bytes(open(audio_model, 'rb').read())
+    with pytest.raises(RegistryError):
+        register_version(version, str(source), SYMPTOM_MODEL, registry_dir=registry)
+    with pytest.raises(RegistryError):
+        activate_version('missing', registry)
+
+
+def test_cli_registers_and_activates(app, audio_model):
+    # The app fixture runs in a temp dir, so the default registry path is too
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['models', 'register', 'v1', '--audio-model', audio_model,
+                                 '--symptom-model', SYMPTOM_MODEL, '--activate'])
+    assert result.exit_code == 0, result.output
+    assert active_version()['version'] == 'v1'
+    result = runner.invoke(args=['models', 'activate', 'v9'])
+    assert result.exit_code != 0
+    assert "not registered" in result.output
+
+
+@pytest.fixture
+def serving(monkeypatch, audio_model):
+    # Isolates the process-wide model state and serves version v1
+    monkeypatch.setattr(ml_logic, '_current', None)
+    monkeypatch.setattr(ml_logic, '_preloaded', None)
+    monkeypatch.setattr(ml_logic, '_draining', set())
+    monkeypatch.setattr(ml_logic, 'audio_model', None)
+    monkeypatch.setattr(ml_logic, 'symptom_model', None)
+    current = ml_logic.ModelSet('v1', 'keras', audio_model, SYMPTOM_MODEL).load()
+    with ml_logic._models_lock:
+        ml_logic._install(current)
+    yield current
+    for models in [ml_logic._current, current]:
+        if models._engine is not None:
+            models._engine.shutdown()
+
+
+def test_swap_lets_running_requests_finish_on_the_old_version(serving, audio_model):
+    replacement = ml_logic.ModelSet('v2', 'keras', audio_model, SYMPTOM_MODEL)
+    with ml_logic.use_models() as models:
+        assert ml_logic.swap_models(replacement)
+        assert ml_logic._current is replacement
+        # The running request still has its models
+        assert models is serving and models.audio_model is not None
+        assert [m['version'] for m in ml_logic.get_model_stats()['draining']] == ['v1']
+    assert serving.audio_model is None
+    assert ml_logic.get_model_stats()['draining'] == []
+
+
+def test_version_that_fails_to_load_is_not_swapped_in(serving, tmp_path):
+    broken = ml_logic.ModelSet('v2', 'keras', str(tmp_path / 'missing.h5'), SYMPTOM_MODEL)
+    assert not ml_logic.swap_models(broken)
+    assert ml_logic._current is serving
+    assert serving.audio_model is not None
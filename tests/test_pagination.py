@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models import Report
+from app.pagination import decode_cursor, encode_cursor, keyset_page
+
+COLUMNS = [Report.timestamp, Report.id]
+
+
+def add_reports(user, count):
+    # Pairs of reports share a timestamp, so only the id breaks the tie
+    start = datetime(2025, 1, 1)
+    for i in range(count):
+        db.session.add(Report(age=60, gender='female', final_result='Negative', author=user,
+                              timestamp=start + timedelta(hours=i // 2)))
+    db.session.commit()
+
+
+def newest_first(user):
+    return Report.query.filter_by(user_id=user.id)
+
+
+def test_pages_forwards_and_back_cover_every_row_once(app, user):
+    add_reports(user, 7)
+    expected = [r.id for r in newest_first(user).order_by(Report.timestamp.desc(), Report.id.desc())]
+
+    pages, cursor = [], None
+    while True:
+        page = keyset_page(newest_first(user), COLUMNS, 3, after=cursor, descending=True)
+        pages.append([r.id for r in page.items])
+        if page.next_cursor is None:
+            break
+        cursor = page.next_cursor
+    assert [i for ids in pages for i in ids] == expected
+    assert [len(ids) for ids in pages] == [3, 3, 1]
+
+    # Back from the last page
+    back = keyset_page(newest_first(user), COLUMNS, 3, before=page.prev_cursor, descending=True)
+    assert [r.id for r in back.items] == pages[1]
+    first = keyset_page(newest_first(user), COLUMNS, 3, before=back.prev_cursor, descending=True)
+    assert [r.id for r in first.items] == pages[0]
+    assert first.prev_cursor is None
+
+
+def test_bad_cursor_starts_from_the_first_page(app, user):
+    add_reports(user, 2)
+    assert decode_cursor('not a cursor', COLUMNS) is None
+    assert decode_cursor(encode_cursor([1]), COLUMNS) is None
+    page = keyset_page(newest_first(user), COLUMNS, 5, after='not a cursor', descending=True)
+    assert len(page.items) == 2
+    assert page.next_cursor is None and page.prev_cursor is None
+
+
+def test_dashboard_follows_cursors(app, user, client):
+    app.config['PAGE_SIZE'] = 2
+    add_reports(user, 3)
+    first = keyset_page(newest_first(user), COLUMNS, 2, descending=True)
+    response = client.get('/dashboard')
+    assert response.status_code == 200
+    assert f'after={first.next_cursor}' in response.get_data(as_text=True)
+    assert client.get(f'/dashboard?after={first.next_cursor}').status_code == 200
+
+
+def test_user_history_is_indexed(app):
+    indexes = {index['name']: index['column_names'] for index in db.inspect(db.engine).get_indexes('report')}
+    assert indexes['ix_report_user_id_timestamp'] == ['user_id', 'timestamp', 'id']
@@ -0,0 +1,69 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.prediction_cache import PredictionCache
+
+
+def test_different_keys_compute_concurrently(tmp_path):
+    cache = PredictionCache(str(tmp_path))
+    uploads = 80
+    # Every compute waits until all of them are running at the same time
+    all_running = threading.Barrier(uploads, timeout=10)
+
+    def compute():
+        all_running.wait()
+        return 0.5
+
+    keys = [cache.make_key(f"{i:064x}", 'v1') for i in range(uploads)]
+    with ThreadPoolExecutor(max_workers=uploads) as executor:
+        results = list(executor.map(lambda key: cache.get_or_compute(key, compute), keys))
+    assert results == [0.5] * uploads
+
+
+def test_concurrent_misses_for_one_key_compute_once(tmp_path):
+    cache = PredictionCache(str(tmp_path))
+    key = cache.make_key('c' * 64, 'v1')
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(timeout=10)
+        return 0.5
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(cache.get_or_compute, key, compute) for _ in range(4)]
+        release.set()
+        assert [f.result() for f in futures] == [0.5] * 4
+    assert len(calls) == 1
+    assert os.listdir(os.path.join(tmp_path, 'locks')) == []
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = PredictionCache(str(tmp_path), max_entries=2)
+    keys = [cache.make_key(f"{i:064x}", 'v1') for i in range(3)]
+    cache.put(keys[0], 0.1)
+    cache.put(keys[1], 0.2)
+    assert cache.get(keys[0]) == 0.1 # Now more recently used than keys[1]
+    cache.put(keys[2], 0.3)
+    assert cache.get(keys[1]) is None
+    assert (cache.get(keys[0]), cache.get(keys[2])) == (0.1, 0.3)
+    stats = cache.stats()
+    assert (stats['entries'], stats['evictions'], stats['hits'], stats['misses']) == (2, 1, 3, 1)
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = PredictionCache(str(tmp_path), ttl_s=-1)
+    key = cache.make_key('e' * 64, 'v1')
+    cache.put(key, 0.5)
+    assert cache.get(key) is None
+    assert cache.get_or_compute(key, lambda: 0.7) == 0.7
+    assert cache.stats()['expirations'] >= 1
+
+
+def test_keys_depend_on_the_model_version(tmp_path):
+    cache = PredictionCache(str(tmp_path))
+    cache.put(cache.make_key('a' * 64, 'v1'), 0.5)
+    assert cache.get(cache.make_key('a' * 64, 'v2')) is None
+    cache.clear()
+    assert cache.stats()['entries'] == 0
@@ -0,0 +1,98 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import numpy as np
+import pytest
+import rescore
+from app import db, ml_logic
+from app.models import PredictionJob, Report
+from app.spectrogram import spectrogram_to_tensor
+from tests.conftest import REPO_DIR, WEBM_RECORDING
+
+pytest.importorskip('imageio_ffmpeg')
+
+OTHER_RECORDING = os.path.join(REPO_DIR, 'debug_files', 'submission_1750135040.388325', '1_original_recording.webm')
+
+
+class MeanPixelModel:
+    # Stands in for the CNN: one deterministic score per input
+    def __init__(self):
+        self.batch_sizes = []
+
+    def predict_batch(self, batch):
+        self.batch_sizes.append(len(batch))
+        return batch.mean(axis=(1, 2, 3))[:, np.newaxis]
+
+
+class FixedSymptomModel:
+    def predict_proba(self, frame):
+        proba = 0.2 + 0.2 * frame['tremor'].to_numpy() + 0.2 * frame['walking_issue'].to_numpy()
+        return np.column_stack([1 - proba, proba])
+
+
+@pytest.fixture
+def models():
+    return SimpleNamespace(audio_model=MeanPixelModel(), symptom_model=FixedSymptomModel(), version='v-test')
+
+
+def score_alone(model, pixels):
+    return model.predict_batch(spectrogram_to_tensor(pixels)).reshape(-1)
+
+
+@pytest.mark.parametrize('scoring', ['center', 'windows'])
+def test_batched_scores_match_scoring_each_recording(monkeypatch, tmp_path, models, scoring):
+    monkeypatch.setattr(ml_logic, 'AUDIO_SCORING', scoring)
+    broken = tmp_path / 'broken.webm'
+    broken.write_bytes(b'not audio')
+    paths = [WEBM_RECORDING, str(broken), OTHER_RECORDING]
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        for batch_paths, probabilities in rescore.score_recordings(models, paths, executor, batch_size=64):
+            results.update(zip(batch_paths, probabilities))
+    # Both recordings went through the model in one call
+    assert len(models.audio_model.batch_sizes) == 1
+
+    for path in (WEBM_RECORDING, OTHER_RECORDING):
+        if scoring == 'windows':
+            expected = ml_logic.aggregate_window_scores(
+                score_alone(models.audio_model, ml_logic.create_window_spectrograms_from_audio(path)))
+        else:
+            expected = score_alone(models.audio_model, ml_logic.create_stft_spectrogram_from_audio(path))[0]
+        assert results[path] == pytest.approx(expected)
+    assert results[str(broken)] is None
+
+
+def test_symptoms_are_parsed_from_report_text():
+    features, how = rescore.parse_symptoms('Tremor: No, Stiffness: Yes, Balance: Yes. Other Notes: None')
+    assert (features, how) == ({'tremor': 0, 'stiffness': 1, 'walking_issue': 1}, 'report')
+    features, how = rescore.parse_symptoms('Shaking hands and trouble walking')
+    assert (features, how) == ({'tremor': 1, 'stiffness': 0, 'walking_issue': 1}, 'keywords')
+
+
+def test_reports_are_rescored_from_their_job_forms(app, user, tmp_path, models):
+    queued = Report(age=70, gender='male', symptoms='unparsable', cnn_prediction=0.9, final_result='Positive', author=user)
+    typed = Report(age=30, gender='female', symptoms='Some tremor', cnn_prediction=0.4, final_result='Negative', author=user)
+    db.session.add_all([queued, typed])
+    db.session.flush()
+    form = {'age': '70', 'gender': 'male', 'tremor': 'no', 'stiffness': 'no', 'balance': 'no'}
+    db.session.add(PredictionJob(user=user, audio_path='gone.webm', form_data=json.dumps(form), status='done',
+                                 report_id=queued.id))
+    db.session.commit()
+
+    output = tmp_path / 'results.csv'
+    writer = rescore.ResultsWriter(str(output))
+    assert rescore.rescore_reports(models, writer, done_keys={f'report:{typed.id}'}) == 1
+    writer.close()
+
+    assert rescore.load_done_keys(str(output)) == {f'report:{queued.id}'}
+    (row,) = rescore.load_reports(set())[:1]
+    assert row['features_from'] == 'form'
+
+
+def test_results_with_other_columns_are_not_appended_to(tmp_path):
+    output = tmp_path / 'results.csv'
+    output.write_text('key,score\n')
+    with pytest.raises(SystemExit):
+        rescore.ResultsWriter(str(output))
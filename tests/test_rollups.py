@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models import DailyReportCount, Report
+from app.rollups import UNKNOWN_RESULT, daily_series, rebuild_rollups, result_totals
+
+
+def report(user, final_result, days_ago=0):
+    return Report(age=60, gender='female', final_result=final_result, author=user,
+                  timestamp=datetime.utcnow() - timedelta(days=days_ago))
+
+
+def rollup_rows():
+    return sorted((row.day, row.final_result, row.count) for row in DailyReportCount.query)
+
+
+def test_counts_follow_inserts_and_deletes(app, user):
+    reports = [report(user, 'Positive'), report(user, 'Positive', days_ago=1), report(user, 'Negative'),
+               report(user, None)]
+    db.session.add_all(reports)
+    db.session.commit()
+    totals = result_totals()
+    assert totals[0] == ('Positive', 2)
+    assert sorted(totals[1:]) == [('Negative', 1), (UNKNOWN_RESULT, 1)]
+
+    db.session.delete(reports[0])
+    db.session.commit()
+    assert sorted(result_totals()) == [('Negative', 1), ('Positive', 1), (UNKNOWN_RESULT, 1)]
+
+    labels, submissions, positives = daily_series(3)
+    assert labels[-1] == datetime.utcnow().date().isoformat()
+    assert (submissions, positives) == ([0, 1, 2], [0, 1, 0])
+
+
+def test_rolled_back_reports_are_not_counted(app, user):
+    db.session.add(report(user, 'Positive'))
+    db.session.flush()
+    db.session.rollback()
+    assert rollup_rows() == []
+
+
+def test_rebuild_matches_incremental_counts(app, user):
+    db.session.add_all([report(user, 'Positive'), report(user, 'Negative', days_ago=2), report(user, None)])
+    db.session.commit()
+    incremental = rollup_rows()
+    DailyReportCount.query.delete()
+    db.session.commit()
+    assert rebuild_rollups() == 3
+    assert rollup_rows() == incremental
+
+
+def test_admin_dashboard_renders_from_rollups(app, user, client):
+    user.is_admin = True
+    db.session.add(report(user, 'Positive'))
+    db.session.commit()
+    # Making the user an admin renews the session's security stamp
+    with client.session_transaction() as session:
+        session['_user_id'] = user.get_id()
+    assert client.get('/admin/dashboard').status_code == 200
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('librosa')
+pytest.importorskip('noisereduce')
+
+from app import spectrogram  # noqa: E402
+
+SAMPLE_RATE = 44100
+
+
+@pytest.fixture
+def signal():
+    # Two seconds of a gliding voiced tone with harmonics over background noise
+    t = np.arange(2 * SAMPLE_RATE) / SAMPLE_RATE
+    f0 = 140 + 20 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    y = sum(0.3 / k * np.sin(k * phase) for k in range(1, 6))
+    y += 0.01 * np.random.default_rng(0).standard_normal(len(t))
+    return y.astype(np.float32)
+
+
+def test_render_parity(signal):
+    pytest.importorskip('matplotlib')
+    Y_db = spectrogram.compute_stft_db(signal, SAMPLE_RATE)
+    difference, ok = spectrogram.check_render_parity(Y_db, SAMPLE_RATE)
+    assert ok, f"mean pixel difference {difference:.4f} exceeds {spectrogram.PARITY_TOLERANCE}"
+
+
+def test_dsp_parity(signal):
+    difference, ok = spectrogram.check_dsp_parity(signal, SAMPLE_RATE)
+    assert ok, f"max dB difference {difference:.4f} exceeds {spectrogram.DSP_PARITY_TOLERANCE_DB}"
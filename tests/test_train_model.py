@@ -0,0 +1,159 @@
+import glob
+import os
+import numpy as np
+import pytest
+
+tf = pytest.importorskip('tensorflow')
+sf = pytest.importorskip('soundfile')
+import train_model
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    # A data/ tree and spectrogram folder of our own; main() would wipe the real one
+    spectrograms = str(tmp_path / 'spectrograms')
+    monkeypatch.setattr(train_model, 'DATA_SOURCE_PATH', str(tmp_path / 'data'))
+    monkeypatch.setattr(train_model, 'SPECTROGRAM_PATH', spectrograms)
+    monkeypatch.setattr(train_model, 'MANIFEST_PATH', os.path.join(spectrograms, 'manifest.json'))
+    for category in ['parkinson', 'healthy']:
+        (tmp_path / 'data' / category).mkdir(parents=True)
+    return tmp_path / 'data'
+
+
+def write_recording(path, seconds=1.0, sr=16000):
+    t = np.arange(int(seconds * sr)) / sr
+    sf.write(str(path), 0.3 * np.sin(2 * np.pi * 220 * t), sr)
+
+
+def images(split, category):
+    directory = os.path.join(train_model.SPECTROGRAM_PATH, split, category)
+    return sorted(os.listdir(directory))
+
+
+def test_failed_recording_leaves_no_images(dataset):
+    write_recording(dataset / 'healthy' / 'voice.wav')
+    assert train_model.process_all_audio_files(workers=1)
+    split = train_model.load_manifest()['files']['healthy/voice.wav']['split']
+    assert len(images(split, 'healthy')) == 1
+
+    # The recording is replaced by one that cannot be decoded
+    (dataset / 'healthy' / 'voice.wav').write_bytes(b'not audio')
+    assert train_model.process_all_audio_files(workers=1)
+    assert images(split, 'healthy') == []
+    assert 'healthy/voice.wav' not in train_model.load_manifest()['files']
+
+
+def test_images_no_recording_owns_are_removed(dataset):
+    write_recording(dataset / 'parkinson' / 'voice.wav')
+    assert train_model.process_all_audio_files(workers=1)
+    stale = os.path.join(train_model.SPECTROGRAM_PATH, 'train', 'parkinson', 'old_aug_0.png')
+    open(stale, 'wb').close()
+
+    assert train_model.process_all_audio_files(workers=1)
+    assert not os.path.exists(stale)
+    outputs = train_model.load_manifest()['files']['parkinson/voice.wav']['outputs']
+    assert all(os.path.exists(path) for path in outputs)
+
+
+def crash_on_marked_files(file_path, outputs):
+    # Runs in a worker process, like a worker killed for memory
+    if 'crash' in os.path.basename(file_path):
+        os._exit(1)
+    for save_path, _, _ in outputs:
+        open(save_path, 'wb').close()
+    return True
+
+
+def test_broken_pool_keeps_finished_recordings(dataset, monkeypatch):
+    monkeypatch.setattr(train_model, '_build_recording', crash_on_marked_files)
+    write_recording(dataset / 'healthy' / 'a_voice.wav')
+    write_recording(dataset / 'healthy' / 'b_crash.wav')
+    assert train_model.process_all_audio_files(workers=1) is False
+    assert list(train_model.load_manifest()['files']) == ['healthy/a_voice.wav']
+
+    # The next run resumes with the recordings that did not finish
+    os.remove(dataset / 'healthy' / 'b_crash.wav')
+    write_recording(dataset / 'healthy' / 'c_voice.wav')
+    assert train_model.process_all_audio_files(workers=1)
+    assert sorted(train_model.load_manifest()['files']) == ['healthy/a_voice.wav', 'healthy/c_voice.wav']
+
+
+@pytest.fixture
+def png_tree(tmp_path):
+    # Spectrogram-sized RGB PNGs in the layout list_images() expects
+    from PIL import Image
+    rng = np.random.default_rng(0)
+    for label, category in enumerate(train_model.CLASS_NAMES):
+        (tmp_path / 'train' / category).mkdir(parents=True)
+        for i in range(3):
+            pixels = rng.integers(0, 256, (310, 930, 3), dtype=np.uint8)
+            Image.fromarray(pixels).save(tmp_path / 'train' / category / f'{label}_{i}.png')
+    return str(tmp_path / 'train')
+
+
+def test_decode_matches_keras_load_img(png_tree):
+    from tensorflow.keras.utils import img_to_array, load_img
+    for path in train_model.list_images(png_tree)[0]:
+        expected = img_to_array(load_img(path, color_mode='grayscale',
+                                         target_size=(train_model.IMG_HEIGHT, train_model.IMG_WIDTH)))
+        np.testing.assert_array_equal(train_model.decode_spectrogram(path).numpy(), expected.astype(np.uint8))
+
+
+def test_image_dataset_serves_every_image_each_epoch(png_tree, tmp_path):
+    paths, labels = train_model.list_images(png_tree)
+    expected = sorted(zip(labels, (int(train_model.decode_spectrogram(p).numpy().sum()) for p in paths)))
+    cache = str(tmp_path / 'cache')
+    dataset, count = train_model.make_image_dataset(png_tree, batch_size=4, shuffle=True, cache=cache)
+    assert count == 6
+    for _ in range(2):
+        seen = []
+        for images, batch_labels in dataset:
+            assert images.dtype == tf.float32 and float(tf.reduce_max(images)) <= 1.0
+            seen += zip(batch_labels.numpy().astype(int), np.round(images.numpy() * 255).sum(axis=(1, 2, 3)).astype(int))
+        assert sorted(seen) == expected
+    # The file cache is named after the directory it was built from
+    assert glob.glob(cache + '_train.*')
+
+
+def test_augmentation_keeps_shape_and_range():
+    tf.random.set_seed(0)
+    images = tf.constant(np.random.default_rng(0).random((4, 64, 96, 1), dtype=np.float32))
+    augmented = train_model.augment_spectrograms(images).numpy()
+    assert augmented.shape == images.shape
+    assert 0.0 <= augmented.min() and augmented.max() <= 1.0
+    # Every image of the batch gets its own transformation
+    assert not np.allclose(augmented - images.numpy(), (augmented - images.numpy())[:1])
+
+
+def test_augmentation_fills_with_the_quietest_level():
+    # Shifted-in, warped and masked pixels of a flat image keep its level; only the noise remains
+    tf.random.set_seed(0)
+    images = tf.fill([8, 64, 96, 1], 0.6)
+    augmented = train_model.augment_spectrograms(images).numpy()
+    assert np.abs(augmented - 0.6).max() < 6 * train_model.NOISE_MAX_STD
+
+
+def test_training_recordings_get_one_clean_image():
+    outputs = train_model.plan_outputs('healthy', 'voice.wav', 'train', 'a' * 64)
+    assert [(os.path.basename(path), augment, seed) for path, augment, seed in outputs] == \
+        [('voice_aug_0.png', False, None)]
+
+
+def test_compact_variants_are_much_smaller():
+    sizes = {name: train_model.build_cnn_model(name).count_params() for name in train_model.ARCHITECTURES}
+    assert sizes['baseline'] > 20_000_000
+    assert sizes['gap'] < sizes['baseline'] / 50
+    assert sizes['compact'] < sizes['gap']
+    model = train_model.build_cnn_model('compact')
+    assert model.output_shape == (None, 1)
+    assert train_model.model_save_path('compact', pruned=True) == 'parkinson_cnn_model_stft_grayscale_compact_pruned.h5'
+    assert train_model.model_save_path('baseline') == train_model.MODEL_SAVE_PATH
+
+
+def test_pruning_zeroes_the_requested_fraction():
+    tf.keras.utils.set_random_seed(0)
+    model = train_model.build_cnn_model('gap')
+    images = np.random.default_rng(0).random((4, train_model.IMG_HEIGHT, train_model.IMG_WIDTH, 1), dtype=np.float32)
+    model.fit(images, np.array([0, 1, 0, 1], dtype=np.float32), epochs=2, verbose=0,
+              callbacks=[train_model.MagnitudePruning(0.5, ramp_epochs=2)])
+    assert train_model.model_sparsity(model) == pytest.approx(0.5, abs=0.01)
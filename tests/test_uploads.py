@@ -0,0 +1,86 @@
+import os
+import shutil
+import subprocess
+import time
+import pytest
+from app import audio
+from app.uploads import UPLOAD_DIR, sweep_stale_uploads
+from tests.conftest import WEBM_RECORDING
+
+pytest.importorskip('imageio_ffmpeg')
+
+FORM = {'age': '64', 'gender': 'female', 'tremor': 'resting', 'stiffness': 'mild', 'walking_issue': 'no'}
+
+
+class RecordingQueue:
+    def __init__(self):
+        self.job_ids = []
+
+    def submit(self, job_id):
+        self.job_ids.append(job_id)
+
+
+def test_webm_upload_without_pyav(app, client, monkeypatch):
+    monkeypatch.setattr(audio, 'av', None)
+    queue = app.extensions['prediction_queue'] = RecordingQueue()
+
+    with open(WEBM_RECORDING, 'rb') as f:
+        response = client.post('/audio_test', data=dict(FORM, recorded_audio_data=(f, 'recording.webm')),
+                               content_type='multipart/form-data')
+
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/dashboard')
+    assert len(queue.job_ids) == 1
+
+
+def test_read_head_without_pyav_reports_short_length(monkeypatch):
+    monkeypatch.setattr(audio, 'av', None)
+    with open(WEBM_RECORDING, 'rb') as f:
+        y, sr, n_samples = audio.read_head(f, True, 600)
+    assert sr == audio.DECODE_SAMPLE_RATE
+    assert n_samples == len(y) > sr
+
+
+def test_sweep_keeps_tracked_and_recent_files(app, tmp_path):
+    if shutil.which('git') is None:
+        pytest.skip('git is not installed')
+
+    upload_dir = tmp_path / UPLOAD_DIR
+    for name in ('tracked.webm', 'stale.webm', 'recent.webm'):
+        (upload_dir / name).write_bytes(b'')
+    day_ago = time.time() - 2 * 24 * 3600
+    for name in ('tracked.webm', 'stale.webm'):
+        os.utime(upload_dir / name, (day_ago, day_ago))
+    subprocess.run(['git', 'init', '-q'], cwd=tmp_path, check=True)
+    subprocess.run(['git', 'add', os.path.join(UPLOAD_DIR, 'tracked.webm')], cwd=tmp_path, check=True)
+
+    assert sweep_stale_uploads() == 1
+    assert sorted(os.listdir(upload_dir)) == ['recent.webm', 'tracked.webm']
+
+
+def test_webm_upload_head_is_piped_from_memory(monkeypatch):
+    from app.uploads import UploadBuffer
+
+    def no_temporary_files(*args, **kwargs):
+        raise AssertionError('the upload was written to disk')
+    monkeypatch.setattr(audio, 'av', None)
+    monkeypatch.setattr(audio.tempfile, 'NamedTemporaryFile', no_temporary_files)
+
+    buffer = UploadBuffer(max_memory=4 * 1024 * 1024, max_bytes=20 * 1024 * 1024)
+    with open(WEBM_RECORDING, 'rb') as f:
+        buffer.write(f.read())
+    buffer.seek(0)
+    y, sr, _ = audio.read_head(buffer, True, 2)
+    assert len(y) == 2 * sr
+    assert not buffer._rolled
+
+
+def test_m4a_upload_head_without_pyav(monkeypatch, tmp_path):
+    from imageio_ffmpeg import get_ffmpeg_exe
+    m4a_path = tmp_path / 'recording.m4a'
+    subprocess.run([get_ffmpeg_exe(), '-v', 'error', '-i', WEBM_RECORDING, '-t', '3', '-c:a', 'aac', str(m4a_path)],
+                   check=True)
+    monkeypatch.setattr(audio, 'av', None)
+    with open(m4a_path, 'rb') as f:
+        y, sr, n_samples = audio.read_head(f, True, 10)
+    assert n_samples == len(y) == pytest.approx(3 * sr, rel=0.02)
@@ -0,0 +1,80 @@
+import pytest
+from app import create_app, db
+from app.models import User, load_user
+from tests.conftest import TestConfig
+
+
+@pytest.fixture
+def workers(tmp_path, monkeypatch):
+    # Two apps on one database file stand in for two gunicorn workers,
+    # each with its own user cache
+    monkeypatch.chdir(tmp_path)
+
+    class Config(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'app.sqlite'}"
+        USER_CACHE_TTL_S = 60
+
+    apps = [create_app(Config), create_app(Config)]
+    with apps[0].app_context():
+        user = User(username='admin', email='admin@example.com', is_admin=True)
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+        session_id = user.get_id()
+    yield apps, session_id
+    for app in apps:
+        app.extensions['email_outbox'].shutdown()
+
+
+def load(app, session_id):
+    with app.app_context():
+        user = load_user(session_id)
+        return None if user is None else (user.username, user.is_admin)
+
+
+def test_cache_hit_skips_reloading_the_user(workers):
+    (app, _), session_id = workers
+    assert load(app, session_id) == ('admin', True)
+    assert load(app, session_id) == ('admin', True)
+    stats = app.extensions['user_cache'].stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+
+def test_admin_change_in_another_worker_ends_cached_session(workers):
+    (first, second), session_id = workers
+    assert load(first, session_id) == ('admin', True) # Now cached in the first worker
+
+    with second.app_context():
+        user = db.session.get(User, int(session_id.split(':')[0]))
+        user.is_admin = False
+        db.session.commit()
+        new_session_id = user.get_id()
+
+    assert load(first, session_id) is None
+    assert load(first, new_session_id) == ('admin', False)
+
+
+def test_password_change_in_another_worker_ends_cached_session(workers):
+    (first, second), session_id = workers
+    assert load(first, session_id) is not None
+
+    with second.app_context():
+        user = db.session.get(User, int(session_id.split(':')[0]))
+        user.set_password('changed')
+        db.session.commit()
+
+    assert load(first, session_id) is None
+
+
+def test_other_changes_keep_the_session(workers):
+    (first, second), session_id = workers
+    with second.app_context():
+        user = db.session.get(User, int(session_id.split(':')[0]))
+        user.email = 'renamed@example.com'
+        db.session.commit()
+    assert load(first, session_id) == ('admin', True)
+
+
+def test_session_from_before_stamps_is_rejected(workers):
+    (app, _), session_id = workers
+    assert load(app, session_id.split(':')[0]) is None
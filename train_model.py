@@ -1,17 +1,30 @@
 import os
+import argparse
+import glob
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 import numpy as np
 import librosa
 import librosa.display
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-import noisereduce as nr
-import random
 import shutil
 
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
+import tensorflow as tf
 from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Conv2D, MaxPooling2D, Flatten, Dense, Dropout, BatchNormalization
-from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau, ModelCheckpoint
+from tensorflow.keras.layers import (
+    Conv2D, SeparableConv2D, MaxPooling2D, Flatten, GlobalAveragePooling2D, Dense, Dropout, BatchNormalization
+)
+from tensorflow.keras.callbacks import Callback, EarlyStopping, ReduceLROnPlateau, ModelCheckpoint
 from tensorflow.keras.optimizers import Adam
+from tensorflow.keras.utils import Sequence
+
+from app.audio import DECODE_SAMPLE_RATE, load_audio_window
+from app.spectrogram import compute_stft_db as denoised_stft_db, render_spectrogram
+from feature_store import FeatureStore, FeatureStoreWriter
 
 
 DATA_SOURCE_PATH = 'data'
@@ -20,43 +33,83 @@ MODEL_SAVE_PATH = 'parkinson_cnn_model_stft_grayscale.h5'
 IMG_HEIGHT, IMG_WIDTH = 224, 224
 BATCH_SIZE = 32
 TARGET_DURATION_S = 5
+N_FFT = 1024
+HOP_LENGTH = 256
+
+# Dataset build: each training file gets AUGMENTED_COPIES images (_aug_0 is
+# the clean one, the rest go through augment_audio). Training augments the
+# spectrograms on the fly instead (see augment_spectrograms), so only the
+# clean image is built by default. The split and augmentation seeds derive
+# from SPLIT_SEED so incremental rebuilds stay consistent.
+MANIFEST_PATH = os.path.join(SPECTROGRAM_PATH, 'manifest.json')
+FEATURE_STORE_PATH = 'features_stft_5s_grayscale'
+FEATURE_SHUFFLE_BUFFER = 256
+AUGMENTED_COPIES = 1
+TRAIN_FRACTION = 0.8
+SPLIT_SEED = 42
+
+# Training input: PNGs are decoded in parallel and cached after the first
+# epoch, in memory ('') or in files under a path prefix ('none' disables it).
+# Thread counts of 0 let TensorFlow use every core.
+CLASS_NAMES = ['healthy', 'parkinson'] # Same class indices as flow_from_directory
+TRAIN_CACHE = os.environ.get('TRAIN_CACHE', '')
+TRAIN_SHUFFLE_BUFFER = 1024
+TRAIN_INTRA_OP_THREADS = int(os.environ.get('TRAIN_INTRA_OP_THREADS') or 0)
+TRAIN_INTER_OP_THREADS = int(os.environ.get('TRAIN_INTER_OP_THREADS') or 0)
+
+# Model variants: (convolutions, head). 'baseline' is the original model,
+# whose Flatten -> Dense(256) layer holds ~25M of its ~26M parameters.
+# 'gap' swaps that for global average pooling; 'compact' also uses
+# depthwise-separable convolutions and a fourth block. Variants other than
+# the baseline save next to MODEL_SAVE_PATH with the name as a suffix.
+ARCHITECTURES = {
+    'baseline': ('standard', 'flatten'),
+    'gap': ('standard', 'gap'),
+    'compact': ('separable', 'gap'),
+}
+PRUNE_FINE_TUNE_EPOCHS = 10
+
+# Spectrogram augmentation, drawn afresh for every batch. Rows are frequency
+# (top = highest) on specshow's log axis, about 2 rows per semitone above
+# 65 Hz, so a vertical shift approximates a pitch shift. Columns are time.
+FREQ_SHIFT_MAX_ROWS = 4 # About +-2 semitones, like augment_audio's pitch shift
+TIME_WARP_MAX_COLS = 16 # Moves one point of the time axis by up to ~7%
+FREQ_MASK_MAX_ROWS = 24
+TIME_MASK_MAX_COLS = 32
+NOISE_MAX_STD = 0.02 # On the [0, 1] pixel scale
 
 # Data Augmentation 
-def augment_audio(y, sr):
+def augment_audio(y, sr, rng=None):
+    rng = rng if rng is not None else np.random.default_rng()
     y_aug = y.copy()
-    pitch_steps = random.uniform(-2, 2)
+    pitch_steps = rng.uniform(-2, 2)
     y_aug = librosa.effects.pitch_shift(y_aug, sr=sr, n_steps=pitch_steps)
-    stretch_rate = random.uniform(0.9, 1.1)
+    stretch_rate = rng.uniform(0.9, 1.1)
     y_aug = librosa.effects.time_stretch(y_aug, rate=stretch_rate)
-    noise_amp = 0.005 * np.random.uniform() * np.amax(y)
-    y_aug = y_aug + noise_amp * np.random.normal(size=len(y_aug))
+    noise_amp = 0.005 * rng.uniform() * np.amax(y)
+    y_aug = y_aug + noise_amp * rng.normal(size=len(y_aug))
     return y_aug
 
 # Spectrogram Creation 
-def create_stft_spectrogram(audio_file, save_path, augment=False):
+def compute_stft_db(audio_file, augment=False, seed=None):
     """
-    Creates a high-quality GRAYSCALE spectrogram from a standardized 5s audio segment.
+    Computes the dB-scaled STFT of a standardized 5s audio segment.
+    `seed` makes the augmentation reproducible.
     """
-    try:
-        y, sr = librosa.load(audio_file, sr=None)
-        
-        target_samples = TARGET_DURATION_S * sr
-        
-        if len(y) > target_samples:
-            start_index = int((len(y) - target_samples) / 2)
-            y_segment = y[start_index : start_index + target_samples]
-        else:
-            y_segment = librosa.util.pad_center(y, size=target_samples)
+    y_segment, sr = load_audio_window(audio_file, TARGET_DURATION_S)
 
-        if augment:
-            y_segment = augment_audio(y_segment, sr)
+    if augment:
+        y_segment = augment_audio(y_segment, sr, np.random.default_rng(seed))
 
-        y_reduced = nr.reduce_noise(y=y_segment, sr=sr)
-        
-        N_FFT = 1024
-        HOP_LENGTH = 256
-        S_audio = librosa.stft(y_reduced, n_fft=N_FFT, hop_length=HOP_LENGTH)
-        Y_db = librosa.amplitude_to_db(np.abs(S_audio), ref=np.max)
+    return denoised_stft_db(y_segment, sr), sr
+
+def create_stft_spectrogram(audio_file, save_path, augment=False, seed=None):
+    """
+    Creates a high-quality GRAYSCALE spectrogram from a standardized 5s audio segment.
+    `seed` makes the augmentation reproducible.
+    """
+    try:
+        Y_db, sr = compute_stft_db(audio_file, augment=augment, seed=seed)
 
         plt.figure(figsize=(12, 4))
         
@@ -71,104 +124,538 @@ def create_stft_spectrogram(audio_file, save_path, augment=False):
         return False
 
 #Data Preparation 
-def process_all_audio_files():
-    if os.path.exists(SPECTROGRAM_PATH):
-        shutil.rmtree(SPECTROGRAM_PATH)
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_parameters():
+    """Everything that changes the generated images; a change forces a full rebuild."""
+    return {
+        'target_duration_s': TARGET_DURATION_S,
+        'sample_rate': DECODE_SAMPLE_RATE,
+        'n_fft': N_FFT,
+        'hop_length': HOP_LENGTH,
+        'augmented_copies': AUGMENTED_COPIES,
+        'train_fraction': TRAIN_FRACTION,
+        'split_seed': SPLIT_SEED,
+    }
+
+
+def assign_split(category, filename):
+    """
+    Deterministically assigns a recording to 'train' or 'validation'. Hashing
+    the name (rather than shuffling the listing) keeps existing assignments
+    stable when recordings are added or removed.
+    """
+    digest = hashlib.sha256(f"{SPLIT_SEED}:{category}/{filename}".encode()).digest()
+    return 'train' if int.from_bytes(digest[:8], 'big') / 2**64 < TRAIN_FRACTION else 'validation'
+
+
+def augmentation_seed(content_hash, index):
+    return int(hashlib.sha256(f"{SPLIT_SEED}:{content_hash}:{index}".encode()).hexdigest()[:8], 16)
+
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return None
+    with open(MANIFEST_PATH) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest):
+    temp_path = MANIFEST_PATH + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(temp_path, MANIFEST_PATH)
+
+
+def plan_outputs(category, filename, split, content_hash):
+    """Returns the (save_path, augment, seed) images to build for one recording."""
+    base_name = os.path.splitext(filename)[0]
+    if split == 'validation':
+        return [(os.path.join(SPECTROGRAM_PATH, 'validation', category, f"{base_name}.png"), False, None)]
+    return [
+        (os.path.join(SPECTROGRAM_PATH, 'train', category, f"{base_name}_aug_{i}.png"), i > 0,
+         augmentation_seed(content_hash, i) if i > 0 else None)
+        for i in range(AUGMENTED_COPIES)
+    ]
+
+
+def _build_recording(file_path, outputs):
+    # Runs in a worker process
+    return all(create_stft_spectrogram(file_path, save_path, augment=augment, seed=seed)
+               for save_path, augment, seed in outputs)
+
+
+def _remove_outputs(paths):
+    for path in paths:
+        if os.path.exists(path): os.remove(path)
+
+
+def _remove_unlisted_images(entries):
+    """Deletes images in the split folders that no manifest entry lists, e.g. left over by older runs."""
+    listed = {path for entry in entries.values() for path in entry['outputs']}
+    for split in ['train', 'validation']:
+        for category in ['parkinson', 'healthy']:
+            for path in glob.glob(os.path.join(SPECTROGRAM_PATH, split, category, '*.png')):
+                if path not in listed:
+                    os.remove(path)
+                    print(f"  - Removed stale image {path}")
+
+
+def process_all_audio_files(workers=None, rebuild=False):
+    """
+    Builds the spectrogram dataset in parallel and incrementally: only
+    recordings that are new or whose content changed since the last build
+    (according to the manifest) are processed; images of deleted or failed
+    recordings are removed. Returns False if the worker pool broke (e.g. a
+    worker was killed for memory); the manifest keeps the recordings that
+    finished, so the next run resumes from there.
+    """
+    parameters = build_parameters()
+    manifest = None if rebuild else load_manifest()
+    if manifest is None or manifest.get('parameters') != parameters:
+        if os.path.exists(SPECTROGRAM_PATH):
+            shutil.rmtree(SPECTROGRAM_PATH)
+        manifest = {'parameters': parameters, 'files': {}}
     print(f"Starting audio to Grayscale STFT Spectrogram conversion ({TARGET_DURATION_S}s)...")
     for split in ['train', 'validation']:
         for category in ['parkinson', 'healthy']:
             os.makedirs(os.path.join(SPECTROGRAM_PATH, split, category), exist_ok=True)
+
+    entries = manifest['files']
+    seen, tasks = set(), []
     for category in ['parkinson', 'healthy']:
         source_dir = os.path.join(DATA_SOURCE_PATH, category)
-        all_files = [f for f in os.listdir(source_dir) if f.lower().endswith(('.wav', '.mp3'))]
-        if not all_files: continue
-        random.shuffle(all_files)
-        split_index = int(len(all_files) * 0.8)
-        train_files, validation_files = all_files[:split_index], all_files[split_index:]
-        print(f"--- Processing Category: {category} ---")
-        for filename in train_files:
-            file_path = os.path.join(source_dir, filename)
-            base_name = os.path.splitext(filename)[0]
-            for i in range(3):
-                save_path = os.path.join(SPECTROGRAM_PATH, 'train', category, f"{base_name}_aug_{i}.png")
-                create_stft_spectrogram(file_path, save_path, augment=(i > 0))
-        for filename in validation_files:
+        if not os.path.isdir(source_dir): continue
+        all_files = sorted(f for f in os.listdir(source_dir) if f.lower().endswith(('.wav', '.mp3')))
+        for filename in all_files:
+            key = f"{category}/{filename}"
+            seen.add(key)
             file_path = os.path.join(source_dir, filename)
-            base_name = os.path.splitext(filename)[0]
-            save_path = os.path.join(SPECTROGRAM_PATH, 'validation', category, f"{base_name}.png")
-            create_stft_spectrogram(file_path, save_path, augment=False)
+            content_hash = file_sha256(file_path)
+            entry = entries.get(key)
+            if entry and entry['sha256'] == content_hash and all(os.path.exists(p) for p in entry['outputs']):
+                continue
+            split = entry['split'] if entry else assign_split(category, filename)
+            outputs = plan_outputs(category, filename, split, content_hash)
+            tasks.append((key, file_path, content_hash, split, outputs))
+
+    # Drop images of recordings that no longer exist
+    for key in sorted(set(entries) - seen):
+        _remove_outputs(entries.pop(key)['outputs'])
+        print(f"  - Removed images for deleted recording {key}")
+
+    print(f"{len(seen) - len(tasks)} recording(s) up to date, {len(tasks)} to process.")
+    workers = workers or os.cpu_count() or 1
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_build_recording, file_path, outputs): (key, content_hash, split, outputs)
+                       for key, file_path, content_hash, split, outputs in tasks}
+            for done, future in enumerate(as_completed(futures), start=1):
+                key, content_hash, split, outputs = futures[future]
+                if future.result():
+                    entries[key] = {
+                        'sha256': content_hash,
+                        'split': split,
+                        'outputs': [save_path for save_path, _, _ in outputs],
+                        'augmentation_seeds': [seed for _, _, seed in outputs],
+                    }
+                else:
+                    # Keep no partial or outdated images of a recording that failed
+                    _remove_outputs([save_path for save_path, _, _ in outputs])
+                    _remove_outputs(entries.pop(key, {'outputs': []})['outputs'])
+                if done % 25 == 0:
+                    save_manifest(manifest)
+                    print(f"  - {done}/{len(tasks)} recordings processed")
+    except BrokenProcessPool as e:
+        save_manifest(manifest)
+        print(f"Spectrogram generation stopped: {e}. Run it again to resume.")
+        return False
+    _remove_unlisted_images(entries)
+    save_manifest(manifest)
     print("Spectrogram generation complete.")
+    return True
+
 
+# Feature Store 
+def _featurize_recording(file_path, outputs):
+    # Runs in a worker process; renders the model-input image in memory
+    features = []
+    for _, augment, seed in outputs:
+        try:
+            Y_db, sr = compute_stft_db(file_path, augment=augment, seed=seed)
+            features.append(render_spectrogram(Y_db, sr, size=(IMG_HEIGHT, IMG_WIDTH))[:, :, np.newaxis])
+        except Exception as e:
+            print(f"      - Error processing {file_path}: {e}")
+            features.append(None)
+    return features
 
-def train_cnn_model():
+
+def build_feature_store(workers=None):
     """
-    Trains a CNN model optimized for grayscale spectrograms.
+    Writes the dataset into a memory-mapped feature store instead of a PNG
+    tree: each row is the uint8 224x224x1 image the model sees (identical to
+    a PNG loaded with load_img), with source file, augmentation index/seed,
+    split and label in the index.
     """
-    if not os.path.exists(SPECTROGRAM_PATH):
-        print("Spectrograms not found.")
-        return
+    print(f"Building feature store at {FEATURE_STORE_PATH} ({TARGET_DURATION_S}s)...")
+    tasks = []
+    for label, category in enumerate(['healthy', 'parkinson']): # Same class indices as flow_from_directory
+        source_dir = os.path.join(DATA_SOURCE_PATH, category)
+        if not os.path.isdir(source_dir): continue
+        for filename in sorted(os.listdir(source_dir)):
+            if not filename.lower().endswith(('.wav', '.mp3')): continue
+            file_path = os.path.join(source_dir, filename)
+            content_hash = file_sha256(file_path)
+            split = assign_split(category, filename)
+            tasks.append((f"{category}/{filename}", file_path, content_hash, split, label,
+                          plan_outputs(category, filename, split, content_hash)))
 
-    train_datagen = ImageDataGenerator(rescale=1./255)
-    validation_datagen = ImageDataGenerator(rescale=1./255)
+    # Recordings are visited in a seeded random order and rows pass through a
+    # shuffle buffer, so augmented copies of one recording are spread out.
+    rng = np.random.default_rng(SPLIT_SEED)
+    tasks = [tasks[i] for i in rng.permutation(len(tasks))]
+    writer = FeatureStoreWriter(FEATURE_STORE_PATH, (IMG_HEIGHT, IMG_WIDTH, 1), dtype='uint8',
+                                feature='image', parameters=build_parameters())
+    shuffle_buffer = []
 
-   
-    train_generator = train_datagen.flow_from_directory(
-        os.path.join(SPECTROGRAM_PATH, 'train'),
-        target_size=(IMG_HEIGHT, IMG_WIDTH),
-        batch_size=BATCH_SIZE,
-        class_mode='binary',
-        color_mode='grayscale' # Tells Keras to load images with 1 channel
-    )
-    validation_generator = validation_datagen.flow_from_directory(
-        os.path.join(SPECTROGRAM_PATH, 'validation'),
-        target_size=(IMG_HEIGHT, IMG_WIDTH),
-        batch_size=BATCH_SIZE,
-        class_mode='binary',
-        color_mode='grayscale'
-    )
+    def drain(keep):
+        while len(shuffle_buffer) > keep:
+            split, feature, label, metadata = shuffle_buffer.pop(int(rng.integers(len(shuffle_buffer))))
+            writer.add(split, feature, label, **metadata)
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(_featurize_recording, [task[1] for task in tasks], [task[5] for task in tasks])
+        for (key, _, content_hash, split, label, outputs), features in zip(tasks, results):
+            for index, ((_, _, seed), feature) in enumerate(zip(outputs, features)):
+                if feature is None: continue
+                metadata = {'source': key, 'sha256': content_hash,
+                            'augmentation_index': index if split == 'train' else None, 'augmentation_seed': seed}
+                shuffle_buffer.append((split, feature, label, metadata))
+            drain(FEATURE_SHUFFLE_BUFFER)
+    drain(0)
+    writer.close()
+    store = FeatureStore(FEATURE_STORE_PATH)
+    print(f"Feature store complete: {store.count('train')} train / {store.count('validation')} validation rows.")
 
-    if not train_generator.samples > 0:
-        print("Error: No training images were generated.")
-        return
-        
 
-    model = Sequential([
+class FeatureStoreSequence(Sequence):
+    """
+    Feeds Keras straight from the store's memory maps, scaled to [0, 1] like
+    rescale=1./255 and optionally passed through augment_spectrograms.
+    """
+    def __init__(self, store, split, batch_size, shuffle=False, augment=False):
+        self.store = store
+        self.augment = augment
+        self.slices = store.batch_slices(split, batch_size)
+        self.samples = store.count(split)
+        self.shuffle = shuffle
+        self.order = np.arange(len(self.slices))
+        self.on_epoch_end()
+
+    def __len__(self):
+        return len(self.slices)
+
+    def __getitem__(self, index):
+        number, start, stop = self.slices[self.order[index]]
+        features, labels = self.store.shard(number)
+        batch = features[start:stop].astype(np.float32) / 255.0
+        if self.augment:
+            batch = augment_spectrograms(tf.constant(batch)).numpy()
+        return batch, labels[start:stop].astype(np.float32)
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            np.random.shuffle(self.order)
+
+
+# Spectrogram Augmentation 
+def _gather_shifted(images, index, axis, fill):
+    """Gathers rows or columns per image; indices outside the image read `fill`."""
+    size = tf.shape(images)[axis]
+    inside = (index >= 0) & (index < size)
+    gathered = tf.gather(images, tf.clip_by_value(index, 0, size - 1), axis=axis, batch_dims=1)
+    inside = tf.reshape(inside, [-1, size, 1, 1] if axis == 1 else [-1, 1, size, 1])
+    return tf.where(inside, gathered, fill)
+
+
+def _band_mask(batch, size, max_width, axis):
+    # One band of random width and position per image along the given axis
+    width = tf.random.uniform([batch, 1], 0, max_width + 1, dtype=tf.int32)
+    start = tf.cast(tf.random.uniform([batch, 1]) * tf.cast(size - width + 1, tf.float32), tf.int32)
+    position = tf.range(size)[tf.newaxis, :]
+    band = (position >= start) & (position < start + width)
+    return tf.reshape(band, [batch, size, 1, 1] if axis == 1 else [batch, 1, size, 1])
+
+
+def augment_spectrograms(images):
+    """
+    Randomly shifts in frequency, warps in time, masks one frequency band and
+    one time span, and adds noise, independently for each image of a
+    (batch, height, width, 1) float batch in [0, 1]. Shifted-in and masked
+    pixels take the image's quietest (lightest) level.
+    """
+    shape = tf.shape(images)
+    batch, height, width = shape[0], shape[1], shape[2]
+    quiet = tf.reduce_max(images, axis=[1, 2, 3], keepdims=True)
+
+    # Frequency shift: a whole number of rows up or down
+    shift = tf.random.uniform([batch, 1], -FREQ_SHIFT_MAX_ROWS, FREQ_SHIFT_MAX_ROWS + 1, dtype=tf.int32)
+    images = _gather_shifted(images, tf.range(height)[tf.newaxis, :] - shift, 1, quiet)
+
+    # Time warp: move an anchor column and stretch the time axis linearly on either side of it
+    w = tf.cast(width - 1, tf.float32)
+    anchor = tf.random.uniform([batch, 1], 0.25, 0.75) * w
+    moved = anchor + tf.random.uniform([batch, 1], -TIME_WARP_MAX_COLS, TIME_WARP_MAX_COLS)
+    x = tf.cast(tf.range(width), tf.float32)[tf.newaxis, :]
+    source = tf.where(x < moved, x * anchor / moved, anchor + (x - moved) * (w - anchor) / (w - moved))
+    images = tf.gather(images, tf.cast(tf.round(source), tf.int32), axis=2, batch_dims=1)
+
+    # Masks, then noise
+    images = tf.where(_band_mask(batch, height, FREQ_MASK_MAX_ROWS, 1), quiet, images)
+    images = tf.where(_band_mask(batch, width, TIME_MASK_MAX_COLS, 2), quiet, images)
+    noise_std = tf.random.uniform([batch, 1, 1, 1], 0, NOISE_MAX_STD)
+    images = images + noise_std * tf.random.normal(shape)
+    return tf.clip_by_value(images, 0.0, 1.0)
+
+
+# tf.data Input Pipeline 
+def configure_threads(intra_op=TRAIN_INTRA_OP_THREADS, inter_op=TRAIN_INTER_OP_THREADS):
+    """Sizes TensorFlow's thread pools; must run before the first TensorFlow op."""
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+
+
+def list_images(directory):
+    """Returns the PNG paths under directory/<class>/ and their class indices."""
+    paths, labels = [], []
+    for label, category in enumerate(CLASS_NAMES):
+        class_dir = os.path.join(directory, category)
+        if not os.path.isdir(class_dir): continue
+        for filename in sorted(os.listdir(class_dir)):
+            if filename.lower().endswith('.png'):
+                paths.append(os.path.join(class_dir, filename))
+                labels.append(label)
+    return paths, labels
+
+
+def decode_spectrogram(path):
+    """
+    Reads a spectrogram PNG as the uint8 224x224x1 image that
+    load_img(color_mode='grayscale') gives for the same file.
+    """
+    rgb = tf.io.decode_png(tf.io.read_file(path), channels=3)
+    # Nearest-neighbour resizing only picks pixels, so it can run before the
+    # grayscale conversion and leave 5x fewer pixels to convert
+    rgb = tf.cast(tf.image.resize(rgb, (IMG_HEIGHT, IMG_WIDTH), method='nearest'), tf.int32)
+    # PIL's RGB to 'L' conversion, in integer arithmetic like PIL
+    gray = tf.bitwise.right_shift(rgb[..., 0] * 19595 + rgb[..., 1] * 38470 + rgb[..., 2] * 7471 + 0x8000, 16)
+    return tf.cast(gray[..., tf.newaxis], tf.uint8)
+
+
+def make_image_dataset(directory, batch_size, shuffle=False, augment=False, cache=TRAIN_CACHE):
+    """
+    Returns (dataset, sample count) of (image, label) batches scaled to
+    [0, 1] like rescale=1./255. Decoding runs on parallel threads and
+    prefetching overlaps it with training. Images are cached as uint8 after
+    the first pass, so later epochs skip decoding; `augment` then applies
+    augment_spectrograms to every batch, after the cache.
+    """
+    paths, labels = list_images(directory)
+    if shuffle:
+        # Mix the classes once up front so the shuffle buffer need not hold the whole set
+        order = np.random.default_rng(SPLIT_SEED).permutation(len(paths))
+        paths, labels = [paths[i] for i in order], [labels[i] for i in order]
+    dataset = tf.data.Dataset.from_tensor_slices((paths, np.asarray(labels, dtype=np.float32)))
+    dataset = dataset.map(lambda path, label: (decode_spectrogram(path), label),
+                          num_parallel_calls=tf.data.AUTOTUNE)
+    if cache != 'none':
+        if cache:
+            # A file cache is only valid for the images it was written from
+            cache = f"{cache}_{os.path.basename(os.path.normpath(directory))}"
+            for stale in glob.glob(glob.escape(cache) + '.*'):
+                os.remove(stale)
+        dataset = dataset.cache(cache)
+    if shuffle:
+        dataset = dataset.shuffle(TRAIN_SHUFFLE_BUFFER, seed=SPLIT_SEED, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(lambda images, labels: (tf.cast(images, tf.float32) / 255.0, labels),
+                          num_parallel_calls=tf.data.AUTOTUNE)
+    if augment:
+        dataset = dataset.map(lambda images, labels: (augment_spectrograms(images), labels),
+                              num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE), len(paths)
+
+
+# Model 
+def build_cnn_model(architecture='baseline'):
+    """Builds one of ARCHITECTURES for 224x224x1 spectrograms, compiled for binary classification."""
+    convolutions, head = ARCHITECTURES[architecture]
+    layers = [
         Conv2D(32, (3, 3), activation='relu', input_shape=(IMG_HEIGHT, IMG_WIDTH, 1), padding='same'),
         BatchNormalization(),
         MaxPooling2D((2, 2)),
-        Conv2D(64, (3, 3), activation='relu', padding='same'),
-        BatchNormalization(),
-        MaxPooling2D((2, 2)),
-        Conv2D(128, (3, 3), activation='relu', padding='same'),
-        BatchNormalization(),
-        MaxPooling2D((2, 2)),
-        Flatten(),
-        Dense(256, activation='relu'),
-        BatchNormalization(),
-        Dropout(0.5),
-        Dense(128, activation='relu'),
-        Dropout(0.4),
-        Dense(1, activation='sigmoid')
-    ])
-
+    ]
+    # A separable convolution on the 1-channel input would save nothing, so the first stays standard
+    ConvLayer = SeparableConv2D if convolutions == 'separable' else Conv2D
+    for filters in ([64, 128, 256] if architecture == 'compact' else [64, 128]):
+        layers += [ConvLayer(filters, (3, 3), activation='relu', padding='same'), BatchNormalization(), MaxPooling2D((2, 2))]
+    if head == 'flatten':
+        layers += [
+            Flatten(),
+            Dense(256, activation='relu'),
+            BatchNormalization(),
+            Dropout(0.5),
+            Dense(128, activation='relu'),
+            Dropout(0.4),
+        ]
+    else:
+        layers += [GlobalAveragePooling2D(), Dense(128, activation='relu'), Dropout(0.4)]
+    model = Sequential(layers + [Dense(1, activation='sigmoid')])
     model.compile(optimizer=Adam(learning_rate=0.001), loss='binary_crossentropy', metrics=['accuracy'])
+    return model
+
+
+def model_save_path(architecture, pruned=False):
+    base_name, extension = os.path.splitext(MODEL_SAVE_PATH)
+    suffix = '' if architecture == 'baseline' else f'_{architecture}'
+    return f"{base_name}{suffix}{'_pruned' if pruned else ''}{extension}"
+
+
+# Magnitude Pruning 
+def _prunable_weights(model):
+    # Convolution and dense kernels; biases, batch norm and the output layer stay dense
+    weights = []
+    for layer in model.layers[:-1]:
+        if isinstance(layer, SeparableConv2D):
+            weights += [layer.depthwise_kernel, layer.pointwise_kernel]
+        elif isinstance(layer, (Conv2D, Dense)):
+            weights.append(layer.kernel)
+    return weights
+
+
+class MagnitudePruning(Callback):
+    """
+    Zeroes the smallest-magnitude weights of every prunable kernel while the
+    model fine-tunes. Sparsity ramps up linearly to `final_sparsity` over
+    `ramp_epochs`; the masks are recomputed at each epoch start and
+    re-applied after every batch so pruned weights stay at zero.
+    """
+    def __init__(self, final_sparsity, ramp_epochs):
+        super().__init__()
+        self.final_sparsity = final_sparsity
+        self.ramp_epochs = max(1, ramp_epochs)
+        self.masks = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        sparsity = self.final_sparsity * min(1.0, (epoch + 1) / self.ramp_epochs)
+        self.masks = []
+        for weight in _prunable_weights(self.model):
+            magnitudes = np.abs(weight.numpy())
+            threshold = np.quantile(magnitudes, sparsity)
+            self.masks.append((weight, (magnitudes > threshold).astype(magnitudes.dtype)))
+        self._apply()
+
+    def on_train_batch_end(self, batch, logs=None):
+        self._apply()
+
+    def _apply(self):
+        for weight, mask in self.masks:
+            weight.assign(weight * mask)
+
+
+def model_sparsity(model):
+    """Fraction of zero weights across the prunable kernels."""
+    weights = [w.numpy() for w in _prunable_weights(model)]
+    return sum(int(np.sum(w == 0)) for w in weights) / max(1, sum(w.size for w in weights))
+
+
+def train_cnn_model(source='png', cache=TRAIN_CACHE, architecture='baseline', prune=0.0):
+    """
+    Trains a CNN model optimized for grayscale spectrograms, read either from
+    the PNG tree ('png') or from the memory-mapped feature store ('store').
+    With `prune` > 0 the best model is then fine-tuned while magnitude
+    pruning brings that fraction of its kernel weights to zero.
+    """
+    save_path = model_save_path(architecture)
+    if source == 'store':
+        if not FeatureStore.exists(FEATURE_STORE_PATH):
+            print("Feature store not found.")
+            return
+        store = FeatureStore(FEATURE_STORE_PATH)
+        train_data = FeatureStoreSequence(store, 'train', BATCH_SIZE, shuffle=True, augment=True)
+        validation_data = FeatureStoreSequence(store, 'validation', BATCH_SIZE)
+        train_samples = train_data.samples
+    else:
+        if not os.path.exists(SPECTROGRAM_PATH):
+            print("Spectrograms not found.")
+            return
+        train_data, train_samples = make_image_dataset(
+            os.path.join(SPECTROGRAM_PATH, 'train'), BATCH_SIZE, shuffle=True, augment=True, cache=cache)
+        validation_data, _ = make_image_dataset(
+            os.path.join(SPECTROGRAM_PATH, 'validation'), BATCH_SIZE, cache=cache)
+
+    if not train_samples > 0:
+        print("Error: No training images were generated.")
+        return
+        
+
+    model = build_cnn_model(architecture)
     model.summary() 
 
     callbacks_list = [
         EarlyStopping(monitor='val_loss', patience=15, restore_best_weights=True),
         ReduceLROnPlateau(monitor='val_loss', factor=0.2, patience=7),
-        ModelCheckpoint(MODEL_SAVE_PATH, monitor='val_accuracy', save_best_only=True, mode='max')
+        ModelCheckpoint(save_path, monitor='val_accuracy', save_best_only=True, mode='max')
     ]
     
     model.fit(
-        train_generator,
+        train_data,
         epochs=100,
-        validation_data=validation_generator,
+        validation_data=validation_data,
         callbacks=callbacks_list
     )
-    print(f"Grayscale model training complete. Best model saved to {MODEL_SAVE_PATH}")
+    print(f"Grayscale model training complete. Best model saved to {save_path}")
+
+    if prune > 0:
+        model = tf.keras.models.load_model(save_path)
+        model.compile(optimizer=Adam(learning_rate=1e-4), loss='binary_crossentropy', metrics=['accuracy'])
+        model.fit(
+            train_data,
+            epochs=PRUNE_FINE_TUNE_EPOCHS,
+            validation_data=validation_data,
+            callbacks=[MagnitudePruning(prune, ramp_epochs=PRUNE_FINE_TUNE_EPOCHS // 2)]
+        )
+        pruned_path = model_save_path(architecture, pruned=True)
+        model.save(pruned_path)
+        print(f"Pruned model ({model_sparsity(model):.0%} of kernel weights zero) saved to {pruned_path}")
 
 
 if __name__ == '__main__':
-    process_all_audio_files()
-    train_cnn_model()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build the spectrogram dataset and train the audio CNN.")
+    parser.add_argument('--format', choices=['png', 'store'], default='png',
+                        help="Write a PNG directory tree or a memory-mapped feature store.")
+    parser.add_argument('--cache', default=TRAIN_CACHE,
+                        help="Where to cache decoded PNGs after the first epoch: '' for memory, "
+                             "a path prefix for files, or 'none'.")
+    parser.add_argument('--intra-op-threads', type=int, default=TRAIN_INTRA_OP_THREADS,
+                        help="Threads for each TensorFlow op (0 = one per core).")
+    parser.add_argument('--inter-op-threads', type=int, default=TRAIN_INTER_OP_THREADS,
+                        help="Ops TensorFlow may run concurrently (0 = one per core).")
+    parser.add_argument('--architecture', choices=list(ARCHITECTURES), default='baseline',
+                        help="Model variant; see ARCHITECTURES.")
+    parser.add_argument('--prune', type=float, default=0.0,
+                        help="After training, fine-tune with this fraction of kernel weights pruned to zero.")
+    args = parser.parse_args()
+    configure_threads(args.intra_op_threads, args.inter_op_threads)
+    if args.format == 'store':
+        build_feature_store()
+    elif not process_all_audio_files():
+        raise SystemExit(1)
+    train_cnn_model(source=args.format, cache=args.cache, architecture=args.architecture, prune=args.prune)
\ No newline at end of file
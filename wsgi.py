@@ -11,11 +11,8 @@ from app import create_app
 # Create Flask app
 app = create_app()
 
-# Optional: Pre-import heavy ML libraries to catch issues early
-try:
-    import tensorflow as tf
-except Exception as e:
-    print(f"TensorFlow import warning: {e}")
+# Models are loaded lazily; gunicorn.conf.py loads and warms them up
+# in each worker (and optionally preloads them in the master).
 
 # Gunicorn will look for 'app' by default
 if __name__ == "__main__":